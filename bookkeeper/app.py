@@ -7,6 +7,8 @@ import configparser
 from PySide6.QtWidgets import QApplication
 from bookkeeper.views.home import MainWindow
 from bookkeeper.scripts.create_db import create_database
+from bookkeeper.repository.migrations import migrate
+from bookkeeper.utils.sqlite_utils import close_all
 
 config = configparser.ConfigParser()
 config.read("bookkeeper/config/settings.ini")
@@ -19,11 +21,15 @@ def main():
     if not os.path.exists(db_name):
         # Если файл не существует, создаем базу данных
         create_database(db_name)
+    else:
+        migrate(db_name)
 
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    close_all()
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
@@ -12,7 +12,10 @@ class ExpenseController:
     """
 
     def __init__(
-        self, view: ExpenseWidget = None, expense_service: ExpenseService = None
+        self,
+        view: ExpenseWidget = None,
+        expense_service: ExpenseService = None,
+        category_service: CategoryService = None,
     ):
         """
         Initializes the ExpenseController.
@@ -20,10 +23,12 @@ class ExpenseController:
         Args:
             view (ExpenseWidget): The expense view widget.
             expense_service (ExpenseService): The expense service.
+            category_service (CategoryService, optional): The category service, \
+            pass the one shared with CategoryController. Defaults to None.
         """
         self.view = view or ExpenseWidget()
         self.expense_service = expense_service or ExpenseService()
-        self.category_services = CategoryService()
+        self.category_services = category_service or CategoryService()
         self.view.bind_add_expense(self.add_expense)
         self.view.bind_delete_expense(self.delete_expense)
         self.view.bind_edit_expense(self.edit_expense)
@@ -20,7 +20,7 @@ class PeriodType(str, Enum):
     MONTH = "Месяц"
 
 
-@dataclass
+@dataclass(slots=True)
 class Budget:
     """
     Budget data model.
@@ -47,12 +47,27 @@ class Budget:
         if not isinstance(self.period_type, PeriodType):
             raise TypeError("self.period_type should be an instance of PeriodType.")
 
-        today = datetime.now()
-        morning = datetime.combine(today, datetime.min.time())
-        night = datetime.combine(today, datetime.max.time())
-        period_dates = {
-            PeriodType.DAY: (morning, night),
-            PeriodType.WEEK: get_week_boundaries(today),
-            PeriodType.MONTH: get_month_boundaries(today),
-        }
-        return period_dates[self.period_type]
+        return get_period_dates(self.period_type)
+
+
+def get_period_dates(
+    period_type: PeriodType, day: datetime | None = None
+) -> tuple[datetime, datetime]:
+    """
+    Get the start and end dates of the period of the given type containing a day.
+
+    Parameters:
+        period_type (PeriodType): The period type (day/week/month).
+        day (datetime | None): The day within the period. Defaults to today.
+
+    Returns:
+        tuple[datetime, datetime]: Start and end dates of the period.
+    """
+    day = day or datetime.now()
+    if period_type == PeriodType.WEEK:
+        return get_week_boundaries(day)
+    if period_type == PeriodType.MONTH:
+        return get_month_boundaries(day)
+    morning = datetime.combine(day, datetime.min.time())
+    night = datetime.combine(day, datetime.max.time())
+    return morning, night
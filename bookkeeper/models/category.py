@@ -5,7 +5,7 @@ Category Model
 from dataclasses import dataclass
 
 
-@dataclass()
+@dataclass(slots=True)
 class Category:
     """
     Сategory model.
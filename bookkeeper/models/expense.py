@@ -7,7 +7,7 @@ from decimal import Decimal
 from datetime import datetime
 
 
-@dataclass()
+@dataclass(slots=True)
 class Expense:
     """
     Expense operation model.
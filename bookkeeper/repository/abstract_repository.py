@@ -8,7 +8,13 @@ use it for other purposes.
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from contextlib import nullcontext
+from dataclasses import replace
+from typing import ContextManager, Generic, Iterable, Iterator, Sequence
+from typing import TypeVar, Protocol, Any
+from bookkeeper.repository.query import Aggregate, GroupBy, Query, Where
+from bookkeeper.repository.query import aggregate_objects, sort_objects
+from bookkeeper.utils.utils import batched, field_values
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -31,8 +37,20 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+    Bulk methods (add_many, update_many, delete_many) call the single-object
+    ones inside a transaction unless overridden, iter_all, page, find,
+    find_rows, iter_rows, aggregate, get_ancestors and get_descendants are
+    evaluated in Python over get and get_all.
     """
 
+    def transaction(self) -> ContextManager[Any]:
+        """
+        Context in which all writes are applied atomically: committed together
+        on normal exit and rolled back if the block raises. Transactions may be
+        nested. Repositories without transactional storage run the block as is.
+        """
+        return nullcontext(self)
+
     @abstractmethod
     def add(self, obj: T) -> int:
         """
@@ -45,10 +63,11 @@ class AbstractRepository(ABC, Generic[T]):
         """Get an object by id"""
 
     @abstractmethod
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self, where: Where = None) -> list[T]:
         """
         Get all records based on some condition.
-        'where' - condition as a dictionary {'field_name': value}
+        'where' - condition as a dictionary {'field_name': value} or
+        a query condition (see bookkeeper.repository.query),
         if the condition is not specified (by default), return all records.
         """
 
@@ -59,3 +78,154 @@ class AbstractRepository(ABC, Generic[T]):
     @abstractmethod
     def delete(self, pk: int) -> None:
         """Delete a record"""
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Add objects to the repository, return their ids,
+        also store each id in the object's 'pk' attribute.
+        'objs' may be any iterable, it is consumed once.
+        """
+        with self.transaction():
+            return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """Update data of several objects. Each must contain the 'pk' field."""
+        with self.transaction():
+            for obj in objs:
+                self.update(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """Delete several records"""
+        with self.transaction():
+            for pk in pks:
+                self.delete(pk)
+
+    def iter_all(
+        self,
+        where: Where = None,
+        order_by: str | Sequence[str] | None = None,
+        batch_size: int = 1000,
+    ) -> Iterator[T]:
+        """
+        Iterate over records matching the condition, 'batch_size' at a time.
+        Storages that can read lazily load one batch per step, this default
+        gets all matching records first.
+        'order_by' - field name or sequence of names, '-name' for descending.
+        """
+        for batch in batched(sort_objects(self.get_all(where), order_by), batch_size):
+            yield from batch
+
+    def page(
+        self,
+        limit: int,
+        after_pk: int | None = None,
+        after_key: Any = None,
+        key: str = "pk",
+        where: Where = None,
+    ) -> list[T]:
+        """
+        Get up to 'limit' records ordered by ('key', pk) that follow the
+        record with primary key 'after_pk' and 'key' value 'after_key'
+        (keyset pagination). Without 'after_pk' return the first page.
+        To get the next page pass the pk and 'key' value of the last record.
+        """
+        objs = self.get_all(where)
+        if key == "pk":
+            after_key = after_pk
+        if after_pk is not None:
+            objs = [
+                obj
+                for obj in objs
+                if (getattr(obj, key), obj.pk) > (after_key, after_pk)
+            ]
+        objs.sort(key=lambda obj: (getattr(obj, key), obj.pk))
+        return objs[:limit]
+
+    def find(self, query: Query) -> list[T]:
+        """
+        Get records selected, ordered and limited by a query specification.
+        The projection of the query is ignored.
+        """
+        return replace(query, where=None).apply(self.get_all(query.where))
+
+    def find_rows(self, query: Query) -> list[tuple]:
+        """
+        Get the values of the query columns (all fields if not specified)
+        of the records selected by a query specification, one tuple per record.
+        """
+        objs = self.find(query)
+        if query.columns is None:
+            return [tuple(field_values(obj).values()) for obj in objs]
+        return [tuple(getattr(obj, column) for column in query.columns) for obj in objs]
+
+    def iter_rows(self, query: Query, batch_size: int = 1000) -> Iterator[tuple]:
+        """
+        Iterate over the rows of find_rows, 'batch_size' at a time.
+        Storages that can read lazily load one batch per step, this default
+        selects all records first and builds the rows of one batch per step.
+        """
+        objs = self.find(query)
+        for batch in batched(objs, batch_size):
+            if query.columns is None:
+                yield from (tuple(field_values(obj).values()) for obj in batch)
+            else:
+                yield from (
+                    tuple(getattr(obj, column) for column in query.columns)
+                    for obj in batch
+                )
+
+    def aggregate(
+        self, field: str, group_by: GroupBy = (), where: Where = None
+    ) -> list[Aggregate]:
+        """
+        Get the sum, count, minimum and maximum of a field over the records
+        matching the condition, grouped by fields and time buckets
+        (see bookkeeper.repository.query.Bucket), ordered by the groups.
+        """
+        return aggregate_objects(self.get_all(where), field, group_by)
+
+    def get_ancestors(
+        self, pk: int, include_self: bool = False, parent_field: str = "parent"
+    ) -> list[T]:
+        """
+        Get the chain of parents of a record, from its parent up to the root.
+        'parent_field' - field holding the pk of the parent record.
+        With 'include_self' the chain starts with the record itself.
+        Raises ValueError if the parent links form a cycle.
+        """
+        chain: list[T] = []
+        obj = self.get(pk)
+        if obj is not None and include_self:
+            chain.append(obj)
+        seen: set[int] = {pk}
+        while obj is not None and getattr(obj, parent_field) is not None:
+            parent = getattr(obj, parent_field)
+            if parent in seen:
+                raise ValueError(f"record {parent} is its own ancestor")
+            seen.add(parent)
+            obj = self.get(parent)
+            if obj is not None:
+                chain.append(obj)
+        return chain
+
+    def get_descendants(self, pk: int, parent_field: str = "parent") -> list[T]:
+        """
+        Get all records below a record in the hierarchy, at any depth,
+        in depth-first order with siblings ordered by pk.
+        'parent_field' - field holding the pk of the parent record.
+        Raises ValueError if the parent links form a cycle.
+        """
+        children: dict[Any, list[T]] = {}
+        for obj in sorted(self.get_all(), key=lambda obj: obj.pk):
+            children.setdefault(getattr(obj, parent_field), []).append(obj)
+        result: list[T] = []
+        seen: set[int] = {pk}
+        stack: list[T] = list(reversed(children.get(pk, [])))
+        while stack:
+            obj = stack.pop()
+            if obj.pk in seen:
+                raise ValueError(f"record {obj.pk} is its own ancestor")
+            seen.add(obj.pk)
+            result.append(obj)
+            stack.extend(reversed(children.get(obj.pk, [])))
+        return result
@@ -1,16 +1,16 @@
 """Module for the BudgetRepository class."""
 
-from decimal import Decimal
 from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import Where
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
-from bookkeeper.models.budget import Budget
+from bookkeeper.models.budget import Budget, PeriodType, get_period_dates
 
 
 class BudgetRepository(SQLiteRepository[Budget], AbstractRepository[Budget]):
     """Repository class for managing budgets."""
 
-    def __init__(self, db_file: str = None) -> None:
-        super().__init__(Budget, db_file)
+    def __init__(self, db_file: str = None, persistent: bool = True) -> None:
+        super().__init__(Budget, db_file, persistent)
 
     def get_with_expenses(self, pk: int):
         """
@@ -22,17 +22,46 @@ class BudgetRepository(SQLiteRepository[Budget], AbstractRepository[Budget]):
         Returns:
             Budget or None: Budget object with expenses if found, else None.
         """
+        budgets = self.get_all_with_expenses({"pk": pk})
+        return budgets[0] if budgets else None
 
-        budget = self.get(pk=pk)
-        if not budget:
-            return None
+    def get_all_with_expenses(self, where: Where = None) -> list[Budget]:
+        """
+        Retrieve budgets with the expenses of their current periods.
+
+        The spending of the current day, week and month is computed in one
+        pass over the expenses of the widest period, with conditional
+        aggregation, and joined to every budget in the same query.
+
+        Args:
+            where (Where): Optional condition, see bookkeeper.repository.query.
 
-        start_date, end_date = budget.period_dates
-        query = """
-            SELECT SUM(amount) as total FROM expense
-            WHERE expense_date BETWEEN ? AND ?
+        Returns:
+            list[Budget]: Budget objects with expenses.
+        """
+        periods = list(PeriodType)
+        dates = [get_period_dates(period) for period in periods]
+        sums = ", ".join(
+            f"SUM(CASE WHEN expense_date BETWEEN ? AND ? THEN amount END) AS p{i}"
+            for i in range(len(periods))
+        )
+        cases = " ".join(f"WHEN ? THEN spent.p{i}" for i in range(len(periods)))
+        clause, params = self._where(where)
+        query = f"""
+            WITH spent AS (
+                SELECT {sums} FROM expense WHERE expense_date BETWEEN ? AND ?
+            )
+            SELECT {self.table_name}.limit_amount, {self.table_name}.period_type,
+                COALESCE(CASE {self.table_name}.period_type {cases} END, 0)
+                    AS "expenses [Money]",
+                {self.table_name}.pk
+            FROM {self.table_name} CROSS JOIN spent{clause}
         """
-        row = self.db.fetchone(query, (start_date, end_date))
-        expenses = Decimal(row["total"]) if row["total"] else Decimal("0")
-        budget.expenses = expenses
-        return budget
+        parameters = (
+            *(date for period_dates in dates for date in period_dates),
+            min(start for start, _ in dates),
+            max(end for _, end in dates),
+            *periods,
+            *params,
+        )
+        return self._hydrate(*self.db.fetch_rows(query, parameters))
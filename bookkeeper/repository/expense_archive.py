@@ -0,0 +1,522 @@
+"""
+Module for the ExpenseArchive class.
+
+Old expenses are moved from the application database to a separate archive
+database file. For every month and category of the moved expenses the total
+and the count are kept in the 'expense_summary' table of the application
+database, so reports over archived periods do not need the archive.
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from bookkeeper.models.budget import PeriodType
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.expense_repository import ExpenseRepository
+from bookkeeper.repository.partitioned_expense_repository import (
+    EXPENSE_COLUMNS,
+    PartitionedExpenseRepository,
+    add_months,
+    date_range,
+)
+from bookkeeper.repository.query import (
+    Aggregate,
+    And,
+    Bucket,
+    Condition,
+    GroupBy,
+    Or,
+    Predicate,
+    Where,
+    aggregate_objects,
+    as_predicate,
+    merge_aggregates,
+)
+from bookkeeper.utils.sqlite_utils import SQLite
+
+# The archive has no category table to reference
+ARCHIVE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS "expense" ({EXPENSE_COLUMNS}
+)
+"""
+
+ARCHIVE_INDEX = (
+    'CREATE INDEX IF NOT EXISTS "expense_expense_date_idx" '
+    'ON "expense" ("expense_date")'
+)
+
+# Microsecond timestamp of the first day of the month of an expense
+MONTH_START = (
+    "CAST(strftime('%s', expense_date / 1000000.0, 'unixepoch', 'start of month') "
+    "AS INTEGER) * 1000000"
+)
+
+# Value of 'PRAGMA auto_vacuum' that allows 'PRAGMA incremental_vacuum'
+INCREMENTAL = 2
+
+# Share of free pages in the database file that makes compact() reclaim them
+VACUUM_THRESHOLD = 0.1
+
+# Grouping keys the monthly summaries can answer
+SUMMARY_KEYS = ("category", Bucket("expense_date", PeriodType.MONTH))
+
+# Operators of expense date conditions the summaries can be filtered by
+SUMMARY_OPERATORS = ("=", "<", "<=", ">", ">=")
+
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def month_start(day: datetime) -> datetime:
+    """
+    Get the first moment of the month of a day.
+
+    Args:
+        day (datetime): The day.
+
+    Returns:
+        datetime: Midnight of the first day of the month.
+    """
+    return datetime(day.year, day.month, 1)
+
+
+def default_archive_file(db_name: str) -> str:
+    """
+    Get the default archive database file of an application database.
+
+    Args:
+        db_name (str): The path to the application database file.
+
+    Returns:
+        str: The path with an '_archive' suffix added to the file name.
+    """
+    root, ext = os.path.splitext(db_name)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def whole_months(condition: Condition) -> tuple[datetime | None, datetime | None]:
+    """
+    Find the months an expense date condition holds for entirely.
+
+    Args:
+        condition (Condition): Condition on the expense date.
+
+    Returns:
+        tuple[datetime | None, datetime | None]: The start of the first \
+            month and the start of the month after the last, None where \
+            unbounded.
+    """
+    day = condition.value
+    first = last = None
+    if condition.op in ("=", ">="):
+        first = add_months(month_start(day - ONE_MICROSECOND), 1)
+    elif condition.op == ">":
+        first = add_months(month_start(day), 1)
+    if condition.op in ("=", "<="):
+        last = month_start(day + ONE_MICROSECOND)
+    elif condition.op == "<":
+        last = month_start(day)
+    return first, last
+
+
+def fields(predicate: Predicate) -> set[str | None]:
+    """
+    Get the fields a condition depends on, None for unknown predicates.
+
+    Args:
+        predicate (Predicate): The condition.
+
+    Returns:
+        set[str | None]: The field names.
+    """
+    if isinstance(predicate, Condition):
+        return {predicate.field}
+    if isinstance(predicate, (And, Or)):
+        return set().union(*map(fields, predicate.conditions))
+    return {None}
+
+
+class ExpenseArchive:
+    """
+    Archive of old expenses in a separate SQLite database.
+
+    Archived expenses keep their primary keys, and the 'expense' sequence of
+    the application database is left as it is, so keys are never reused.
+    Expenses added later with a date in an archived month stay in the
+    application database, totals then add up both.
+
+    Args:
+        repo (ExpenseRepository): Repository of the application database, \
+            a PartitionedExpenseRepository also gets its partitions archived.
+        archive_file (str | None): The path to the archive database file. \
+            Default is the application database name with an '_archive' suffix.
+
+    Attributes:
+        repo (ExpenseRepository): Repository of the application database.
+        archive_file (str): The path to the archive database file.
+        db (SQLite): Connection to the archive database.
+    """
+
+    def __init__(
+        self, repo: ExpenseRepository, archive_file: str | None = None
+    ) -> None:
+        """
+        Initializes the ExpenseArchive and creates the archive table.
+
+        Args:
+            repo (ExpenseRepository): Repository of the application database.
+            archive_file (str | None): The path to the archive database file.
+        """
+        if archive_file is None:
+            archive_file = default_archive_file(repo.db.db_name)
+        self.repo: ExpenseRepository = repo
+        self.archive_file: str = archive_file
+        self.db: SQLite = SQLite(archive_file, repo.db.persistent, repo.db.pragmas)
+        self.db.execute(ARCHIVE_TABLE)
+        self.db.execute(ARCHIVE_INDEX)
+
+    def _tables(self, cutoff: datetime) -> tuple[list[str], list[str]]:
+        """
+        Finds the tables of the application database holding expenses dated \
+            before the cutoff.
+
+        Args:
+            cutoff (datetime): The first date that is not archived.
+
+        Returns:
+            tuple[list[str], list[str]]: The tables to archive from, and the \
+                partitions among them that hold no later expenses.
+        """
+        tables: list[str] = [self.repo.table_name]
+        emptied: list[str] = []
+        if isinstance(self.repo, PartitionedExpenseRepository):
+            for partition in self.repo.partitions():
+                if partition.start < cutoff:
+                    tables.append(partition.name)
+                if partition.end <= cutoff:
+                    emptied.append(partition.name)
+        return tables, emptied
+
+    def _copy(
+        self, conn: sqlite3.Connection, tables: list[str], cutoff: datetime
+    ) -> None:
+        """
+        Copies the expenses dated before the cutoff to the attached archive \
+            in one transaction, replacing copies left by an interrupted run.
+
+        Args:
+            conn (sqlite3.Connection): Connection with the archive attached.
+            tables (list[str]): The tables to copy from.
+            cutoff (datetime): The first date that is not archived.
+        """
+        columns = ", ".join(self.repo.fields)
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            for table in tables:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO archive.expense ({columns}) "
+                    f'SELECT {columns} FROM main."{table}" WHERE expense_date < ?',
+                    (cutoff,),
+                )
+
+    @staticmethod
+    def _remove(
+        conn: sqlite3.Connection,
+        tables: list[str],
+        emptied: list[str],
+        cutoff: datetime,
+    ) -> int:
+        """
+        Adds the expenses dated before the cutoff to the monthly summaries \
+            and deletes them in one transaction.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the application database.
+            tables (list[str]): The tables to delete from.
+            emptied (list[str]): The partitions to drop.
+            cutoff (datetime): The first date that is not archived.
+
+        Returns:
+            int: Number of deleted expenses.
+        """
+        removed = 0
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            for table in tables:
+                conn.execute(
+                    "INSERT INTO expense_summary (month, category, total, count) "
+                    f"SELECT {MONTH_START}, category, SUM(amount), COUNT(*) "
+                    f'FROM "{table}" WHERE expense_date < ? GROUP BY 1, 2 '
+                    "ON CONFLICT(month, category) DO UPDATE SET "
+                    "total = total + excluded.total, count = count + excluded.count",
+                    (cutoff,),
+                )
+                removed += conn.execute(
+                    f'DELETE FROM "{table}" WHERE expense_date < ?', (cutoff,)
+                ).rowcount
+            for name in emptied:
+                conn.execute(f'DROP TABLE "{name}"')
+                conn.execute("DELETE FROM expense_partition WHERE name = ?", (name,))
+        return removed
+
+    def archive(self, before: datetime) -> int:
+        """
+        Moves the expenses of the months before the month of a date to the \
+            archive and adds them to the monthly summaries.
+
+        The rows are copied to the archive in one transaction and deleted from
+        the application database together with the summary update in another.
+        If the second one does not complete, the rows are in both databases
+        until the next call, which copies them again and finishes the move.
+        Must not be called inside a transaction block.
+
+        Args:
+            before (datetime): Expenses before the first day of its month \
+                are archived.
+
+        Returns:
+            int: Number of archived expenses.
+        """
+        cutoff = month_start(before)
+        tables, emptied = self._tables(cutoff)
+        # the connection commits every statement unless a transaction is begun
+        conn = self.repo.db.connect()
+        try:
+            conn.execute("ATTACH DATABASE ? AS archive", (self.archive_file,))
+            try:
+                self._copy(conn, tables, cutoff)
+            finally:
+                conn.execute("DETACH DATABASE archive")
+            return self._remove(conn, tables, emptied, cutoff)
+        finally:
+            conn.close()
+
+    def compact(self, threshold: float = VACUUM_THRESHOLD) -> int:
+        """
+        Returns free pages of the application database file to the file \
+            system and refreshes the query planner statistics.
+
+        The first call switches the database to incremental auto-vacuum,
+        which needs one full VACUUM. Later calls only run the incremental
+        vacuum when the free pages make up 'threshold' of the file, so the
+        method is cheap enough to call after every archive run.
+        Must not be called inside a transaction block.
+
+        Args:
+            threshold (float): Share of free pages that triggers the vacuum.
+
+        Returns:
+            int: Number of pages the file shrank by.
+        """
+        conn = self.repo.db.connect()
+        try:
+            (pages,) = conn.execute("PRAGMA page_count").fetchone()
+            (mode,) = conn.execute("PRAGMA auto_vacuum").fetchone()
+            if mode != INCREMENTAL:
+                conn.execute(f"PRAGMA auto_vacuum = {INCREMENTAL}")
+                conn.execute("VACUUM")
+            else:
+                (free,) = conn.execute("PRAGMA freelist_count").fetchone()
+                if free and free >= threshold * pages:
+                    # execute() steps the pragma once, freeing a single page
+                    conn.executescript("PRAGMA incremental_vacuum;")
+            conn.execute("ANALYZE")
+            (left,) = conn.execute("PRAGMA page_count").fetchone()
+        finally:
+            conn.close()
+        return pages - left
+
+    def get_total(self, start_date: datetime, end_date: datetime) -> Decimal:
+        """
+        Get the total of the archived expenses of a period.
+
+        Whole months are summed from the monthly summaries, only the days of
+        partial months at the ends of the period are read from the archive.
+
+        Args:
+            start_date (datetime): The start date of the period.
+            end_date (datetime): The end date of the period, inclusive.
+
+        Returns:
+            Decimal: The total of the archived expenses.
+        """
+        first = month_start(start_date)
+        if first < start_date:
+            first = add_months(first, 1)
+        last = month_start(end_date + timedelta(microseconds=1))
+        total = Decimal("0")
+        detail = "expense_date BETWEEN ? AND ?"
+        params: tuple = (start_date, end_date)
+        if first < last:
+            row = self.repo.db.fetchone(
+                'SELECT SUM(total) AS "total [Money]" FROM expense_summary '
+                "WHERE month >= ? AND month < ?",
+                (first, last),
+            )
+            total += row["total"] or 0
+            detail += " AND (expense_date < ? OR expense_date >= ?)"
+            params += (first, last)
+        row = self.db.fetchone(
+            f'SELECT SUM(amount) AS "total [Money]" FROM expense WHERE {detail}',
+            params,
+        )
+        return total + (row["total"] or 0)
+
+    @staticmethod
+    def _summary_window(
+        group_by: GroupBy, predicate: Predicate | None
+    ) -> tuple[datetime | None, datetime | None, Predicate] | None:
+        """
+        Finds the archived months an aggregate can take from the summaries.
+
+        Args:
+            group_by (GroupBy): Fields and time buckets to group by.
+            predicate (Predicate | None): The condition on the expenses.
+
+        Returns:
+            tuple[datetime | None, datetime | None, Predicate] | None: The \
+                start of the first month, the start of the month after the \
+                last one, None where unbounded, and the condition on the \
+                category. None if the summaries cannot answer the aggregate.
+        """
+        if any(key not in SUMMARY_KEYS for key in group_by):
+            return None
+        conditions: tuple[Predicate, ...] = ()
+        if isinstance(predicate, And):
+            conditions = predicate.conditions
+        elif predicate is not None:
+            conditions = (predicate,)
+        first = last = None
+        rest = []
+        for condition in conditions:
+            if (
+                isinstance(condition, Condition)
+                and condition.field == "expense_date"
+                and condition.op in SUMMARY_OPERATORS
+                and isinstance(condition.value, datetime)
+            ):
+                start, end = whole_months(condition)
+                if start is not None:
+                    first = start if first is None else max(first, start)
+                if end is not None:
+                    last = end if last is None else min(last, end)
+            elif fields(condition) <= {"category"}:
+                rest.append(condition)
+            else:
+                return None
+        if first is not None and last is not None and first >= last:
+            return None
+        return first, last, And(*rest)
+
+    def _summaries(
+        self,
+        group_by: GroupBy,
+        window: tuple[datetime | None, datetime | None, Predicate],
+    ) -> list[Aggregate]:
+        """
+        Aggregates the monthly summaries of a range of archived months.
+
+        Args:
+            group_by (GroupBy): "category" and/or the month of the expense date.
+            window (tuple[datetime | None, datetime | None, Predicate]): The \
+                months and the category condition, see _summary_window.
+
+        Returns:
+            list[Aggregate]: Aggregates without minimum and maximum.
+        """
+        first, last, rest = window
+        clauses, params = ["1"], []
+        if first is not None:
+            clauses.append("month >= ?")
+            params.append(first)
+        if last is not None:
+            clauses.append("month < ?")
+            params.append(last)
+        rows = self.repo.db.fetchall(
+            "SELECT month, category, total, count FROM expense_summary "
+            f"WHERE {' AND '.join(clauses)}",
+            tuple(params),
+        )
+        return merge_aggregates(
+            Aggregate(
+                tuple(
+                    row["category"] if key == "category" else row["month"]
+                    for key in group_by
+                ),
+                row["total"],
+                row["count"],
+                None,
+                None,
+            )
+            for row in rows
+            if rest.matches(SimpleNamespace(category=row["category"]))
+        )
+
+    def _archived(
+        self,
+        predicate: Predicate | None,
+        window: tuple[datetime | None, datetime | None, Predicate] | None,
+    ) -> list[Expense]:
+        """
+        Reads the archived expenses matching a condition, except the ones of \
+            the summarized months.
+
+        Args:
+            predicate (Predicate | None): The condition on the expenses.
+            window (tuple[datetime | None, datetime | None, Predicate] | None): \
+                The summarized months, see _summary_window.
+
+        Returns:
+            list[Expense]: The matching expenses.
+        """
+        low, high = date_range(predicate)
+        clauses, params = ["1"], []
+        if low is not None:
+            clauses.append("expense_date >= ?")
+            params.append(low)
+        if high is not None:
+            clauses.append("expense_date <= ?")
+            params.append(high)
+        if window is not None:
+            outside = []
+            if window[0] is not None:
+                outside.append("expense_date < ?")
+                params.append(window[0])
+            if window[1] is not None:
+                outside.append("expense_date >= ?")
+                params.append(window[1])
+            clauses.append(f"({' OR '.join(outside) or '0'})")
+        rows = self.db.fetchall(
+            f"SELECT {', '.join(self.repo.fields)} FROM expense "
+            f"WHERE {' AND '.join(clauses)}",
+            tuple(params),
+        )
+        expenses = (Expense(**row) for row in rows)
+        return [e for e in expenses if predicate is None or predicate.matches(e)]
+
+    def aggregate(self, group_by: GroupBy = (), where: Where = None) -> list[Aggregate]:
+        """
+        Aggregate the amounts of the archived expenses, see \
+            AbstractRepository.aggregate.
+
+        Whole months grouped by category and/or month and filtered by category
+        and expense date are taken from the monthly summaries, which keep no
+        minimum and maximum, so those only cover the expenses read from the
+        archive. Everything else is read from the archive.
+
+        Args:
+            group_by (GroupBy): Fields and time buckets to group by.
+            where (Where): Filtering object or query condition.
+
+        Returns:
+            list[Aggregate]: Aggregates ordered by their group.
+        """
+        predicate = as_predicate(where)
+        window = self._summary_window(group_by, predicate)
+        summaries = [] if window is None else self._summaries(group_by, window)
+        expenses = self._archived(predicate, window)
+        return merge_aggregates(
+            summaries, aggregate_objects(expenses, "amount", group_by)
+        )
@@ -2,23 +2,270 @@
 Module describing a repository that operates in memory.
 """
 
-from itertools import count
-from typing import Any
+import gc
+import os
+import pickle
+from bisect import bisect_left, bisect_right
+from collections import deque
+from dataclasses import fields, is_dataclass, replace
+from heapq import nsmallest
+from itertools import repeat
+from operator import itemgetter
+from typing import Any, Iterable, Iterator, Sequence
 
 from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.query import Aggregate, And, Condition, GroupBy, Or
+from bookkeeper.repository.query import Predicate, Query, Where
+from bookkeeper.repository.query import aggregate_objects, as_predicate, sort_objects
+
+# Version of the snapshot format written by MemoryRepository.save
+SNAPSHOT_VERSION = 1
+
+
+def _encode_objects(objs: list[Any]) -> tuple[type | None, list]:
+    """
+    Lay out objects of one dataclass as columns of field values, which
+    are smaller and faster to unpickle than the objects themselves.
+    Other objects are kept as they are.
+    """
+    classes = {type(obj) for obj in objs}
+    if len(classes) != 1 or not is_dataclass(cls := classes.pop()):
+        return None, objs
+    return cls, [[getattr(obj, f.name) for obj in objs] for f in fields(cls)]
+
+
+def _decode_objects(cls: type | None, data: list) -> list[Any]:
+    """
+    Rebuild the objects laid out by _encode_objects, without calling
+    __init__.
+    """
+    if cls is None:
+        return data
+    size = len(data[0]) if data else 0
+    objs = list(map(object.__new__, repeat(cls, size)))
+    # one C-level pass per field is much faster than a Python loop per object
+    for f, column in zip(fields(cls), data):
+        deque(map(object.__setattr__, objs, repeat(f.name, size), column), maxlen=0)
+    return objs
+
+
+class HashIndex:
+    """
+    Index of the pks of objects by the value of a field,
+    for '=' and 'in' conditions.
+    """
+
+    def __init__(self) -> None:
+        self.pks: dict[Any, set[int]] = {}
+
+    def add(self, value: Any, pk: int) -> None:
+        """Index an object."""
+        self.pks.setdefault(value, set()).add(pk)
+
+    def remove(self, value: Any, pk: int) -> None:
+        """Remove an object from the index."""
+        pks = self.pks[value]
+        pks.discard(pk)
+        if not pks:
+            del self.pks[value]
+
+    def lookup(self, op: str, value: Any) -> set[int] | None:
+        """
+        Get the pks of the objects matching a condition on the field,
+        None if the index cannot answer it.
+        """
+        if op == "=":
+            return set(self.pks.get(value, ()))
+        if op == "in":
+            return set().union(*(self.pks.get(item, ()) for item in value))
+        return None
+
+
+class SortedIndex:
+    """
+    Index of the pks of objects ordered by the value of a field, for range
+    conditions. None values are not indexed: they never match a range.
+    """
+
+    def __init__(self) -> None:
+        self.values: list[Any] = []
+        self.pks: list[int] = []
+
+    def add(self, value: Any, pk: int) -> None:
+        """Index an object."""
+        if value is None:
+            return
+        position = bisect_right(self.values, value)
+        self.values.insert(position, value)
+        self.pks.insert(position, pk)
+
+    def extend(self, items: Iterable[tuple[Any, int]]) -> None:
+        """
+        Index many (value, pk) pairs at once, with one merge instead of
+        inserting them one by one.
+        """
+        pairs = [(value, pk) for value, pk in items if value is not None]
+        if not pairs:
+            return
+        # the sort is stable and almost linear on the two sorted runs
+        merged = sorted(
+            [*zip(self.values, self.pks), *sorted(pairs, key=itemgetter(0))],
+            key=itemgetter(0),
+        )
+        self.values = [value for value, _ in merged]
+        self.pks = [pk for _, pk in merged]
+
+    def remove(self, value: Any, pk: int) -> None:
+        """Remove an object from the index."""
+        if value is None:
+            return
+        position = self.pks.index(
+            pk, bisect_left(self.values, value), bisect_right(self.values, value)
+        )
+        del self.values[position]
+        del self.pks[position]
+
+    def lookup(self, op: str, value: Any) -> set[int] | None:
+        """
+        Get the pks of the objects matching a condition on the field,
+        None if the index cannot answer it.
+        """
+        if value is None or op not in ("=", "<", "<=", ">", ">="):
+            return None
+        start, stop = 0, len(self.values)
+        if op in ("=", ">="):
+            start = bisect_left(self.values, value)
+        elif op == ">":
+            start = bisect_right(self.values, value)
+        if op in ("=", "<="):
+            stop = bisect_right(self.values, value)
+        elif op == "<":
+            stop = bisect_left(self.values, value)
+        return set(self.pks[slice(start, stop)])
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Repository operating in memory.
+
+    Fields can be indexed to avoid scanning all objects: hash indexes
+    answer '=' and 'in' conditions, sorted indexes also answer range
+    conditions. Indexes are kept up to date by add, update and delete.
+    Objects updated in place must be passed to update to be reindexed.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self, indexes: Iterable[str] = (), sorted_indexes: Iterable[str] = ()
+    ) -> None:
         """
         Initializes the MemoryRepository.
+
+        Args:
+            indexes (Iterable[str]): Fields with a hash index.
+            sorted_indexes (Iterable[str]): Fields with a sorted index.
+
+        Raises:
+            ValueError: If a field has both kinds of index.
         """
         self._container: dict[int, T] = {}
-        self._counter = count(1)
+        self._next_pk = 1
+        self._indexes: dict[str, HashIndex | SortedIndex] = {
+            field: HashIndex() for field in indexes
+        }
+        for field in sorted_indexes:
+            if field in self._indexes:
+                raise ValueError(f"field '{field}' is indexed twice")
+            self._indexes[field] = SortedIndex()
+        # values of the indexed fields by pk, as they were indexed
+        self._indexed: dict[int, tuple] = {}
+
+    def _index(self, obj: T) -> None:
+        """
+        Adds an object to the indexes, replacing its previous version.
+
+        Args:
+            obj (T): Stored object.
+        """
+        if not self._indexes:
+            return
+        self._unindex(obj.pk)
+        values = tuple(getattr(obj, field) for field in self._indexes)
+        for index, value in zip(self._indexes.values(), values):
+            index.add(value, obj.pk)
+        self._indexed[obj.pk] = values
+
+    def _index_new(self, objs: list[T]) -> None:
+        """
+        Adds new objects to the indexes in bulk.
+
+        Args:
+            objs (list[T]): Objects just added to the repository.
+        """
+        if not self._indexes:
+            return
+        rows = [tuple(getattr(obj, field) for field in self._indexes) for obj in objs]
+        for column, index in enumerate(self._indexes.values()):
+            if isinstance(index, SortedIndex):
+                index.extend((row[column], obj.pk) for row, obj in zip(rows, objs))
+            else:
+                for row, obj in zip(rows, objs):
+                    index.add(row[column], obj.pk)
+        self._indexed.update((obj.pk, row) for row, obj in zip(rows, objs))
+
+    def _unindex(self, pk: int) -> None:
+        """
+        Removes an object from the indexes.
+
+        Args:
+            pk (int): The ID of the object.
+        """
+        values = self._indexed.pop(pk, None)
+        if values is not None:
+            for index, value in zip(self._indexes.values(), values):
+                index.remove(value, pk)
+
+    def _candidates(self, predicate: Predicate) -> set[int] | None:
+        """
+        Uses the indexes to narrow down the objects that may match a condition.
+
+        Args:
+            predicate (Predicate): The condition.
+
+        Returns:
+            set[int] | None: IDs of the candidate objects, None if the \
+                indexes cannot narrow the condition down.
+        """
+        if isinstance(predicate, Condition):
+            index = self._indexes.get(predicate.field)
+            if index is None:
+                return None
+            return index.lookup(predicate.op, predicate.value)
+        if isinstance(predicate, Or):
+            found: set[int] = set()
+            for condition in predicate.conditions:
+                pks = self._candidates(condition)
+                if pks is None:
+                    return None
+                found |= pks
+            return found
+        if isinstance(predicate, And):
+            narrowed: set[int] | None = None
+            for condition in predicate.conditions:
+                pks = self._candidates(condition)
+                if pks is not None:
+                    narrowed = pks if narrowed is None else narrowed & pks
+            return narrowed
+        return None
+
+    def skip_pks(self, last: int) -> None:
+        """
+        Makes the IDs of objects added later greater than 'last', e.g. the
+        last ID handed out by a storage the objects were loaded from.
+
+        Args:
+            last (int): The ID not to be reused.
+        """
+        self._next_pk = max(self._next_pk, last + 1)
 
     def add(self, obj: T) -> int:
         """
@@ -32,9 +279,11 @@ class MemoryRepository(AbstractRepository[T]):
         """
         if getattr(obj, "pk", None) != 0:
             raise ValueError(f"trying to add object {obj} with filled `pk` attribute")
-        pk = next(self._counter)
+        pk = self._next_pk
+        self._next_pk += 1
         self._container[pk] = obj
         obj.pk = pk
+        self._index(obj)
         return pk
 
     def get(self, pk: int) -> T | None:
@@ -49,27 +298,136 @@ class MemoryRepository(AbstractRepository[T]):
         """
         return self._container.get(pk)
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self, where: Where = None) -> list[T]:
         """
         Retrieves all objects from the repository based on a condition.
 
         Args:
-            where (dict[str, Any] | None): The condition to filter objects.
+            where (Where): The condition to filter objects.
 
         Returns:
             list[T]: List of retrieved objects.
         """
         if where is None:
             return list(self._container.values())
-        return [
-            obj
-            for obj in self._container.values()
-            if all(getattr(obj, attr) == value for attr, value in where.items())
-        ]
+        return list(self._filter(where))
+
+    def _filter(self, where: Where) -> Iterator[T]:
+        """
+        Lazily selects objects matching a condition.
+
+        Args:
+            where (Where): The condition to filter objects.
+
+        Returns:
+            Iterator[T]: Matching objects, in insertion order.
+        """
+        predicate = as_predicate(where)
+        if predicate is None:
+            return iter(list(self._container.values()))
+        pks = self._candidates(predicate)
+        if pks is None:
+            objs = list(self._container.values())
+        else:
+            # pks grow with insertion, so this keeps the insertion order
+            objs = [self._container[pk] for pk in sorted(pks)]
+        return (obj for obj in objs if predicate.matches(obj))
+
+    def iter_all(
+        self,
+        where: Where = None,
+        order_by: str | Sequence[str] | None = None,
+        batch_size: int = 1000,
+    ) -> Iterator[T]:
+        """
+        Iterates over objects matching a condition.
+
+        Without 'order_by' objects are filtered while iterating, otherwise
+        the matching objects are sorted first.
+
+        Args:
+            where (Where): The condition to filter objects.
+            order_by (str | Sequence[str] | None): Field name or sequence of \
+                field names, '-name' for descending order.
+            batch_size (int): Not used, objects are already in memory.
+
+        Returns:
+            Iterator[T]: The matching objects.
+        """
+        objs = self._filter(where)
+        if order_by is None:
+            return objs
+        return iter(sort_objects(objs, order_by))
+
+    def page(
+        self,
+        limit: int,
+        after_pk: int | None = None,
+        after_key: Any = None,
+        key: str = "pk",
+        where: Where = None,
+    ) -> list[T]:
+        """
+        Retrieves a page of objects ordered by ('key', pk) using keyset \
+            pagination.
+
+        Only the 'limit' smallest matching objects are kept while scanning.
+
+        Args:
+            limit (int): Maximum number of objects on the page.
+            after_pk (int | None): Primary key of the last object of the \
+                previous page, None for the first page.
+            after_key (Any): 'key' value of the last object of the previous \
+                page, ignored when paginating by pk.
+            key (str): The field to order by. Default is pk.
+            where (Where): The condition to filter objects.
+
+        Returns:
+            list[T]: Up to 'limit' objects.
+        """
+        if key == "pk":
+            after_key = after_pk
+
+        def sort_key(obj: T) -> tuple:
+            return getattr(obj, key), obj.pk
+
+        objs = self._filter(where)
+        if after_pk is not None:
+            objs = (obj for obj in objs if sort_key(obj) > (after_key, after_pk))
+        return nsmallest(limit, objs, key=sort_key)
+
+    def find(self, query: Query) -> list[T]:
+        """
+        Retrieves objects selected, ordered and limited by a query specification.
+
+        Args:
+            query (Query): The query, its projection is ignored.
+
+        Returns:
+            list[T]: List of retrieved objects.
+        """
+        return replace(query, where=None).apply(self._filter(query.where))
+
+    def aggregate(
+        self, field: str, group_by: GroupBy = (), where: Where = None
+    ) -> list[Aggregate]:
+        """
+        Aggregates a field over the objects matching a condition.
+
+        Args:
+            field (str): The field to aggregate.
+            group_by (GroupBy): Fields and time buckets to group by.
+            where (Where): The condition to filter objects.
+
+        Returns:
+            list[Aggregate]: One aggregate per group, ordered by the groups.
+        """
+        return aggregate_objects(self._filter(where), field, group_by)
 
     def update(self, obj: T) -> None:
         """
-        Updates an object in the repository.
+        Updates an object in the repository, or stores it under its pk \
+            if there is no such object yet.
 
         Args:
             obj (T): The object to update.
@@ -80,6 +438,8 @@ class MemoryRepository(AbstractRepository[T]):
         if obj.pk == 0:
             raise ValueError("attempt to update object with unknown primary key")
         self._container[obj.pk] = obj
+        self._next_pk = max(self._next_pk, obj.pk + 1)
+        self._index(obj)
 
     def delete(self, pk: int) -> None:
         """
@@ -89,3 +449,131 @@ class MemoryRepository(AbstractRepository[T]):
             pk (int): The ID of the object to delete.
         """
         self._container.pop(pk)
+        self._unindex(pk)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Adds objects to the repository and returns their IDs.
+
+        Args:
+            objs (Iterable[T]): Objects to add to the repository.
+
+        Returns:
+            list[int]: The IDs of the added objects.
+        """
+        pks: list[int] = []
+        added: list[T] = []
+        try:
+            for obj in objs:
+                if getattr(obj, "pk", None) != 0:
+                    raise ValueError(
+                        f"trying to add object {obj} with filled `pk` attribute"
+                    )
+                pk = self._next_pk
+                self._next_pk += 1
+                self._container[pk] = obj
+                obj.pk = pk
+                added.append(obj)
+                pks.append(pk)
+        finally:
+            # objects added before a failure stay stored, so index them too
+            self._index_new(added)
+        return pks
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """
+        Updates several objects in the repository.
+
+        Args:
+            objs (Iterable[T]): The objects to update.
+
+        Raises:
+            ValueError: If an object's primary key is unknown (pk=0).
+        """
+        for obj in objs:
+            if obj.pk == 0:
+                raise ValueError("attempt to update object with unknown primary key")
+            self._container[obj.pk] = obj
+            self._next_pk = max(self._next_pk, obj.pk + 1)
+            self._index(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """
+        Deletes several objects from the repository by their IDs.
+
+        Args:
+            pks (Iterable[int]): The IDs of the objects to delete.
+        """
+        for pk in pks:
+            self._container.pop(pk)
+            self._unindex(pk)
+
+    def save(self, path: str) -> None:
+        """
+        Saves the objects, the pk counter and the indexes to a binary \
+            snapshot file.
+
+        Objects of a single dataclass are stored column by column. The file
+        is written next to 'path' and then renamed, so an existing snapshot
+        is never left half-written.
+
+        Args:
+            path (str): Path of the snapshot file.
+        """
+        cls, data = _encode_objects(list(self._container.values()))
+        state = {
+            "version": SNAPSHOT_VERSION,
+            "next_pk": self._next_pk,
+            "pks": list(self._container),
+            "class": cls,
+            "objects": data,
+            "indexes": self._indexes,
+            "indexed": (
+                list(self._indexed),
+                [list(column) for column in zip(*self._indexed.values())],
+            ),
+        }
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MemoryRepository":
+        """
+        Loads a repository from a snapshot written by save.
+
+        The file is unpickled straight from a buffered reader; the indexes
+        are restored as saved instead of being rebuilt. Snapshots are pickles:
+        only load files from a trusted source.
+
+        Args:
+            path (str): Path of the snapshot file.
+
+        Returns:
+            MemoryRepository: The restored repository.
+
+        Raises:
+            ValueError: If the file is not a snapshot of a supported version.
+        """
+        # the collector would rescan the growing heap many times while
+        # millions of objects are created, and none of them form cycles
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, "rb") as file:
+                state = pickle.load(file)
+            if not isinstance(state, dict) or state.get("version") != SNAPSHOT_VERSION:
+                raise ValueError(f"'{path}' is not a supported repository snapshot")
+            repo = cls()
+            repo._next_pk = state["next_pk"]
+            repo._container = dict(
+                zip(state["pks"], _decode_objects(state["class"], state["objects"]))
+            )
+            repo._indexes = state["indexes"]
+            pks, columns = state["indexed"]
+            repo._indexed = dict(zip(pks, zip(*columns)))
+        finally:
+            if collecting:
+                gc.enable()
+        return repo
@@ -0,0 +1,345 @@
+"""
+Versioned database schema migrations.
+
+The schema version of a database is kept in 'PRAGMA user_version' and equals
+the number of steps from MIGRATIONS applied to it. Pending steps are applied
+in order, each one atomically together with the version bump.
+Every step is idempotent, so databases created by versions of the application
+that did not track the schema version are upgraded from version 0 safely.
+
+Tables listed in TABLES are created by the migrations only; repositories of
+other classes still create their tables on construction.
+"""
+
+import re
+import sqlite3
+import threading
+import configparser
+from datetime import datetime
+from typing import Callable
+from bookkeeper.utils.sqlite_utils import SQLite
+from bookkeeper.utils.sqlite_utils import MONEY_COLUMN_TYPE, MONEY_SCALE
+from bookkeeper.utils.sqlite_utils import TIMESTAMP_COLUMN_TYPE, to_timestamp
+
+# Default of the time a record was added, in the stored timestamp format
+ADDED_DATE_DEFAULT = "(strftime('%s', 'now', 'localtime') * 1000000)"
+
+# Schema created by the first step (create_tables). It is frozen: changing it
+# would give new databases a different history than upgraded ones, so tables
+# added later are created by their own steps only.
+TABLES: dict[str, str] = {
+    "category": """
+    CREATE TABLE IF NOT EXISTS "category" (
+        "name"	str UNIQUE,
+        "parent"	int,
+        "pk"	INTEGER UNIQUE,
+        FOREIGN KEY("parent") REFERENCES "category",
+        PRIMARY KEY("pk" AUTOINCREMENT)
+    )
+    """,
+    "expense": f"""
+    CREATE TABLE IF NOT EXISTS "expense" (
+        "amount"  {MONEY_COLUMN_TYPE} NOT NULL,
+        "category"	int NOT NULL,
+        "expense_date"	{TIMESTAMP_COLUMN_TYPE} NOT NULL,
+        "added_date"	{TIMESTAMP_COLUMN_TYPE} NOT NULL
+            DEFAULT {ADDED_DATE_DEFAULT},
+        "comment"	str,
+        "pk"	INTEGER UNIQUE,
+        FOREIGN KEY("category") REFERENCES category(pk),
+        PRIMARY KEY("pk" AUTOINCREMENT)
+    )
+    """,
+    "budget": f"""
+    CREATE TABLE IF NOT EXISTS "budget" (
+        "limit_amount"	{MONEY_COLUMN_TYPE} NOT NULL,
+        "period_type"	PeriodType NOT NULL UNIQUE,
+        "expenses"	{MONEY_COLUMN_TYPE} DEFAULT 0,
+        "pk"	INTEGER UNIQUE,
+        PRIMARY KEY("pk" AUTOINCREMENT)
+    )
+    """,
+}
+
+# Indexes created by the third step (create_indexes), frozen as well
+INDEXES: list[str] = [
+    'CREATE INDEX IF NOT EXISTS "expense_category_idx" ON "expense" ("category")',
+    'CREATE INDEX IF NOT EXISTS "expense_expense_date_idx" ON "expense" ("expense_date")',
+    'CREATE INDEX IF NOT EXISTS "category_parent_idx" ON "category" ("parent")',
+]
+
+# Registry of the expense partition tables, created by create_partition_registry
+PARTITION_REGISTRY_TABLE = f"""
+CREATE TABLE IF NOT EXISTS "expense_partition" (
+    "name"	TEXT PRIMARY KEY,
+    "start_date"	{TIMESTAMP_COLUMN_TYPE} NOT NULL,
+    "end_date"	{TIMESTAMP_COLUMN_TYPE} NOT NULL
+)
+"""
+
+# Monthly totals of archived expenses, created by create_expense_summary
+EXPENSE_SUMMARY_TABLE = f"""
+CREATE TABLE IF NOT EXISTS "expense_summary" (
+    "month"	{TIMESTAMP_COLUMN_TYPE} NOT NULL,
+    "category"	int NOT NULL,
+    "total"	{MONEY_COLUMN_TYPE} NOT NULL,
+    "count"	int NOT NULL,
+    PRIMARY KEY("month", "category")
+)
+"""
+
+MONEY_UPGRADE = (
+    "Decimal",
+    MONEY_COLUMN_TYPE,
+    f"CAST(ROUND({{column}} * {10 ** MONEY_SCALE}) AS INTEGER)",
+)
+TIMESTAMP_UPGRADE = ("datetime", TIMESTAMP_COLUMN_TYPE, "iso_to_timestamp({column})")
+
+# Defaults of upgraded columns, replacing the legacy ones:
+# table -> column -> default expression
+COLUMN_DEFAULTS: dict[str, dict[str, str]] = {
+    "expense": {"added_date": ADDED_DATE_DEFAULT},
+}
+
+# A DEFAULT value: a string literal, an expression in parentheses or a token
+DEFAULT_VALUE = (
+    r"(?:'(?:[^']|'')*'|\((?:[^()']|'(?:[^']|'')*'|\([^()]*\))*\)|[^\s,()]+)"
+)
+
+# Columns whose storage format changed:
+# table -> column -> (legacy declared type, new declared type, conversion SQL)
+COLUMN_UPGRADES: dict[str, dict[str, tuple[str, str, str]]] = {
+    "expense": {
+        "amount": MONEY_UPGRADE,
+        "expense_date": TIMESTAMP_UPGRADE,
+        "added_date": TIMESTAMP_UPGRADE,
+    },
+    "budget": {
+        "limit_amount": MONEY_UPGRADE,
+        "expenses": MONEY_UPGRADE,
+    },
+}
+
+
+def iso_to_timestamp(value: str | None) -> int | None:
+    """
+    Convert an ISO 8601 datetime string to integer microseconds since the epoch.
+
+    Parameters:
+        value (str | None): ISO 8601 datetime.
+
+    Returns:
+        int | None: Microseconds since the epoch.
+    """
+    return None if value is None else to_timestamp(datetime.fromisoformat(value))
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """
+    Create the application tables that are missing.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection to the database to migrate.
+    """
+    for statement in TABLES.values():
+        conn.execute(statement)
+
+
+def set_default(create_sql: str, column: str, column_type: str, default: str) -> str:
+    """
+    Replace or add the default of a column in a CREATE TABLE statement.
+
+    Parameters:
+        create_sql (str): The CREATE TABLE statement.
+        column (str): The column name.
+        column_type (str): The declared type of the column.
+        default (str): The new default expression.
+
+    Returns:
+        str: The statement with the new default.
+    """
+    pattern = (
+        rf'("?{column}"?\s+{column_type}\b(?:\s+NOT\s+NULL)?)'
+        rf"(?:\s+DEFAULT\s+{DEFAULT_VALUE})?"
+    )
+    return re.sub(
+        pattern,
+        lambda match: f"{match.group(1)} DEFAULT {default}",
+        create_sql,
+        count=1,
+        flags=re.IGNORECASE,
+    )
+
+
+def upgrade_columns(conn: sqlite3.Connection) -> None:
+    """
+    Convert columns stored in a legacy format to the current one.
+
+    SQLite cannot change the type of a column, so every table that still has
+    a legacy column is rebuilt with the new column types and defaults, and
+    its rows are copied through the conversion expressions. Tables that are
+    already converted are left untouched.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection to the database to migrate.
+    """
+    conn.create_function("iso_to_timestamp", 1, iso_to_timestamp, deterministic=True)
+    for table, upgrades in COLUMN_UPGRADES.items():
+        info = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+        legacy = {
+            row[1]: upgrades[row[1]]
+            for row in info
+            if row[1] in upgrades and row[2] == upgrades[row[1]][0]
+        }
+        if not legacy:
+            continue
+
+        (create_sql,) = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table,),
+        ).fetchone()
+        for column, (old_type, new_type, _) in legacy.items():
+            create_sql = re.sub(
+                rf'("?{column}"?\s+){old_type}\b', rf"\g<1>{new_type}", create_sql
+            )
+            default = COLUMN_DEFAULTS.get(table, {}).get(column)
+            if default is not None:
+                create_sql = set_default(create_sql, column, new_type, default)
+        columns = [row[1] for row in info]
+        values = [
+            legacy[column][2].format(column=column) if column in legacy else column
+            for column in columns
+        ]
+
+        conn.execute(f'ALTER TABLE "{table}" RENAME TO "{table}_legacy"')
+        conn.execute(create_sql)
+        conn.execute(
+            f'INSERT INTO "{table}" ({", ".join(columns)}) '
+            f'SELECT {", ".join(values)} FROM "{table}_legacy"'
+        )
+        conn.execute(f'DROP TABLE "{table}_legacy"')
+
+
+def create_indexes(conn: sqlite3.Connection) -> None:
+    """
+    Create the indexes that are missing.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection to the database to migrate.
+    """
+    for statement in INDEXES:
+        conn.execute(statement)
+
+
+def create_partition_registry(conn: sqlite3.Connection) -> None:
+    """
+    Create the registry of the expense partition tables, see
+    bookkeeper.repository.partitioned_expense_repository.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection to the database to migrate.
+    """
+    conn.execute(PARTITION_REGISTRY_TABLE)
+
+
+def create_expense_summary(conn: sqlite3.Connection) -> None:
+    """
+    Create the monthly totals of the archived expenses, see
+    bookkeeper.repository.expense_archive.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection to the database to migrate.
+    """
+    conn.execute(EXPENSE_SUMMARY_TABLE)
+
+
+# Ordered migration steps, the schema version is the number of applied steps.
+# Never reorder or remove steps, append new ones.
+MIGRATIONS: list[Callable[[sqlite3.Connection], None]] = [
+    create_tables,
+    upgrade_columns,
+    create_indexes,
+    create_partition_registry,
+    create_expense_summary,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+_migrated: set[str] = set()
+_migrated_lock = threading.Lock()
+
+
+def apply_migrations(conn: sqlite3.Connection) -> int:
+    """
+    Apply the pending migrations to a database.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection to the database to migrate.
+
+    Returns:
+        int: The schema version of the database.
+
+    Raises:
+        RuntimeError: If the database was created by a newer application version.
+    """
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than "
+            f"the supported version {SCHEMA_VERSION}"
+        )
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        # a savepoint also works inside a transaction opened by the caller
+        conn.execute("SAVEPOINT migration")
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+        except BaseException:
+            conn.execute("ROLLBACK TO migration")
+            conn.execute("RELEASE migration")
+            raise
+        conn.execute("RELEASE migration")
+    return SCHEMA_VERSION
+
+
+def migrate(db_name: str = None) -> int:
+    """
+    Bring a database up to the current schema version, creating it if needed.
+
+    Parameters:
+        db_name (str): Name (path to) the database. Default is db_name \
+            from settings.ini.
+
+    Returns:
+        int: The schema version of the database.
+    """
+    if not db_name:
+        config = configparser.ConfigParser()
+        config.read("bookkeeper/config/settings.ini")
+        db_name = config["sqllite"]["db_name"]
+
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    try:
+        version = apply_migrations(conn)
+    finally:
+        conn.close()
+    with _migrated_lock:
+        _migrated.add(db_name)
+    return version
+
+
+def ensure_migrated(db: SQLite) -> None:
+    """
+    Migrate the database of 'db' unless that was already done by this process.
+    In-memory databases are checked every time, as each connection has its own.
+
+    Parameters:
+        db (SQLite): The database to migrate.
+    """
+    with _migrated_lock:
+        if db.db_name in _migrated:
+            return
+        with db:
+            apply_migrations(db.conn)
+        if db.db_name != ":memory:":
+            _migrated.add(db.db_name)
@@ -0,0 +1,613 @@
+"""
+Module for the PartitionedExpenseRepository class.
+
+Expenses are split by expense date into tables of the same database file.
+Recent expenses stay in the 'expense' table, older ones live in one table per
+period, named like expense_2023 for yearly partitions or expense_2023_04 for
+shorter ones, and listed in the 'expense_partition' registry. Reads restricted
+to a date range only scan the partitions overlapping it.
+
+Partitioning is enabled by the 'partition_months' option of the [sqllite]
+section of settings.ini, see create_expense_repository.
+"""
+
+from bisect import insort
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable
+
+from bookkeeper.repository.expense_repository import ExpenseRepository
+from bookkeeper.repository.query import And, Condition, Predicate, Where
+from bookkeeper.repository.query import as_predicate
+from bookkeeper.repository.sqlite_repository import BATCH_SIZE, config
+from bookkeeper.models.expense import Expense
+from bookkeeper.utils.date_utils import get_month_boundaries, get_week_boundaries
+from bookkeeper.utils.sqlite_utils import MONEY_COLUMN_TYPE, TIMESTAMP_COLUMN_TYPE
+from bookkeeper.utils.utils import batched
+
+# Columns of the partition tables, shared with the archive table
+EXPENSE_COLUMNS = f"""
+    "amount"  {MONEY_COLUMN_TYPE} NOT NULL,
+    "category"	int NOT NULL,
+    "expense_date"	{TIMESTAMP_COLUMN_TYPE} NOT NULL,
+    "added_date"	{TIMESTAMP_COLUMN_TYPE} NOT NULL,
+    "comment"	str,
+    "pk"	INTEGER PRIMARY KEY"""
+
+PARTITION_TABLE = f"""
+CREATE TABLE IF NOT EXISTS "{{name}}" ({EXPENSE_COLUMNS},
+    FOREIGN KEY("category") REFERENCES category(pk)
+)
+"""
+
+# Most parameters bound to one statement, the default limit of SQLite before 3.32
+MAX_VARIABLES = 999
+
+PARTITION_INDEXES: list[str] = [
+    'CREATE INDEX IF NOT EXISTS "{name}_category_idx" ON "{name}" ("category")',
+    'CREATE INDEX IF NOT EXISTS "{name}_expense_date_idx" ON "{name}" ("expense_date")',
+]
+
+
+@dataclass(frozen=True)
+class Partition:
+    """
+    Table holding the expenses dated from 'start' (inclusive) to 'end'
+    (exclusive).
+    """
+
+    name: str
+    start: datetime
+    end: datetime
+
+    def contains(self, day: datetime) -> bool:
+        """Tell whether an expense dated 'day' belongs to the partition."""
+        return self.start <= day < self.end
+
+    def overlaps(self, low: datetime | None, high: datetime | None) -> bool:
+        """Tell whether the partition may hold expenses dated from low to high."""
+        return (low is None or self.end > low) and (high is None or self.start <= high)
+
+
+def add_months(day: datetime, months: int) -> datetime:
+    """
+    Move the first day of a month by a number of months.
+
+    Args:
+        day (datetime): The first day of a month.
+        months (int): Number of months to add.
+
+    Returns:
+        datetime: The first day of the resulting month.
+    """
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    return datetime(year, month + 1, 1)
+
+
+def date_range(predicate: Predicate | None) -> tuple[datetime | None, datetime | None]:
+    """
+    Find the bounds of expense dates a condition can match.
+
+    Args:
+        predicate (Predicate | None): The condition.
+
+    Returns:
+        tuple[datetime | None, datetime | None]: The lowest and highest \
+            matching dates, None where unbounded.
+    """
+    low: datetime | None = None
+    high: datetime | None = None
+    if isinstance(predicate, Condition):
+        if predicate.field == "expense_date" and isinstance(predicate.value, datetime):
+            if predicate.op in ("=", ">", ">="):
+                low = predicate.value
+            if predicate.op in ("=", "<", "<="):
+                high = predicate.value
+    elif isinstance(predicate, And):
+        for condition in predicate.conditions:
+            start, end = date_range(condition)
+            if start is not None:
+                low = start if low is None else max(low, start)
+            if end is not None:
+                high = end if high is None else min(high, end)
+    return low, high
+
+
+class PartitionedExpenseRepository(ExpenseRepository):
+    """
+    Expense repository keeping old expenses in time partitions.
+
+    Expenses dated from hot_start on are kept in the 'expense' table, so
+    queries of the current week and month, like the budget ones, read a small
+    table. Expenses added with an older date go to their partition directly,
+    and the ones that grow older than hot_start are moved to their partitions
+    by rotate, run by the archive_db maintenance script. Primary keys stay
+    unique across all tables.
+
+    Args:
+        db_file (str): The path to the SQLite database file.
+        persistent (bool): Reuse a long-lived connection per thread.
+        months (int): Number of months per partition, a divisor of 12. \
+            Default is 12.
+        rotate (bool): Move expired expenses of the 'expense' table to their \
+            partitions on creation. Default is False.
+
+    Attributes:
+        months (int): Number of months per partition.
+        hot_start (datetime): The first expense date kept in the 'expense' table.
+    """
+
+    def __init__(
+        self,
+        db_file: str = None,
+        persistent: bool = True,
+        months: int = 12,
+        rotate: bool = False,
+    ) -> None:
+        """Initialize PartitionedExpenseRepository."""
+        if months < 1 or 12 % months:
+            raise ValueError("partition length must be a divisor of 12 months")
+        super().__init__(db_file, persistent)
+        self.months: int = months
+        now = datetime.now()
+        recent = min(get_week_boundaries(now)[0], get_month_boundaries(now)[0])
+        # existing partitions of a shorter length may reach past the period start
+        self.hot_start: datetime = max(
+            [self.period_start(recent), *(p.end for p in self.partitions())]
+        )
+        if rotate:
+            self.rotate()
+
+    def period_start(self, day: datetime) -> datetime:
+        """
+        Get the start of the partition period containing a day.
+
+        Args:
+            day (datetime): The day.
+
+        Returns:
+            datetime: The first day of the period.
+        """
+        return datetime(day.year, (day.month - 1) // self.months * self.months + 1, 1)
+
+    def partitions(self) -> list[Partition]:
+        """
+        Read the partition registry.
+
+        Returns:
+            list[Partition]: The partitions ordered by start date.
+        """
+        rows = self.db.fetch_rows(
+            "SELECT name, start_date, end_date FROM expense_partition "
+            "ORDER BY start_date"
+        )[1]
+        return [Partition(*row) for row in rows]
+
+    def _create_partition(self, day: datetime, partitions: list[Partition]) -> str:
+        """
+        Create the partition of a day, clipped to the existing partitions.
+
+        Args:
+            day (datetime): Date of an expense without a partition.
+            partitions (list[Partition]): The partitions ordered by start \
+                date, the new one is inserted.
+
+        Returns:
+            str: Name of the partition table.
+        """
+        start = self.period_start(day)
+        end = min(add_months(start, self.months), self.hot_start)
+        for partition in partitions:
+            if start < partition.end <= day:
+                start = partition.end
+            if day < partition.start < end:
+                end = partition.start
+        if self.months == 12 and start.month == 1:
+            name = f"{self.table_name}_{start.year}"
+        else:
+            name = f"{self.table_name}_{start.year}_{start.month:02}"
+        self.db.execute(PARTITION_TABLE.format(name=name))
+        for statement in PARTITION_INDEXES:
+            self.db.execute(statement.format(name=name))
+        self.db.execute(
+            "INSERT INTO expense_partition (name, start_date, end_date) VALUES (?, ?, ?)",
+            (name, start, end),
+        )
+        insort(partitions, Partition(name, start, end), key=lambda p: p.start)
+        return name
+
+    def _route(self, day: datetime, partitions: list[Partition]) -> str:
+        """
+        Get the table an expense dated 'day' is stored in, creating its \
+            partition if needed.
+
+        Args:
+            day (datetime): The expense date.
+            partitions (list[Partition]): The partitions ordered by start date.
+
+        Returns:
+            str: The table name.
+        """
+        if day >= self.hot_start:
+            return self.table_name
+        for partition in partitions:
+            if partition.contains(day):
+                return partition.name
+        return self._create_partition(day, partitions)
+
+    def _tables(self, partitions: list[Partition]) -> list[str]:
+        """Names of the 'expense' table and of the partition tables."""
+        return [self.table_name, *(partition.name for partition in partitions)]
+
+    def _source(self, where: Where = None) -> str:
+        """
+        Returns the union of the 'expense' table and of the partitions that \
+            may hold expenses matching 'where', aliased as 'expense'.
+
+        Args:
+            where (Where): Condition of the read.
+
+        Returns:
+            str: The table name or an aliased subquery.
+        """
+        low, high = date_range(as_predicate(where))
+        tables = self._tables([p for p in self.partitions() if p.overlaps(low, high)])
+        if len(tables) == 1:
+            return self.table_name
+        columns = ", ".join(self.fields)
+        union = " UNION ALL ".join(
+            f'SELECT {columns} FROM "{table}"' for table in tables
+        )
+        return f"({union}) AS {self.table_name}"
+
+    def _allocate(self, count: int, partitions: list[Partition]) -> int:
+        """
+        Reserves primary keys for new expenses in the 'expense' sequence.
+
+        Args:
+            count (int): Number of keys to reserve.
+            partitions (list[Partition]): The partitions.
+
+        Returns:
+            int: The first reserved key, the others follow it.
+        """
+        row = self.db.fetchone(
+            "SELECT seq FROM sqlite_sequence WHERE name = ?", (self.table_name,)
+        )
+        # MAX(pk) of a single table is one lookup in its primary key b-tree
+        tops = " UNION ALL ".join(
+            f'SELECT MAX(pk) AS pk FROM "{table}"' for table in self._tables(partitions)
+        )
+        top = self.db.fetchone(f"SELECT MAX(pk) AS pk FROM ({tops})")["pk"]
+        first = max(row["seq"] if row else 0, top or 0) + 1
+        last = first + count - 1
+        cur = self.db.execute(
+            "UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (last, self.table_name)
+        )
+        if not cur.rowcount:
+            self.db.execute(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                (self.table_name, last),
+            )
+        return first
+
+    def _insert(self, table: str, params: list[tuple]) -> None:
+        """
+        Inserts rows of (pk, *field values) into a table.
+
+        Args:
+            table (str): The table name.
+            params (list[tuple]): The rows.
+        """
+        fields = [field for field in self.fields if field != "pk"]
+        columns = ", ".join(["pk", *fields])
+        inject = ", ".join(["?"] * (len(fields) + 1))
+        self.db.executemany(
+            f'INSERT INTO "{table}" ({columns}) VALUES ({inject})', params
+        )
+
+    def _locate(self, pks: list[int], partitions: list[Partition]) -> dict[int, str]:
+        """
+        Finds the tables holding expenses.
+
+        Args:
+            pks (list[int]): The primary keys of the expenses.
+            partitions (list[Partition]): The partitions.
+
+        Returns:
+            dict[int, str]: The table names by primary key, expenses that \
+                do not exist are left out.
+        """
+        found: dict[int, str] = {}
+        for chunk in batched(pks, MAX_VARIABLES):
+            inject = ", ".join(["?"] * len(chunk))
+            for table in self._tables(partitions):
+                rows = self.db.fetch_rows(
+                    f'SELECT pk FROM "{table}" WHERE pk IN ({inject})', tuple(chunk)
+                )[1]
+                found.update((pk, table) for (pk,) in rows)
+        return found
+
+    def _writes(
+        self, objs: list[Expense], partitions: list[Partition], insert: bool
+    ) -> tuple[dict[str, list[tuple]], dict[str, list[tuple]], dict[str, list[tuple]]]:
+        """
+        Plans the writes storing expenses with known primary keys in the \
+            tables of their dates.
+
+        Args:
+            objs (list[Expense]): The expenses.
+            partitions (list[Partition]): The partitions.
+            insert (bool): Insert the expenses that do not exist, otherwise \
+                they are skipped.
+
+        Returns:
+            tuple: Parameters of the updates, the deletes and the inserts, \
+                by table name.
+        """
+        fields = [field for field in self.fields if field != "pk"]
+        # the last write of a key wins, as if the expenses were written in turn
+        latest = {obj.pk: obj for obj in objs}
+        current = self._locate(list(latest), partitions)
+        updates: dict[str, list[tuple]] = {}
+        deletes: dict[str, list[tuple]] = {}
+        inserts: dict[str, list[tuple]] = {}
+        for pk, obj in latest.items():
+            values = self._values(obj, fields)
+            source = current.get(pk)
+            target = self._route(obj.expense_date, partitions)
+            if source == target:
+                updates.setdefault(target, []).append((*values, pk))
+                continue
+            if source is not None:
+                deletes.setdefault(source, []).append((pk,))
+            elif not insert:
+                continue
+            inserts.setdefault(target, []).append((pk, *values))
+        return updates, deletes, inserts
+
+    def _store(
+        self, objs: list[Expense], partitions: list[Partition], insert: bool
+    ) -> None:
+        """
+        Writes expenses with known primary keys to the tables of their dates, \
+            moving them there from other tables if their dates changed.
+
+        Args:
+            objs (list[Expense]): The expenses.
+            partitions (list[Partition]): The partitions.
+            insert (bool): Insert the expenses that do not exist, otherwise \
+                they are skipped.
+        """
+        updates, deletes, inserts = self._writes(objs, partitions, insert)
+        fields = [field for field in self.fields if field != "pk"]
+        columns = ", ".join(f"{field} = ?" for field in fields)
+        for table, params in updates.items():
+            self.db.executemany(f'UPDATE "{table}" SET {columns} WHERE pk = ?', params)
+        for table, params in deletes.items():
+            self.db.executemany(f'DELETE FROM "{table}" WHERE pk = ?', params)
+        for table, params in inserts.items():
+            self._insert(table, params)
+
+    def rotate(self) -> int:
+        """
+        Moves expenses dated before hot_start from the 'expense' table to \
+            their partitions in one transaction.
+
+        Returns:
+            int: Number of moved expenses.
+        """
+        # skip the write lock when there is nothing to move
+        if not self.db.fetchone(
+            f"SELECT pk FROM {self.table_name} WHERE expense_date < ? LIMIT 1",
+            (self.hot_start,),
+        ):
+            return 0
+        columns = ", ".join(self.fields)
+        with self.db.transaction():
+            rows = self.db.fetch_rows(
+                f"SELECT pk, expense_date FROM {self.table_name} "
+                "WHERE expense_date < ?",
+                (self.hot_start,),
+            )[1]
+            partitions = self.partitions()
+            moved: dict[str, list[int]] = {}
+            for pk, expense_date in rows:
+                moved.setdefault(self._route(expense_date, partitions), []).append(pk)
+            for table, pks in moved.items():
+                for batch in batched(pks, 500):
+                    inject = ", ".join(["?"] * len(batch))
+                    self.db.execute(
+                        f'INSERT INTO "{table}" ({columns}) SELECT {columns} '
+                        f"FROM {self.table_name} WHERE pk IN ({inject})",
+                        tuple(batch),
+                    )
+            self.db.execute(
+                f"DELETE FROM {self.table_name} WHERE expense_date < ?",
+                (self.hot_start,),
+            )
+        return len(rows)
+
+    def add(self, obj: Expense) -> int:
+        """
+        Adds an expense to the table of its date.
+
+        Args:
+            obj (Expense): The expense to add.
+
+        Returns:
+            int: The primary key of the added expense.
+
+        Raises:
+            ValueError: If the object already has a primary key (pk).
+        """
+        return self.add_many([obj])[0]
+
+    def add_many(
+        self, objs: Iterable[Expense], batch_size: int = BATCH_SIZE
+    ) -> list[int]:
+        """
+        Adds expenses to the tables of their dates in a single transaction.
+
+        Args:
+            objs (Iterable[Expense]): The expenses to add.
+            batch_size (int): Number of expenses per batch.
+
+        Returns:
+            list[int]: The primary keys of the added expenses, in order.
+
+        Raises:
+            ValueError: If an object already has a primary key (pk).
+        """
+        fields = [field for field in self.fields if field != "pk"]
+        pks: list[int] = []
+        with self.db.transaction():
+            partitions = self.partitions()
+            for batch in batched(objs, batch_size):
+                self._check_new(batch)
+                first = self._allocate(len(batch), partitions)
+                tables: dict[str, list[tuple]] = {}
+                for pk, obj in enumerate(batch, start=first):
+                    table = self._route(obj.expense_date, partitions)
+                    tables.setdefault(table, []).append(
+                        (pk, *self._values(obj, fields))
+                    )
+                for table, params in tables.items():
+                    self._insert(table, params)
+                for pk, obj in enumerate(batch, start=first):
+                    obj.pk = pk
+                    pks.append(pk)
+        return pks
+
+    def update(self, obj: Expense) -> None:
+        """
+        Updates an expense, moving it to another table if its date requires.
+
+        Args:
+            obj (Expense): The expense to update.
+
+        Raises:
+            ValueError: If the object's primary key (pk) is unknown.
+        """
+        self.update_many([obj])
+
+    def update_many(
+        self, objs: Iterable[Expense], batch_size: int = BATCH_SIZE
+    ) -> None:
+        """
+        Updates expenses in a single transaction.
+
+        Args:
+            objs (Iterable[Expense]): The expenses to update.
+            batch_size (int): Number of expenses per batch.
+
+        Raises:
+            ValueError: If an object's primary key (pk) is unknown.
+        """
+        with self.db.transaction():
+            partitions = self.partitions()
+            for batch in batched(objs, batch_size):
+                for obj in batch:
+                    if obj.pk == 0:
+                        raise ValueError(
+                            "attempt to update object with unknown primary key"
+                        )
+                self._store(batch, partitions, insert=False)
+
+    def upsert_many(
+        self, objs: Iterable[Expense], batch_size: int = BATCH_SIZE
+    ) -> None:
+        """
+        Stores expenses with the primary keys they already have in a single \
+            transaction: missing ones are inserted, existing ones updated.
+
+        Args:
+            objs (Iterable[Expense]): The expenses to store, with pk set.
+            batch_size (int): Number of expenses per batch.
+
+        Raises:
+            ValueError: If an object's primary key (pk) is unknown.
+        """
+        with self.db.transaction():
+            partitions = self.partitions()
+            for batch in batched(objs, batch_size):
+                for obj in batch:
+                    if obj.pk == 0:
+                        raise ValueError(
+                            "attempt to upsert object with unknown primary key"
+                        )
+                self._store(batch, partitions, insert=True)
+            # keep new keys above the upserted ones
+            self._allocate(0, partitions)
+
+    def delete(self, pk: int) -> None:
+        """
+        Deletes an expense from the table holding it.
+
+        Args:
+            pk (int): The primary key of the expense to delete.
+
+        Raises:
+            KeyError: If the expense does not exist.
+        """
+        self.delete_many([pk])
+
+    def delete_many(
+        self,
+        pks: Iterable[int],
+        batch_size: int = BATCH_SIZE,
+        missing_ok: bool = False,
+    ) -> None:
+        """
+        Deletes expenses from all tables in a single transaction.
+
+        Args:
+            pks (Iterable[int]): The primary keys of the expenses to delete.
+            batch_size (int): Number of rows per executemany call.
+            missing_ok (bool): Skip primary keys without a record instead \
+                of raising. Default is False.
+
+        Raises:
+            KeyError: If any of the expenses does not exist, nothing is \
+                deleted then.
+        """
+        with self.db.transaction():
+            tables = self._tables(self.partitions())
+            for batch in batched(pks, batch_size):
+                params: list[Any] = [(pk,) for pk in batch]
+                deleted = sum(
+                    self.db.executemany(
+                        f'DELETE FROM "{table}" WHERE pk = ?', params
+                    ).rowcount
+                    for table in tables
+                )
+                if deleted != len(batch) and not missing_ok:
+                    raise KeyError(
+                        f"Records with pk in {batch} do not exist "
+                        f"in the '{self.table_name}' table"
+                    )
+
+
+def create_expense_repository(
+    db_file: str = None, persistent: bool = True
+) -> ExpenseRepository:
+    """
+    Creates the expense repository configured in settings.ini.
+
+    With 'partition_months' set in the [sqllite] section old expenses are kept
+    in partitions of that many months, otherwise all of them stay in the
+    'expense' table.
+
+    Args:
+        db_file (str): The path to the SQLite database file. Default is db_name \
+            from settings.ini.
+        persistent (bool): Reuse a long-lived connection per thread.
+
+    Returns:
+        ExpenseRepository: A PartitionedExpenseRepository or a plain \
+            ExpenseRepository.
+    """
+    months = config["sqllite"].getint("partition_months", fallback=0)
+    if months:
+        return PartitionedExpenseRepository(db_file, persistent, months)
+    return ExpenseRepository(db_file, persistent)
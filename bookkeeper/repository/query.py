@@ -0,0 +1,324 @@
+"""
+Module describing query specifications for repositories.
+
+A query selects records by a condition, orders them, limits the result and
+optionally projects it to a subset of columns. Repositories backed by
+a database compile it to SQL, in-memory repositories evaluate it directly.
+
+Conditions:
+    Condition("amount", ">=", 100)
+    Condition("category", "in", [1, 2]) & Condition("comment", "!=", "")
+    Or(Condition("category", "=", 1), Condition("category", "=", 2))
+A dictionary {'field_name': value} is a conjunction of equalities.
+
+Aggregations group records by fields and by time buckets of datetime fields:
+    ["category", Bucket("expense_date", PeriodType.MONTH)]
+"""
+
+import operator
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Iterable, Sequence, TypeVar, Union
+from bookkeeper.models.budget import PeriodType
+from bookkeeper.utils.date_utils import get_month_boundaries, get_week_boundaries
+
+T = TypeVar("T")
+
+# Supported comparison operators and their evaluation in Python
+OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, values: value in values,
+    "not in": lambda value, values: value not in values,
+}
+
+
+class Predicate(ABC):
+    """
+    Base class of query conditions, combined with '&' and '|'.
+    """
+
+    def __and__(self, other: "Predicate") -> "And":
+        return And(self, other)
+
+    def __or__(self, other: "Predicate") -> "Or":
+        return Or(self, other)
+
+    @abstractmethod
+    def matches(self, obj: Any) -> bool:
+        """Check whether an object satisfies the condition."""
+
+
+@dataclass(frozen=True)
+class Condition(Predicate):
+    """
+    Comparison of a field with a value.
+
+    Attributes:
+        field (str): The field name.
+        op (str): One of OPERATORS.
+        value (Any): The value to compare with, a collection for 'in' and \
+            'not in'. Comparisons follow SQL: '= None' and '!= None' test \
+            for NULL, other comparisons of NULL never match.
+    """
+
+    field: str
+    op: str
+    value: Any
+
+    def __post_init__(self) -> None:
+        if self.op not in OPERATORS:
+            raise ValueError(f"unknown operator '{self.op}'")
+        if self.op in ("in", "not in"):
+            object.__setattr__(self, "value", tuple(self.value))
+
+    def matches(self, obj: Any) -> bool:
+        value = getattr(obj, self.field)
+        if self.value is None:
+            if self.op == "=":
+                return value is None
+            if self.op == "!=":
+                return value is not None
+            return False
+        if value is None:
+            # a comparison with NULL is never true in SQL
+            return False
+        return OPERATORS[self.op](value, self.value)
+
+
+class _Compound(Predicate):  # pylint: disable=abstract-method
+    """
+    Base class of conditions combining other conditions.
+    """
+
+    def __init__(self, *conditions: Predicate) -> None:
+        self.conditions: tuple[Predicate, ...] = conditions
+
+    def __eq__(self, other: object) -> bool:
+        return type(other) is type(self) and other.conditions == self.conditions
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}{self.conditions!r}"
+
+
+class And(_Compound):  # pylint: disable=too-few-public-methods
+    """
+    Conjunction of conditions, true if there are none.
+    """
+
+    def matches(self, obj: Any) -> bool:
+        return all(condition.matches(obj) for condition in self.conditions)
+
+
+class Or(_Compound):  # pylint: disable=too-few-public-methods
+    """
+    Disjunction of conditions, false if there are none.
+    """
+
+    def matches(self, obj: Any) -> bool:
+        return any(condition.matches(obj) for condition in self.conditions)
+
+
+Where = Union[dict[str, Any], Predicate, None]
+
+
+def as_predicate(where: Where) -> Predicate | None:
+    """
+    Convert a 'where' argument of a repository method to a predicate.
+    A dictionary {'field_name': value} becomes a conjunction of equalities.
+    """
+    if where is None or isinstance(where, Predicate):
+        return where
+    if not where:
+        return None
+    return And(*(Condition(field, "=", value) for field, value in where.items()))
+
+
+def parse_order_by(order_by: str | Sequence[str] | None) -> list[tuple[str, bool]]:
+    """
+    Parse an ordering specification.
+    'order_by' - field name or sequence of field names, a name prefixed
+    with '-' means descending order.
+    Return a list of (field_name, descending) pairs.
+    """
+    if order_by is None:
+        return []
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    return [
+        (field[1:], True) if field.startswith("-") else (field, False)
+        for field in order_by
+    ]
+
+
+def _nulls_first(value: Any) -> tuple:
+    """Sort key placing None before any other value."""
+    return (False, 0) if value is None else (True, value)
+
+
+def sort_objects(objs: Iterable[T], order_by: str | Sequence[str] | None) -> list[T]:
+    """
+    Sort objects by an ordering specification, see parse_order_by.
+    None values go first in ascending order, like in SQLite.
+    """
+    objs = list(objs)
+    for field, descending in reversed(parse_order_by(order_by)):
+        objs.sort(
+            key=lambda obj, f=field: _nulls_first(getattr(obj, f)), reverse=descending
+        )
+    return objs
+
+
+@dataclass
+class Query:
+    """
+    Query specification.
+
+    Attributes:
+        where (Where): Condition, {'field_name': value} or None for all records.
+        order_by (str | Sequence[str] | None): Field name or sequence of field \
+            names, '-name' for descending order.
+        limit (int | None): Maximum number of records, None for no limit.
+        offset (int): Number of records to skip.
+        columns (Sequence[str] | None): Fields to return by find_rows, \
+            None for all fields.
+    """
+
+    where: Where = None
+    order_by: str | Sequence[str] | None = None
+    limit: int | None = None
+    offset: int = 0
+    columns: Sequence[str] | None = None
+
+    def apply(self, objs: Iterable[T]) -> list[T]:
+        """
+        Evaluate the query (except the projection) over objects in memory.
+        """
+        predicate = as_predicate(self.where)
+        if predicate is not None:
+            objs = (obj for obj in objs if predicate.matches(obj))
+        objs = sort_objects(objs, self.order_by)
+        stop = None if self.limit is None else self.offset + self.limit
+        return objs[slice(self.offset, stop)]
+
+
+@dataclass(frozen=True)
+class Bucket:
+    """
+    Time bucket of a datetime field to group records by.
+
+    Attributes:
+        field (str): The datetime field name.
+        period (PeriodType): Length of the bucket: day, week (starting \
+            on Monday) or month.
+    """
+
+    field: str
+    period: PeriodType
+
+    def start(self, value: datetime | None) -> datetime | None:
+        """Get the start of the bucket containing a datetime."""
+        if value is None:
+            return None
+        if self.period == PeriodType.WEEK:
+            return get_week_boundaries(value)[0]
+        if self.period == PeriodType.MONTH:
+            return get_month_boundaries(value)[0]
+        return datetime.combine(value.date(), datetime.min.time())
+
+
+GroupBy = Sequence[Union[str, Bucket]]
+
+
+@dataclass
+class Aggregate:
+    """
+    Aggregated values of a field over a group of records.
+
+    Attributes:
+        group (tuple): Values of the grouping fields, in the group_by order; \
+            the start of the bucket for time buckets.
+        total (Any): Sum of the values, None if all of them are None.
+        count (int): Number of records in the group.
+        minimum (Any): The smallest value.
+        maximum (Any): The largest value.
+    """
+
+    group: tuple
+    total: Any
+    count: int
+    minimum: Any
+    maximum: Any
+
+
+def aggregate_objects(
+    objs: Iterable[Any], field: str, group_by: GroupBy = ()
+) -> list[Aggregate]:
+    """
+    Aggregate a field of objects in memory, see Aggregate.
+    None values are ignored by all aggregates except count, like in SQL.
+    Return the groups ordered by their values.
+    """
+    groups: dict[tuple, list] = {}
+    for obj in objs:
+        group = tuple(
+            (
+                key.start(getattr(obj, key.field))
+                if isinstance(key, Bucket)
+                else getattr(obj, key)
+            )
+            for key in group_by
+        )
+        groups.setdefault(group, []).append(getattr(obj, field))
+    result = []
+    for group in sorted(groups, key=lambda group: tuple(map(_nulls_first, group))):
+        values = [value for value in groups[group] if value is not None]
+        result.append(
+            Aggregate(
+                group,
+                sum(values[1:], values[0]) if values else None,
+                len(groups[group]),
+                min(values, default=None),
+                max(values, default=None),
+            )
+        )
+    return result
+
+
+def merge_aggregates(*results: Iterable[Aggregate]) -> list[Aggregate]:
+    """
+    Combine aggregates of disjoint sets of records grouped the same way.
+    Totals and counts of equal groups are added up, missing (None) values are
+    ignored like in aggregate_objects. Return the groups ordered by their values.
+    """
+    groups: dict[tuple, Aggregate] = {}
+    for result in results:
+        for item in result:
+            merged = groups.get(item.group)
+            if merged is None:
+                groups[item.group] = Aggregate(
+                    item.group, item.total, item.count, item.minimum, item.maximum
+                )
+                continue
+            merged.count += item.count
+            if item.total is not None:
+                merged.total = (
+                    item.total if merged.total is None else merged.total + item.total
+                )
+            merged.minimum = min(
+                (v for v in (merged.minimum, item.minimum) if v is not None),
+                default=None,
+            )
+            merged.maximum = max(
+                (v for v in (merged.maximum, item.maximum) if v is not None),
+                default=None,
+            )
+    return [
+        groups[group]
+        for group in sorted(groups, key=lambda group: tuple(map(_nulls_first, group)))
+    ]
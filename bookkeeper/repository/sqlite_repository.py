@@ -9,16 +9,42 @@ Classes:
 """
 
 import configparser
+from datetime import datetime
+from decimal import Decimal
 from inspect import get_annotations
-from typing import Any
+from operator import itemgetter
+from typing import Any, Callable, ContextManager, Iterable, Iterator, Sequence
 from bookkeeper.repository.abstract_repository import AbstractRepository, T
-from bookkeeper.utils.sqlite_utils import SQLite
+from bookkeeper.models.budget import PeriodType
+from bookkeeper.repository.query import And, Condition, Or, Predicate, Query, Where
+from bookkeeper.repository.query import Aggregate, Bucket, GroupBy
+from bookkeeper.repository.query import as_predicate, parse_order_by
+from bookkeeper.repository.migrations import TABLES, ensure_migrated
+from bookkeeper.utils.sqlite_utils import SQLite, to_minor_units
+from bookkeeper.utils.sqlite_utils import MONEY_COLUMN_TYPE, TIMESTAMP_COLUMN_TYPE
+from bookkeeper.utils.utils import batched, field_values
 
 
 config = configparser.ConfigParser()
 config.read("bookkeeper/config/settings.ini")
 db_name = config["sqllite"]["db_name"]
 
+# Declared column types of fields whose stored form differs from the type name
+COLUMN_TYPES: dict[type, str] = {
+    Decimal: MONEY_COLUMN_TYPE,
+    datetime: TIMESTAMP_COLUMN_TYPE,
+}
+
+# Number of rows sent to the database in one executemany call
+BATCH_SIZE = 1000
+
+# strftime modifiers turning a datetime into the start of its time bucket
+BUCKET_MODIFIERS: dict[PeriodType, str] = {
+    PeriodType.DAY: "'start of day'",
+    PeriodType.WEEK: "'-6 days', 'weekday 1', 'start of day'",
+    PeriodType.MONTH: "'start of month'",
+}
+
 
 class SQLiteRepository(AbstractRepository[T]):
     """
@@ -28,6 +54,8 @@ class SQLiteRepository(AbstractRepository[T]):
         cls (type): The class type of objects to be stored in the repository.
         db_file (str): The path to the SQLite database file. Default is db_name \
             from settings.ini.
+        persistent (bool): Reuse a long-lived connection per thread. Default is \
+            True, pass False to open a new connection for every call.
 
     Attributes:
         db (SQL): The SQL database connection.
@@ -35,9 +63,13 @@ class SQLiteRepository(AbstractRepository[T]):
         table_name (str): The name of the database table.
         fields (dict[str, Any]): The fields and their types of the objects \
             stored in the repository.
+        encoders (dict[str, Callable]): Conversions of field values to their \
+            stored form, e.g. Decimal amounts to integer minor units.
+        select_query (str): The query the read methods select records with, \
+            WHERE and ORDER BY clauses are appended to it.
     """
 
-    def __init__(self, cls: type, db_file: str = None) -> None:
+    def __init__(self, cls: type, db_file: str = None, persistent: bool = True) -> None:
         """
         Initializes the SQLiteRepository.
 
@@ -45,28 +77,43 @@ class SQLiteRepository(AbstractRepository[T]):
             cls (type): The class type of objects to be stored in the repository.
             db_file (str): The path to the SQLite database file. Default is db_name \
                 from settings.ini.
+            persistent (bool): Reuse a long-lived connection per thread. \
+                Default is True.
         """
 
         if db_file is None:
             db_file = config["sqllite"]["db_name"]
 
-        self.db: SQLite = SQLite(db_file)
+        self.db: SQLite = SQLite(db_file, persistent)
         self.cls: type = cls
         self.table_name: str = cls.__name__.lower()
         self.fields: dict[str, Any] = get_annotations(cls, eval_str=True)
-        self.__create_table()
+        self.encoders: dict[str, Callable[[Any], Any]] = {
+            field: to_minor_units
+            for field, field_type in self.fields.items()
+            if field_type is Decimal
+        }
+        self.select_query: str = f"SELECT * FROM {self.table_name}"
+        if self.table_name in TABLES:
+            ensure_migrated(self.db)
+        else:
+            self.__create_table()
 
     def __create_table(self) -> None:
         """
         Creates the database table based on the class fields.
+        Used for classes whose tables are not managed by the migrations.
 
         Note:
             If an attribute is annotated as UnionType, str type will be used \
-                for that attribute.
+                for that attribute. Decimal attributes are stored as integer \
+                minor units, datetime attributes as integer microseconds.
         """
         columns: list[str] = []
         for key, key_type in self.fields.items():
-            column_type: Any = getattr(key_type, "__name__", "str")
+            column_type: Any = COLUMN_TYPES.get(
+                key_type, getattr(key_type, "__name__", "str")
+            )
             columns.append(
                 f"{key} {column_type if key != 'pk' else 'INTEGER PRIMARY KEY UNIQUE'}"
             )
@@ -76,6 +123,19 @@ class SQLiteRepository(AbstractRepository[T]):
             ({fields})"
         )
 
+    def transaction(self) -> ContextManager[SQLite]:
+        """
+        Opens a transaction on the repository database.
+
+        All writes made inside the block by any repository using the same
+        database file in the current thread are committed at once, or rolled
+        back if the block raises. Nested blocks use savepoints.
+
+        Returns:
+            ContextManager[SQLite]: The transaction context.
+        """
+        return self.db.transaction()
+
     def add(self, obj: T) -> int:
         """
         Adds an object to the repository.
@@ -88,14 +148,12 @@ class SQLiteRepository(AbstractRepository[T]):
         """
         fields: dict[str, Any] = self.fields.copy()
         fields.pop("pk", None)
-        if getattr(obj, "pk", None) != 0:
-            raise ValueError(f"trying to add object {obj} with filled `pk` attribute")
+        self._check_new([obj])
 
         columns: str = ", ".join(fields)
         inject: str = ", ".join(["?"] * len(fields))
-        values: tuple[Any] = tuple(getattr(obj, x) for x in fields)
+        values: tuple[Any] = self._values(obj, fields)
 
-        cur = self.db.execute("PRAGMA foreign_keys = ON")
         query: str = (
             f"INSERT INTO {self.table_name} ({columns}) VALUES ({inject})"
             if columns
@@ -105,6 +163,269 @@ class SQLiteRepository(AbstractRepository[T]):
         obj.pk = cur.lastrowid
         return obj.pk
 
+    def add_many(self, objs: Iterable[T], batch_size: int = BATCH_SIZE) -> list[int]:
+        """
+        Adds objects to the repository in a single transaction.
+
+        Objects are read from 'objs' and inserted in batches of 'batch_size'
+        rows. Inside the transaction rowids of a batch are consecutive, so the
+        primary keys are assigned from last_insert_rowid().
+
+        Args:
+            objs (Iterable[T]): The objects to be added.
+            batch_size (int): Number of rows per executemany call.
+
+        Returns:
+            list[int]: The primary keys (pk) of the added objects.
+
+        Raises:
+            ValueError: If an object already has a primary key.
+        """
+        fields: list[str] = [field for field in self.fields if field != "pk"]
+        columns: str = ", ".join(fields)
+        inject: str = ", ".join(["?"] * len(fields))
+        query: str = f"INSERT INTO {self.table_name} ({columns}) VALUES ({inject})"
+        pks: list[int] = []
+
+        with self.db.transaction():
+            for batch in batched(objs, batch_size):
+                self._check_new(batch)
+                self.db.executemany(query, [self._values(obj, fields) for obj in batch])
+                last: int = self.db.fetchone("SELECT last_insert_rowid() AS pk")["pk"]
+                for pk, obj in enumerate(batch, start=last - len(batch) + 1):
+                    obj.pk = pk
+                    pks.append(pk)
+        return pks
+
+    @staticmethod
+    def _check_new(objs: Iterable[T]) -> None:
+        """
+        Checks that objects to add have no primary key yet.
+
+        Args:
+            objs (Iterable[T]): The objects.
+
+        Raises:
+            ValueError: If an object already has a primary key (pk).
+        """
+        for obj in objs:
+            if getattr(obj, "pk", None) != 0:
+                raise ValueError(
+                    f"trying to add object {obj} with filled `pk` attribute"
+                )
+
+    def _hydrate(self, columns: list[str], rows: list[tuple]) -> list[T]:
+        """
+        Builds objects from tuple rows.
+
+        Column positions of the object fields are resolved once for the whole
+        result; if a column name repeats, the last one wins.
+
+        Args:
+            columns (list[str]): Result column names.
+            rows (list[tuple]): Fetched rows.
+
+        Returns:
+            list[T]: List of objects.
+        """
+        positions: dict[str, int] = {name: i for i, name in enumerate(columns)}
+        fields: list[str] = [field for field in self.fields if field in positions]
+        indexes: list[int] = [positions[field] for field in fields]
+        cls = self.cls
+        if len(fields) > 1 and len(fields) == len(self.fields):
+            getter = itemgetter(*indexes)
+            return [cls(*getter(row)) for row in rows]
+        pairs = list(zip(fields, indexes))
+        return [cls(**{field: row[i] for field, i in pairs}) for row in rows]
+
+    def _where(self, where: Where) -> tuple[str, tuple]:
+        """
+        Builds the WHERE clause for the 'where' condition.
+
+        Args:
+            where (Where): Condition as {'field_name': value} or a predicate.
+
+        Returns:
+            tuple[str, tuple]: The clause (empty if there is no condition) \
+                and its parameters.
+        """
+        predicate: Predicate | None = as_predicate(where)
+        if predicate is None:
+            return "", ()
+        sql, params = self._compile(predicate)
+        return f" WHERE {sql}", params
+
+    def _compile(self, predicate: Predicate) -> tuple[str, tuple]:
+        """
+        Compiles a query condition to parameterised SQL.
+
+        Args:
+            predicate (Predicate): The condition.
+
+        Returns:
+            tuple[str, tuple]: The SQL expression and its parameters.
+
+        Raises:
+            ValueError: If the condition refers to an unknown field.
+            TypeError: If the condition type is not supported.
+        """
+        if isinstance(predicate, (And, Or)):
+            disjunction: bool = isinstance(predicate, Or)
+            if not predicate.conditions:
+                return ("0", ()) if disjunction else ("1", ())
+            parts: list[tuple[str, tuple]] = [
+                self._compile(condition) for condition in predicate.conditions
+            ]
+            joiner: str = " OR " if disjunction else " AND "
+            return (
+                f"({joiner.join(sql for sql, _ in parts)})",
+                tuple(param for _, params in parts for param in params),
+            )
+        if isinstance(predicate, Condition):
+            column: str = self._column(predicate.field)
+            if predicate.value is None:
+                if predicate.op not in ("=", "!="):
+                    return "0", ()
+                return f"{column} IS {'NOT ' if predicate.op == '!=' else ''}NULL", ()
+            if predicate.op in ("in", "not in"):
+                inject: str = ", ".join(["?"] * len(predicate.value))
+                return f"{column} {predicate.op.upper()} ({inject})", tuple(
+                    self._encode(predicate.field, value) for value in predicate.value
+                )
+            return f"{column} {predicate.op} ?", (
+                self._encode(predicate.field, predicate.value),
+            )
+        raise TypeError(f"unsupported condition {predicate!r}")
+
+    def _column(self, field: str) -> str:
+        """
+        Qualifies a field name with the table name, so that it stays \
+            unambiguous in queries joining other tables.
+
+        Args:
+            field (str): The field name.
+
+        Returns:
+            str: The qualified column name.
+
+        Raises:
+            ValueError: If the field is not a field of the stored class.
+        """
+        if field not in self.fields:
+            raise ValueError(f"unknown field '{field}' for '{self.table_name}'")
+        return f"{self.table_name}.{field}"
+
+    def _source(self, where: Where = None) -> str:  # pylint: disable=unused-argument
+        """
+        Returns the FROM item the read methods select records of the stored \
+            class from. Subclasses keeping records in several tables return \
+            a subquery aliased with the table name, and may leave out tables \
+            that cannot hold records matching 'where'.
+
+        Args:
+            where (Where): Condition of the read.
+
+        Returns:
+            str: The table name or an aliased subquery.
+        """
+        return self.table_name
+
+    def _select(self, where: Where = None) -> str:
+        """
+        Returns select_query reading from the source of a condition.
+
+        Args:
+            where (Where): Condition of the read.
+
+        Returns:
+            str: The SELECT query, without a WHERE clause.
+        """
+        source: str = self._source(where)
+        if source == self.table_name:
+            return self.select_query
+        return self.select_query.replace(f"FROM {self.table_name}", f"FROM {source}", 1)
+
+    def _order_by(self, order_by: str | Sequence[str] | None) -> str:
+        """
+        Builds the ORDER BY clause.
+
+        Args:
+            order_by (str | Sequence[str] | None): Field name or sequence of \
+                field names, '-name' for descending order.
+
+        Returns:
+            str: The clause, empty if there is no ordering.
+        """
+        terms: list[str] = [
+            f"{self._column(field)} DESC" if descending else self._column(field)
+            for field, descending in parse_order_by(order_by)
+        ]
+        return f" ORDER BY {', '.join(terms)}" if terms else ""
+
+    @staticmethod
+    def _limit(query: Query) -> tuple[str, tuple]:
+        """
+        Builds the LIMIT clause of a query.
+
+        Args:
+            query (Query): The query.
+
+        Returns:
+            tuple[str, tuple]: The clause (empty if the result is not limited) \
+                and its parameters.
+        """
+        if query.limit is None and not query.offset:
+            return "", ()
+        limit: int = -1 if query.limit is None else query.limit
+        return " LIMIT ? OFFSET ?", (limit, query.offset)
+
+    def _encode(self, field: str, value: Any) -> Any:
+        """
+        Converts a field value to the form stored in the database.
+
+        Args:
+            field (str): The field name.
+            value (Any): The field value.
+
+        Returns:
+            Any: The value to pass as a query parameter.
+        """
+        encoder = self.encoders.get(field)
+        return value if encoder is None or value is None else encoder(value)
+
+    def _values(self, obj: T, fields: Iterable[str]) -> tuple:
+        """
+        Collects the stored values of the given fields of an object.
+
+        Args:
+            obj (T): The object.
+            fields (Iterable[str]): The field names.
+
+        Returns:
+            tuple: Encoded values in 'fields' order.
+        """
+        return tuple(self._encode(field, getattr(obj, field)) for field in fields)
+
+    def last_pk(self) -> int:
+        """
+        Gets the largest primary key handed out for the table. Tables with \
+            AUTOINCREMENT never reuse the keys of deleted rows, so it may be \
+            larger than any stored key.
+
+        Returns:
+            int: The largest primary key, 0 if there was none.
+        """
+        top = self.db.fetchone(f"SELECT MAX(pk) AS pk FROM {self.table_name}")["pk"]
+        if self.db.fetchone(
+            "SELECT name FROM sqlite_master WHERE name = 'sqlite_sequence'"
+        ):
+            row = self.db.fetchone(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?", (self.table_name,)
+            )
+            if row is not None:
+                return max(top or 0, row["seq"])
+        return top or 0
+
     def get(self, pk: int) -> T | None:
         """
         Retrieves an object from the repository based on its primary key (pk).
@@ -115,31 +436,357 @@ class SQLiteRepository(AbstractRepository[T]):
         Returns:
             T | None: The retrieved object or None if not found.
         """
-        query: str = f"SELECT * FROM {self.table_name} WHERE pk = ?"
-        row: dict[str, Any] = self.db.fetchone(query, (pk,))
-        return self.cls(**row) if row else None
+        query: str = f"SELECT * FROM {self._source()} WHERE pk = ?"
+        objs: list[T] = self._hydrate(*self.db.fetch_rows(query, (pk,)))
+        return objs[0] if objs else None
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self, where: Where = None) -> list[T]:
         """
         Retrieves all objects from the repository, optionally filtered by a WHERE clause.
 
         Args:
-            where (dict[str, Any] | None): Optional WHERE clause parameters.
+            where (Where): Optional condition, see bookkeeper.repository.query.
+
+        Returns:
+            list[T]: List of retrieved objects.
+        """
+        clause, params = self._where(where)
+        return self._hydrate(*self.db.fetch_rows(self._select(where) + clause, params))
+
+    def iter_all(
+        self,
+        where: Where = None,
+        order_by: str | Sequence[str] | None = None,
+        batch_size: int = BATCH_SIZE,
+    ) -> Iterator[T]:
+        """
+        Iterates over objects of the repository without loading all of them.
+
+        Rows are read from an open cursor 'batch_size' at a time and turned
+        into objects batch by batch.
+
+        Args:
+            where (Where): Optional condition, see bookkeeper.repository.query.
+            order_by (str | Sequence[str] | None): Field name or sequence of \
+                field names, '-name' for descending order.
+            batch_size (int): Number of rows fetched at a time.
+
+        Yields:
+            T: The retrieved objects.
+        """
+        clause, params = self._where(where)
+        query: str = self._select(where) + clause + self._order_by(order_by)
+        for columns, rows in self.db.iter_rows(query, params, batch_size):
+            yield from self._hydrate(columns, rows)
+
+    def page(
+        self,
+        limit: int,
+        after_pk: int | None = None,
+        after_key: Any = None,
+        key: str = "pk",
+        where: Where = None,
+    ) -> list[T]:
+        """
+        Retrieves a page of objects ordered by ('key', pk) using keyset \
+            pagination.
+
+        The page starts right after the object with primary key 'after_pk'
+        and 'key' value 'after_key', so the cost of a page does not grow with
+        its position and pages stay consistent while records are added.
+
+        Args:
+            limit (int): Maximum number of objects on the page.
+            after_pk (int | None): Primary key of the last object of the \
+                previous page, None for the first page.
+            after_key (Any): 'key' value of the last object of the previous \
+                page, ignored when paginating by pk.
+            key (str): The field to order by. Default is pk.
+            where (Where): Optional condition, see bookkeeper.repository.query.
+
+        Returns:
+            list[T]: Up to 'limit' objects.
+        """
+        clause, params = self._where(where)
+        pk_column: str = self._column("pk")
+        if key == "pk":
+            order: str = pk_column
+            keyset: str = f"{pk_column} > ?"
+            keyset_params: tuple = (after_pk,)
+        else:
+            column: str = self._column(key)
+            order = f"{column}, {pk_column}"
+            keyset = f"({column}, {pk_column}) > (?, ?)"
+            keyset_params = (self._encode(key, after_key), after_pk)
+        if after_pk is not None:
+            clause += f" AND {keyset}" if clause else f" WHERE {keyset}"
+            params += keyset_params
+        query: str = f"{self._select(where)}{clause} ORDER BY {order} LIMIT ?"
+        return self._hydrate(*self.db.fetch_rows(query, (*params, limit)))
+
+    def find(self, query: Query) -> list[T]:
+        """
+        Retrieves objects selected, ordered and limited by a query specification.
+
+        The whole query is run by the database.
+
+        Args:
+            query (Query): The query, its projection is ignored.
 
         Returns:
             list[T]: List of retrieved objects.
         """
-        query: str = f"SELECT * FROM {self.table_name}"
-        params: tuple = ()
+        clause, params = self._where(query.where)
+        limit, limit_params = self._limit(query)
+        sql: str = (
+            self._select(query.where) + clause + self._order_by(query.order_by) + limit
+        )
+        return self._hydrate(*self.db.fetch_rows(sql, (*params, *limit_params)))
+
+    def _rows_query(self, query: Query) -> tuple[str, tuple]:
+        """
+        Builds the SQL selecting the query columns of the stored table.
+
+        Args:
+            query (Query): The query, all fields are selected if it has \
+                no columns.
+
+        Returns:
+            tuple[str, tuple]: The SQL query and its parameters.
+
+        Raises:
+            ValueError: If a column is not a field of the stored class.
+        """
+        columns: Sequence[str] = (
+            list(self.fields) if query.columns is None else query.columns
+        )
+        if not columns:
+            raise ValueError(f"no columns to select from '{self.table_name}'")
+        selected: str = ", ".join(self._column(column) for column in columns)
+        clause, params = self._where(query.where)
+        limit, limit_params = self._limit(query)
+        sql: str = (
+            f"SELECT {selected} FROM {self._source(query.where)}{clause}"
+            f"{self._order_by(query.order_by)}{limit}"
+        )
+        return sql, (*params, *limit_params)
+
+    def find_rows(self, query: Query) -> list[tuple]:
+        """
+        Retrieves only the query columns as raw tuples, without building objects.
+
+        Args:
+            query (Query): The query, all fields are selected if it has \
+                no columns.
+
+        Returns:
+            list[tuple]: One tuple of values per record, in the columns order.
+
+        Raises:
+            ValueError: If a column is not a field of the stored class.
+        """
+        return self.db.fetch_rows(*self._rows_query(query))[1]
+
+    def iter_rows(self, query: Query, batch_size: int = BATCH_SIZE) -> Iterator[tuple]:
+        """
+        Iterates over the query columns as raw tuples, reading them from \
+            an open cursor 'batch_size' rows at a time.
+
+        Args:
+            query (Query): The query, all fields are selected if it has \
+                no columns.
+            batch_size (int): Number of rows fetched at a time.
+
+        Yields:
+            tuple: Values of a record, in the columns order.
+
+        Raises:
+            ValueError: If a column is not a field of the stored class.
+        """
+        sql, params = self._rows_query(query)
+        for _, rows in self.db.iter_rows(sql, params, batch_size):
+            yield from rows
+
+    def get_rows(self, columns: Sequence[str], where: Where = None) -> list[tuple]:
+        """
+        Retrieves only the given columns as raw tuples, without building objects.
+
+        Args:
+            columns (Sequence[str]): Names of the fields to select.
+            where (Where): Optional condition, see bookkeeper.repository.query.
+
+        Returns:
+            list[tuple]: One tuple of values per record, in 'columns' order.
+
+        Raises:
+            ValueError: If a column is not a field of the stored class.
+        """
+        return self.find_rows(Query(where, columns=columns))
+
+    def get_ancestors(
+        self, pk: int, include_self: bool = False, parent_field: str = "parent"
+    ) -> list[T]:
+        """
+        Retrieves the chain of parents of an object with one recursive query.
+
+        Args:
+            pk (int): The primary key of the object.
+            include_self (bool): Start the chain with the object itself.
+            parent_field (str): The field holding the pk of the parent object.
+
+        Returns:
+            list[T]: Objects from the parent (or the object itself) up to the root.
+
+        Raises:
+            ValueError: If the parent links form a cycle.
+        """
+        parent: str = self._column(parent_field)
+        table: str = self.table_name
+        # the recursion stops after the first pk that is already on the path
+        query: str = f"""
+            WITH RECURSIVE chain(pk, depth, path, cycle) AS (
+                SELECT {table}.pk, 0, '/' || {table}.pk || '/', 0 FROM {table}
+                WHERE {table}.pk = ?
+                UNION ALL
+                SELECT {parent}, chain.depth + 1, chain.path || {parent} || '/',
+                    instr(chain.path, '/' || {parent} || '/') > 0
+                FROM {table} JOIN chain ON {table}.pk = chain.pk
+                WHERE {parent} IS NOT NULL AND NOT chain.cycle
+            )
+            SELECT {table}.* FROM chain JOIN {table} ON {table}.pk = chain.pk
+            ORDER BY chain.depth
+        """
+        chain = self._hydrate(*self.db.fetch_rows(query, (pk,)))
+        if len({obj.pk for obj in chain}) != len(chain):
+            raise ValueError(f"record {chain[-1].pk} is its own ancestor")
+        return chain if include_self else chain[1:]
+
+    def get_descendants(self, pk: int, parent_field: str = "parent") -> list[T]:
+        """
+        Retrieves all objects below an object in the hierarchy with one \
+            recursive query.
+
+        Args:
+            pk (int): The primary key of the object.
+            parent_field (str): The field holding the pk of the parent object.
+
+        Returns:
+            list[T]: Objects at any depth below the object, in depth-first \
+                order with siblings ordered by pk.
+
+        Raises:
+            ValueError: If the parent links form a cycle.
+        """
+        parent: str = self._column(parent_field)
+        table: str = self.table_name
+        # the path of zero-padded pks sorts the records in depth-first order,
+        # the recursion stops after the first pk that is already on the path
+        query: str = f"""
+            WITH RECURSIVE tree(pk, path, cycle) AS (
+                SELECT {table}.pk, printf('%019d/%019d', ?, {table}.pk),
+                    {table}.pk = ?
+                FROM {table} WHERE {parent} = ?
+                UNION ALL
+                SELECT {table}.pk, tree.path || printf('/%019d', {table}.pk),
+                    instr(tree.path, printf('%019d', {table}.pk)) > 0
+                FROM {table} JOIN tree ON {parent} = tree.pk
+                WHERE NOT tree.cycle
+            )
+            SELECT {table}.* FROM tree JOIN {table} ON {table}.pk = tree.pk
+            ORDER BY tree.path
+        """
+        result = self._hydrate(*self.db.fetch_rows(query, (pk, pk, pk)))
+        pks = {obj.pk for obj in result}
+        if pk in pks or len(pks) != len(result):
+            raise ValueError(f"record {pk} has a cycle below it")
+        return result
+
+    def _converter(self, field: str) -> str:
+        """
+        Gets the name of the converter of a field, used to convert computed \
+            result columns, e.g. '"total [Money]"'.
+
+        Args:
+            field (str): The field name.
+
+        Returns:
+            str: The converter name.
+        """
+        field_type: Any = self.fields[field]
+        declared: str = COLUMN_TYPES.get(
+            field_type, getattr(field_type, "__name__", "str")
+        )
+        return declared.split()[0]
+
+    def _group_key(self, key: str | Bucket) -> str:
+        """
+        Builds the SQL expression of a grouping key.
+
+        Args:
+            key (str | Bucket): Field name or time bucket of a datetime field.
+
+        Returns:
+            str: The expression, a time bucket evaluates to the microsecond \
+                timestamp of its start.
+
+        Raises:
+            ValueError: If the field is unknown or a bucket field is not a datetime.
+        """
+        if not isinstance(key, Bucket):
+            return self._column(key)
+        column: str = self._column(key.field)
+        if self.fields[key.field] is not datetime:
+            raise ValueError(f"field '{key.field}' is not a datetime")
+        return (
+            f"CAST(strftime('%s', {column} / 1000000.0, 'unixepoch', "
+            f"{BUCKET_MODIFIERS[key.period]}) AS INTEGER) * 1000000"
+        )
+
+    def aggregate(
+        self, field: str, group_by: GroupBy = (), where: Where = None
+    ) -> list[Aggregate]:
+        """
+        Aggregates a field over the matching records in one GROUP BY query.
+
+        Args:
+            field (str): The field to aggregate.
+            group_by (GroupBy): Fields and time buckets \
+                (bookkeeper.repository.query.Bucket) to group by.
+            where (Where): Optional condition, see bookkeeper.repository.query.
 
-        if where:
-            keys: str = ", ".join([f"{key} = ?" for key in where.keys()])
-            values: tuple = tuple(where.values())
-            query += f" WHERE {keys}"
-            params = values
+        Returns:
+            list[Aggregate]: One aggregate per group, ordered by the groups.
 
-        rows: list[dict[str, Any]] = self.db.fetchall(query, params)
-        return [self.cls(**row) for row in rows]
+        Raises:
+            ValueError: If a field is unknown or a bucket field is not a datetime.
+        """
+        column: str = self._column(field)
+        converter: str = self._converter(field)
+        keys: list[str] = [
+            f'{self._group_key(key)} AS "g{i} '
+            f'[{self._converter(key.field if isinstance(key, Bucket) else key)}]"'
+            for i, key in enumerate(group_by)
+        ]
+        aggregates: list[str] = [
+            f'SUM({column}) AS "total [{converter}]"',
+            "COUNT(*)",
+            f'MIN({column}) AS "minimum [{converter}]"',
+            f'MAX({column}) AS "maximum [{converter}]"',
+        ]
+        clause, params = self._where(where)
+        sql: str = (
+            f"SELECT {', '.join(keys + aggregates)} "
+            f"FROM {self._source(where)}{clause}"
+        )
+        if keys:
+            positions: str = ", ".join(str(i) for i in range(1, len(keys) + 1))
+            sql += f" GROUP BY {positions} ORDER BY {positions}"
+        size: int = len(keys)
+        return [
+            Aggregate(row[:size], *row[size:])
+            for row in self.db.fetch_rows(sql, params)[1]
+            if row[size + 1]
+        ]
 
     def update(self, obj: T) -> None:
         """
@@ -153,10 +800,10 @@ class SQLiteRepository(AbstractRepository[T]):
         """
         if obj.pk == 0:
             raise ValueError("attempt to update object with unknown primary key")
-        fields: dict[str, Any] = dict(vars(obj))
+        fields: dict[str, Any] = field_values(obj)
         pk: int = fields.pop("pk")  # Remove "pk" if it exists
         columns: str = ", ".join([f"{key} = ?" for key in fields.keys()])
-        values: tuple = tuple(fields.values())
+        values: tuple = tuple(self._encode(key, value) for key, value in fields.items())
         self.db.execute(
             f"UPDATE {self.table_name} SET {columns} WHERE pk = ?",
             (*values, pk),
@@ -181,3 +828,91 @@ class SQLiteRepository(AbstractRepository[T]):
             )
 
         self.db.execute(f"DELETE FROM {self.table_name} WHERE pk = ?", (pk,))
+
+    def update_many(self, objs: Iterable[T], batch_size: int = BATCH_SIZE) -> None:
+        """
+        Updates objects in the repository in a single transaction.
+
+        Args:
+            objs (Iterable[T]): The objects to be updated.
+            batch_size (int): Number of rows per executemany call.
+
+        Raises:
+            ValueError: If an object's primary key (pk) is unknown.
+        """
+        fields: list[str] = [field for field in self.fields if field != "pk"]
+        columns: str = ", ".join([f"{key} = ?" for key in fields])
+        query: str = f"UPDATE {self.table_name} SET {columns} WHERE pk = ?"
+
+        with self.db.transaction():
+            for batch in batched(objs, batch_size):
+                params: list[tuple] = []
+                for obj in batch:
+                    if obj.pk == 0:
+                        raise ValueError(
+                            "attempt to update object with unknown primary key"
+                        )
+                    params.append((*self._values(obj, fields), obj.pk))
+                self.db.executemany(query, params)
+
+    def upsert_many(self, objs: Iterable[T], batch_size: int = BATCH_SIZE) -> None:
+        """
+        Stores objects with the primary keys they already have in a single \
+            transaction: missing rows are inserted, existing ones updated.
+
+        Args:
+            objs (Iterable[T]): The objects to be stored, with pk set.
+            batch_size (int): Number of rows per executemany call.
+
+        Raises:
+            ValueError: If an object's primary key (pk) is unknown.
+        """
+        fields: list[str] = [field for field in self.fields if field != "pk"]
+        columns: str = ", ".join(["pk", *fields])
+        inject: str = ", ".join(["?"] * (len(fields) + 1))
+        updates: str = ", ".join(f"{field} = excluded.{field}" for field in fields)
+        action: str = f"UPDATE SET {updates}" if updates else "NOTHING"
+        query: str = (
+            f"INSERT INTO {self.table_name} ({columns}) VALUES ({inject}) "
+            f"ON CONFLICT(pk) DO {action}"
+        )
+
+        with self.db.transaction():
+            for batch in batched(objs, batch_size):
+                params: list[tuple] = []
+                for obj in batch:
+                    if obj.pk == 0:
+                        raise ValueError(
+                            "attempt to upsert object with unknown primary key"
+                        )
+                    params.append((obj.pk, *self._values(obj, fields)))
+                self.db.executemany(query, params)
+
+    def delete_many(
+        self,
+        pks: Iterable[int],
+        batch_size: int = BATCH_SIZE,
+        missing_ok: bool = False,
+    ) -> None:
+        """
+        Deletes objects from the repository in a single transaction.
+
+        Args:
+            pks (Iterable[int]): The primary keys of the objects to be deleted.
+            batch_size (int): Number of rows per executemany call.
+            missing_ok (bool): Skip primary keys without a record instead \
+                of raising. Default is False.
+
+        Raises:
+            KeyError: If any of the objects does not exist, nothing is deleted then.
+        """
+        query: str = f"DELETE FROM {self.table_name} WHERE pk = ?"
+
+        with self.db.transaction():
+            for batch in batched(pks, batch_size):
+                cur = self.db.executemany(query, [(pk,) for pk in batch])
+                if cur.rowcount != len(batch) and not missing_ok:
+                    raise KeyError(
+                        f"Some of the records with pk in {batch} do not exist "
+                        f"in the '{self.table_name}' table"
+                    )
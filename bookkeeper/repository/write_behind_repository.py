@@ -0,0 +1,432 @@
+"""
+Module describing a write-behind repository.
+
+Objects are kept in memory and every read is served from there. Writes are
+applied to memory at once and written to an SQLite repository later, in
+batches, by a background thread.
+"""
+
+import atexit
+import copy
+import threading
+from contextlib import contextmanager
+from itertools import groupby
+from typing import Any, Iterable, Iterator, Sequence
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Aggregate, GroupBy, Query, Where
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+# Pending operation of a deleted object
+DELETED = None
+
+# Marks objects without a pending operation
+_MISSING = object()
+
+
+# pylint: disable-next=too-many-instance-attributes
+class WriteBehindRepository(AbstractRepository[T]):
+    """
+    Repository serving reads from memory and writing to SQLite behind.
+
+    All records of the backend are loaded when the repository is created
+    and primary keys of new objects are assigned in memory, so the backend
+    must not be written to by anyone else in the meantime.
+
+    Changes are queued per pk, a later change of an object replacing the
+    earlier one, and written every 'flush_interval' seconds or as soon as
+    'flush_size' objects are pending. Each flush runs in one SQLite
+    transaction: after a crash the database holds the state of the last
+    successful flush, and a failed flush keeps its changes pending for the
+    next one. Changes made since the last flush are lost on a crash, so call
+    flush() at points that must be durable and close() when done; close() is
+    also called at interpreter exit if it was not called before.
+    """
+
+    def __init__(
+        self,
+        backend: SQLiteRepository[T],
+        flush_interval: float = 1.0,
+        flush_size: int = 1000,
+        indexes: Iterable[str] = (),
+        sorted_indexes: Iterable[str] = (),
+    ) -> None:
+        """
+        Initializes the WriteBehindRepository and starts the flusher thread.
+
+        Args:
+            backend (SQLiteRepository[T]): The repository written to.
+            flush_interval (float): Seconds between background flushes.
+            flush_size (int): Number of pending objects that triggers \
+                a flush before the interval ends.
+            indexes (Iterable[str]): Fields with a hash index in memory.
+            sorted_indexes (Iterable[str]): Fields with a sorted index \
+                in memory.
+        """
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        # error of the last background flush, None after a successful one
+        self.last_error: Exception | None = None
+        self._cache: MemoryRepository[T] = MemoryRepository(indexes, sorted_indexes)
+        self._pending: dict[int, T | None] = {}
+        self._lock = threading.RLock()
+        self._flush_lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._depth = 0
+        self._touched: set[int] | None = None
+        self._cache.update_many(self._load())
+        # keys of deleted rows are not reused, as in the backend
+        self._cache.skip_pks(backend.last_pk())
+        self._thread = threading.Thread(
+            target=self._run, name=f"flush-{backend.table_name}", daemon=True
+        )
+        self._thread.start()
+        # the flusher is a daemon thread, pending changes must not die with it
+        atexit.register(self.close)
+
+    def __enter__(self) -> "WriteBehindRepository[T]":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _load(self, where: Where = None) -> Iterator[T]:
+        """
+        Reads objects from the backend with the stored field values.
+
+        Args:
+            where (Where): The condition to filter objects.
+
+        Returns:
+            Iterator[T]: The stored objects.
+        """
+        columns = list(self.backend.fields)
+        for row in self.backend.iter_rows(Query(where, columns=columns)):
+            yield self.backend.cls(**dict(zip(columns, row)))
+
+    def _run(self) -> None:
+        """
+        Flushes pending changes until the repository is closed.
+        """
+        try:
+            while not self._closed:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                if self._closed:
+                    break
+                try:
+                    self.flush()
+                except Exception as error:  # pylint: disable=broad-exception-caught
+                    # the changes stay pending and are retried next time
+                    self.last_error = error
+        finally:
+            self.backend.db.close()
+
+    def flush(self) -> int:
+        """
+        Writes the pending changes to the backend in one transaction.
+
+        Does nothing inside a transaction block. If writing fails, the changes
+        stay pending and the error is raised.
+
+        Returns:
+            int: Number of objects written or deleted.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._depth or not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+            try:
+                with self.backend.transaction():
+                    # keep the order of the changes, e.g. parents before children
+                    for deleted, changes in groupby(
+                        batch.items(), key=lambda change: change[1] is DELETED
+                    ):
+                        if deleted:
+                            pks = [pk for pk, _ in changes]
+                            self.backend.delete_many(pks, missing_ok=True)
+                        else:
+                            self.backend.upsert_many(obj for _, obj in changes)
+            except BaseException:
+                with self._lock:
+                    # changes made while writing are newer
+                    batch.update(self._pending)
+                    self._pending = batch
+                raise
+            self.last_error = None
+            return len(batch)
+
+    def close(self) -> None:
+        """
+        Stops the flusher thread and writes the remaining changes.
+        """
+        atexit.unregister(self.close)
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+
+    @property
+    def pending(self) -> int:
+        """Number of objects with changes not written yet."""
+        return len(self._pending)
+
+    @contextmanager
+    def transaction(self) -> Iterator["WriteBehindRepository[T]"]:
+        """
+        Groups the changes made inside the block: they are flushed together,
+        and undone in memory if the block raises. Nested blocks only undo
+        their own changes. Other threads wait for the block to finish.
+
+        Yields:
+            WriteBehindRepository[T]: The repository.
+        """
+        with self._flush_lock, self._lock:
+            pending = dict(self._pending)
+            outer, self._touched = self._touched, set()
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._rollback(self._touched, pending)
+                raise
+            finally:
+                self._depth -= 1
+                touched, self._touched = self._touched, outer
+                if outer is not None:
+                    outer |= touched
+            if not self._depth and len(self._pending) >= self.flush_size:
+                self._wakeup.set()
+
+    def _rollback(self, touched: set[int], pending: dict[int, T | None]) -> None:
+        """
+        Restores objects changed in a transaction block.
+
+        Args:
+            touched (set[int]): IDs of the objects changed in the block.
+            pending (dict[int, T | None]): Pending changes at the start \
+                of the block.
+        """
+        for pk in touched:
+            previous = pending.get(pk, _MISSING)
+            if previous is _MISSING:
+                # nothing is flushed during a block: the backend is up to date
+                obj = next(self._load({"pk": pk}), None)
+            else:
+                obj = copy.copy(previous)
+            if obj is not None:
+                self._cache.update(obj)
+            elif self._cache.get(pk) is not None:
+                self._cache.delete(pk)
+        self._pending = pending
+
+    def _queue(self, pk: int, obj: T | None) -> None:
+        """
+        Queues a change of an object for the next flush.
+
+        Args:
+            pk (int): The ID of the object.
+            obj (T | None): The object, DELETED if it was deleted. A copy is \
+                queued, so later changes of the object need another update.
+        """
+        self._pending[pk] = DELETED if obj is DELETED else copy.copy(obj)
+        if self._touched is not None:
+            self._touched.add(pk)
+        if not self._depth and len(self._pending) >= self.flush_size:
+            self._wakeup.set()
+
+    def add(self, obj: T) -> int:
+        """
+        Adds an object to the repository and returns its ID.
+
+        Args:
+            obj (T): Object to add to the repository.
+
+        Returns:
+            int: The ID of the added object.
+        """
+        with self._lock:
+            pk = self._cache.add(obj)
+            self._queue(pk, obj)
+        return pk
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Adds objects to the repository and returns their IDs.
+
+        Args:
+            objs (Iterable[T]): Objects to add to the repository.
+
+        Returns:
+            list[int]: The IDs of the added objects.
+        """
+        objs = list(objs)
+        with self._lock:
+            pks = self._cache.add_many(objs)
+            for obj in objs:
+                self._queue(obj.pk, obj)
+        return pks
+
+    def get(self, pk: int) -> T | None:
+        """
+        Retrieves an object from memory by its ID.
+
+        Args:
+            pk (int): The ID of the object to retrieve.
+
+        Returns:
+            T | None: The retrieved object or None if not found.
+        """
+        with self._lock:
+            return self._cache.get(pk)
+
+    def get_all(self, where: Where = None) -> list[T]:
+        """
+        Retrieves objects matching a condition from memory.
+
+        Args:
+            where (Where): The condition to filter objects.
+
+        Returns:
+            list[T]: List of retrieved objects.
+        """
+        with self._lock:
+            return self._cache.get_all(where)
+
+    def iter_all(
+        self,
+        where: Where = None,
+        order_by: str | Sequence[str] | None = None,
+        batch_size: int = 1000,
+    ) -> Iterator[T]:
+        """
+        Iterates over objects matching a condition, see MemoryRepository.
+
+        Args:
+            where (Where): The condition to filter objects.
+            order_by (str | Sequence[str] | None): Field name or sequence of \
+                field names, '-name' for descending order.
+            batch_size (int): Not used, objects are already in memory.
+
+        Returns:
+            Iterator[T]: The matching objects.
+        """
+        with self._lock:
+            return iter(list(self._cache.iter_all(where, order_by)))
+
+    def page(
+        self,
+        limit: int,
+        after_pk: int | None = None,
+        after_key: Any = None,
+        key: str = "pk",
+        where: Where = None,
+    ) -> list[T]:
+        """
+        Retrieves a page of objects ordered by ('key', pk), see MemoryRepository.
+
+        Args:
+            limit (int): Maximum number of objects on the page.
+            after_pk (int | None): Primary key of the last object of the \
+                previous page, None for the first page.
+            after_key (Any): 'key' value of the last object of the previous \
+                page, ignored when paginating by pk.
+            key (str): The field to order by. Default is pk.
+            where (Where): The condition to filter objects.
+
+        Returns:
+            list[T]: Up to 'limit' objects.
+        """
+        with self._lock:
+            return self._cache.page(limit, after_pk, after_key, key, where)
+
+    def find(self, query: Query) -> list[T]:
+        """
+        Retrieves objects selected by a query specification from memory.
+
+        Args:
+            query (Query): The query, its projection is ignored.
+
+        Returns:
+            list[T]: List of retrieved objects.
+        """
+        with self._lock:
+            return self._cache.find(query)
+
+    def aggregate(
+        self, field: str, group_by: GroupBy = (), where: Where = None
+    ) -> list[Aggregate]:
+        """
+        Aggregates a field over the objects matching a condition in memory.
+
+        Args:
+            field (str): The field to aggregate.
+            group_by (GroupBy): Fields and time buckets to group by.
+            where (Where): The condition to filter objects.
+
+        Returns:
+            list[Aggregate]: One aggregate per group, ordered by the groups.
+        """
+        with self._lock:
+            return self._cache.aggregate(field, group_by, where)
+
+    def update(self, obj: T) -> None:
+        """
+        Updates an object in the repository.
+
+        Args:
+            obj (T): The object to update.
+
+        Raises:
+            ValueError: If the object's primary key is unknown (pk=0).
+        """
+        with self._lock:
+            self._cache.update(obj)
+            self._queue(obj.pk, obj)
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """
+        Updates several objects in the repository.
+
+        Args:
+            objs (Iterable[T]): The objects to update.
+
+        Raises:
+            ValueError: If an object's primary key is unknown (pk=0).
+        """
+        with self._lock:
+            for obj in objs:
+                self.update(obj)
+
+    def delete(self, pk: int) -> None:
+        """
+        Deletes an object from the repository by its ID.
+
+        Args:
+            pk (int): The ID of the object to delete.
+
+        Raises:
+            KeyError: If there is no such object.
+        """
+        with self._lock:
+            self._cache.delete(pk)
+            self._queue(pk, DELETED)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """
+        Deletes several objects from the repository by their IDs.
+
+        Args:
+            pks (Iterable[int]): The IDs of the objects to delete.
+
+        Raises:
+            KeyError: If there is no such object.
+        """
+        with self._lock:
+            for pk in pks:
+                self.delete(pk)
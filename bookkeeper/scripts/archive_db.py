@@ -0,0 +1,90 @@
+import argparse
+import configparser
+from datetime import datetime
+from bookkeeper.repository.expense_archive import ExpenseArchive, month_start
+from bookkeeper.repository.partitioned_expense_repository import (
+    PartitionedExpenseRepository,
+    add_months,
+    create_expense_repository,
+)
+from bookkeeper.services.expense_service import ExpenseService
+
+
+def archive_database(
+    db_name: str = None,
+    archive_name: str = None,
+    keep_months: int = 12,
+    before: datetime = None,
+) -> int:
+    """
+    Function for moving old expenses to the archive database and compacting
+    the application database.
+
+    Uses the expense repository configured in settings.ini, like the
+    application; with partitions, expenses that grew older than the recent
+    period are also moved to their partitions. Meant to be run regularly,
+    e.g. monthly from cron or another scheduler with 'poetry run archive',
+    which also keeps the database file compact and its statistics fresh.
+
+    Parameters
+    ----------
+    db_name : str
+        Name (path to) the database.
+    archive_name : str
+        Name (path to) the archive database, by default the database name
+        with an '_archive' suffix.
+    keep_months : int
+        Number of months before the current one whose expenses are kept.
+    before : datetime
+        Archive the expenses before the month of this date instead.
+
+    Returns
+    -------
+    int
+        Number of archived expenses.
+    """
+
+    config = configparser.ConfigParser()
+    config.read("bookkeeper/config/settings.ini")
+
+    if not db_name:
+        db_name = config["sqllite"]["db_name"]
+
+    if before is None:
+        before = add_months(month_start(datetime.now()), -keep_months)
+
+    repo = create_expense_repository(db_name)
+    service = ExpenseService(repo, ExpenseArchive(repo, archive_name))
+    count = service.archive_expenses(before, compact=False)
+    if isinstance(repo, PartitionedExpenseRepository):
+        repo.rotate()
+    # compact last, after the rows moved by rotate are freed as well
+    service.archive.compact()
+    return count
+
+
+def main(argv: list[str] = None) -> None:
+    """Command line entry point of archive_database."""
+    parser = argparse.ArgumentParser(
+        description="Move old expenses to the archive database."
+    )
+    parser.add_argument("--db", help="database file, default from settings.ini")
+    parser.add_argument("--archive", help="archive database file")
+    parser.add_argument(
+        "--keep-months",
+        type=int,
+        default=12,
+        help="months before the current one to keep, default 12",
+    )
+    parser.add_argument(
+        "--before",
+        type=datetime.fromisoformat,
+        help="archive the expenses before the month of this ISO date",
+    )
+    args = parser.parse_args(argv)
+    count = archive_database(args.db, args.archive, args.keep_months, args.before)
+    print(f"Archived {count} expenses")
+
+
+if __name__ == "__main__":
+    main()
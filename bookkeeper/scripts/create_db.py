@@ -2,6 +2,8 @@ import sqlite3
 import configparser
 from datetime import datetime
 from bookkeeper.models.budget import PeriodType
+from bookkeeper.utils.sqlite_utils import to_timestamp
+from bookkeeper.repository.migrations import apply_migrations
 
 
 def create_database(db_name: str = None, test_mode: bool = False):
@@ -26,96 +28,71 @@ def create_database(db_name: str = None, test_mode: bool = False):
     conn = sqlite3.connect(db_name)
     cursor = conn.cursor()
 
+    # Drop the expense partitions listed in the registry
+    registry = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'expense_partition'"
+    ).fetchone()
+    if registry:
+        for (name,) in cursor.execute("SELECT name FROM expense_partition").fetchall():
+            cursor.execute(f'DROP TABLE IF EXISTS "{name}";')
+    cursor.execute("DROP TABLE IF EXISTS expense_partition;")
+
     # Drop all tables from the database
     cursor.execute("DROP TABLE IF EXISTS category;")
     cursor.execute("DROP TABLE IF EXISTS expense;")
     cursor.execute("DROP TABLE IF EXISTS budget;")
+    cursor.execute("DROP TABLE IF EXISTS expense_summary;")
 
     if test_mode:
         cursor.execute("DROP TABLE IF EXISTS Custom;")
 
-    # Create tables if they do not already exist
-    cursor.execute(
-        """
-    CREATE TABLE IF NOT EXISTS "category" (
-        "name"	str UNIQUE,
-        "parent"	int,
-        "pk"	INTEGER UNIQUE,
-        FOREIGN KEY("parent") REFERENCES "category",
-        PRIMARY KEY("pk" AUTOINCREMENT)
-    );
-    """
-    )
-
-    cursor.execute(
-        """
-    CREATE TABLE IF NOT EXISTS "expense" (
-        "amount"  Decimal NOT NULL,
-        "category"	int NOT NULL,
-        "expense_date"	datetime NOT NULL,
-        "added_date"	datetime NOT NULL DEFAULT 'DATE(''now'')',
-        "comment"	str,
-        "pk"	INTEGER UNIQUE,
-        FOREIGN KEY("category") REFERENCES category(pk),
-        PRIMARY KEY("pk" AUTOINCREMENT)
-    );
-    """
-    )
-
-    cursor.execute(
-        """
-    CREATE TABLE IF NOT EXISTS "budget" (
-        "limit_amount"	Decimal NOT NULL,
-        "period_type"	PeriodType NOT NULL UNIQUE,
-        "expenses"	Decimal DEFAULT 0,
-        "pk"	INTEGER UNIQUE,
-        PRIMARY KEY("pk" AUTOINCREMENT)
-    );
-    """
-    )
+    # Create tables and indexes of the current schema version
+    cursor.execute("PRAGMA user_version = 0;")
+    conn.commit()
+    apply_migrations(conn)
 
-    # Test data
+    # Test data, amounts in minor units, dates in microseconds since the epoch
     category_data = [("Food", 1, None), ("Transport", 2, None), ("Utilities", 3, None)]
 
     expense_data = [
         (
             1,
-            454,
+            45400,
             1,
-            "2024-04-03 01:48:50.826683",
-            "2024-04-05 01:48:50.826683",
+            to_timestamp(datetime.fromisoformat("2024-04-03 01:48:50.826683")),
+            to_timestamp(datetime.fromisoformat("2024-04-05 01:48:50.826683")),
             "Groceries",
         ),
         (
             2,
-            4533,
+            453300,
             2,
-            datetime.now(),
-            "2024-04-05 01:48:50.826683",
+            to_timestamp(datetime.now()),
+            to_timestamp(datetime.fromisoformat("2024-04-05 01:48:50.826683")),
             "Bus ticket",
         ),
         (
             3,
-            4353,
+            435300,
             3,
-            "2024-04-05 01:48:50.826683",
-            "2024-04-05 01:48:50.826683",
+            to_timestamp(datetime.fromisoformat("2024-04-05 01:48:50.826683")),
+            to_timestamp(datetime.fromisoformat("2024-04-05 01:48:50.826683")),
             "Electricity bill",
         ),
         (
             4,
-            4353,
+            435300,
             3,
-            "2024-04-06 01:48:50.826683",
-            "2024-04-05 01:48:50.826683",
+            to_timestamp(datetime.fromisoformat("2024-04-06 01:48:50.826683")),
+            to_timestamp(datetime.fromisoformat("2024-04-05 01:48:50.826683")),
             "Electricity bill",
         ),
     ]
 
     budget_data = [
-        (1, PeriodType.DAY, "1000"),
-        (2, PeriodType.WEEK, "7000"),
-        (3, PeriodType.MONTH, "30000"),
+        (1, PeriodType.DAY, 100000),
+        (2, PeriodType.WEEK, 700000),
+        (3, PeriodType.MONTH, 3000000),
     ]
 
     # Insert data into the category table
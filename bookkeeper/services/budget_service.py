@@ -2,7 +2,7 @@
 Budget Service
 """
 
-from typing import Any
+from typing import Any, ContextManager
 from bookkeeper.models.budget import Budget
 from bookkeeper.repository.budget_repository import BudgetRepository
 
@@ -71,6 +71,16 @@ class BudgetService:
         """
         self.repo.delete(pk)
 
+    def transaction(self) -> ContextManager[Any]:
+        """
+        Open a transaction: all budget writes made inside the block are stored
+        together, or none of them if the block raises.
+
+        Returns:
+            ContextManager[Any]: Transaction context of the repository.
+        """
+        return self.repo.transaction()
+
     def get_with_expenses(self, pk: int) -> Budget | None:
         """
         Retrieve a budget along with its total expenses for the given period type.
@@ -92,9 +102,5 @@ class BudgetService:
         Returns:
             list[Budget]: The list of budget object with expenses.
         """
-        budgets = self.repo.get_all(where)
-        return (
-            [self.repo.get_with_expenses(budget.pk) for budget in budgets]
-            if budgets
-            else None
-        )
+        budgets = self.repo.get_all_with_expenses(where)
+        return budgets if budgets else None
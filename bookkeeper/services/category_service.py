@@ -2,15 +2,28 @@
 Expense Category Service
 """
 
-from collections import defaultdict
-from typing import Iterator
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import Iterable, Iterator
 from typing import Any
 from bookkeeper.models.category import Category
 from bookkeeper.repository.abstract_repository import AbstractRepository
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.services.category_tree import CategoryTree
 
 
 class CategoryService:
+    """
+    Category service.
+
+    Reads are served from a CategoryTree index of all categories, loaded
+    with one query on first use and dropped on every write made through
+    the service. Share one service between all consumers of categories
+    so that they see each other's writes. Parents and subcategories asked
+    for while the index is not loaded are read with the hierarchy queries
+    of the repository instead of loading all categories.
+    """
+
     def __init__(self, repo: AbstractRepository[Category] = None) -> None:
         """
         Initializes the CategoryService.
@@ -19,6 +32,28 @@ class CategoryService:
             repo (AbstractRepository[T], optional): Repository to use. Defaults to None.
         """
         self.repo = repo or SQLiteRepository[Category](cls=Category)
+        self._tree: CategoryTree | None = None
+
+    @property
+    def tree(self) -> CategoryTree:
+        """
+        Index of the category tree, rebuilt after writes.
+
+        The indexed Category objects are shared, do not modify them.
+
+        Returns:
+            CategoryTree: The category tree index.
+        """
+        if self._tree is None:
+            self._tree = CategoryTree(self.repo.get_all())
+        return self._tree
+
+    def invalidate(self) -> None:
+        """
+        Drop the category tree index, e.g. after categories were changed
+        bypassing the service.
+        """
+        self._tree = None
 
     def add(self, category: Category) -> int:
         """
@@ -30,6 +65,7 @@ class CategoryService:
         Returns:
             int: ID of the created category.
         """
+        self.invalidate()
         return self.repo.add(category)
 
     def get(self, pk: int) -> Category | None:
@@ -42,7 +78,21 @@ class CategoryService:
         Returns:
             Category | None: Category object.
         """
-        return self.repo.get(pk)
+        category = self.tree.get(pk)
+        return None if category is None else replace(category)
+
+    def get_by_name(self, name: str) -> Category | None:
+        """
+        Get a category by name.
+
+        Parameters:
+            name (str): Category name.
+
+        Returns:
+            Category | None: Category object.
+        """
+        category = self.tree.get_by_name(name)
+        return None if category is None else replace(category)
 
     def get_all(self, where: dict[str, Any] | None = None) -> list[Category]:
         """
@@ -54,7 +104,9 @@ class CategoryService:
         Returns:
             list[Category]: List of Category objects.
         """
-        return self.repo.get_all(where)
+        if where is not None:
+            return self.repo.get_all(where)
+        return [replace(category) for category in self.tree.nodes.values()]
 
     def update(self, category: Category) -> None:
         """
@@ -62,7 +114,20 @@ class CategoryService:
 
         Parameters:
             obj (Category): Category object.
+
+        Raises:
+            ValueError: If the new parent is the category itself \
+            or one of its subcategories.
         """
+        if category.parent is not None and (
+            category.parent == category.pk
+            or any(
+                child.pk == category.parent
+                for child in self.tree.descendants(category.pk)
+            )
+        ):
+            raise ValueError(f"category {category.pk} cannot be moved below itself")
+        self.invalidate()
         self.repo.update(category)
 
     def delete(self, pk: int) -> None:
@@ -72,8 +137,25 @@ class CategoryService:
         Parameters:
             pk (int): Category pk.
         """
+        self.invalidate()
         self.repo.delete(pk)
 
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        """
+        Open a transaction: all category writes made inside the block are stored
+        together, or none of them if the block raises.
+
+        Yields:
+            Any: Transaction context of the repository.
+        """
+        try:
+            with self.repo.transaction() as context:
+                yield context
+        finally:
+            # the index may have been built from writes that were rolled back
+            self.invalidate()
+
     def get_parent(self, category: Category) -> Category | None:
         """
         Get the parent category as a Category object.
@@ -87,7 +169,7 @@ class CategoryService:
         """
         if category.parent is None:
             return None
-        return self.repo.get(category.parent)
+        return self.get(category.parent)
 
     def get_all_parents(self, category: Category) -> Iterator[Category]:
         """
@@ -99,12 +181,18 @@ class CategoryService:
         Yields:
             Iterator[Category]: Category objects from the parent \
             to the top-level category.
+
+        Raises:
+            ValueError: If the parent links form a cycle.
         """
-        parent = self.get_parent(category)
-        if parent is None:
+        if category.parent is None:
             return
-        yield parent
-        yield from self.get_all_parents(parent)
+        if self._tree is None:
+            parents = self.repo.get_ancestors(category.parent, include_self=True)
+        else:
+            parents = self.tree.ancestors(category)
+        for parent in parents:
+            yield replace(parent)
 
     def get_subcategories(self, category_pk: int) -> Iterator[Category]:
         """
@@ -117,42 +205,94 @@ class CategoryService:
         Yields:
             Iterator[Category]: Category objects representing \
             subcategories of various levels below this category.
+
+        Raises:
+            ValueError: If the parent links form a cycle.
+        """
+        if self._tree is None:
+            children = self.repo.get_descendants(category_pk)
+        else:
+            children = self.tree.descendants(category_pk)
+        for child in children:
+            yield replace(child)
+
+    def _reuse(self, pk: int) -> Category:
         """
+        Get an existing category to reuse when merging a tree, from the index
+        if it is loaded, otherwise from the storage.
 
-        def get_children(
-            graph: dict[int | None, list[Category]], root: int
-        ) -> Iterator[Category]:
-            """dfs in graph from root"""
-            for x in graph[root]:
-                yield x
-                yield from get_children(graph, x.pk)
+        Parameters:
+            pk (int): Category pk.
 
-        subcats = defaultdict(list)
-        for cat in self.repo.get_all():
-            subcats[cat.parent].append(cat)
-        return get_children(subcats, category_pk)
+        Returns:
+            Category: Category object.
+        """
+        if self._tree is not None:
+            return self.get(pk)
+        return replace(self.repo.get(pk))
 
-    def create_from_tree(self, tree: list[tuple[str, str | None]]) -> list[Category]:
+    def create_from_tree(
+        self,
+        tree: Iterable[tuple[str, str | None]],
+        merge: bool = False,
+        names: dict[str, int] | None = None,
+    ) -> list[Category]:
         """
         Create a category tree from a list of "child-parent" pairs.
         The list must be topologically sorted, i.e. children
-        should not appear before their parents.
-        No validation of the input data is performed.
-        When using DBMS with foreign key checks, an error will be raised
-        (for sqlite3 - IntegrityError). Without DBMS validation,
-        the result may be correct if the input data is correct except for sorting.
-        If not, then not.
-        "Garbage in, garbage out".
+        should not appear before their parents, otherwise KeyError is raised.
+        Parents are referred to by name.
+        The tree is created in a single transaction: on error nothing is stored.
+        Categories are inserted level by level, one batch per depth, so the pks
+        of the parents are known before their children are inserted.
 
         Parameters:
-            tree (list[tuple[str, str | None]]): List of "child-parent" pairs.
+            tree (Iterable[tuple[str, str | None]]): "Child-parent" pairs.
+            merge (bool, optional): Reuse the categories that already exist \
+                (in the storage or earlier in the tree) with the same name \
+                instead of failing on the duplicate name. Defaults to False.
+            names (dict[str, int] | None, optional): In merge mode, pks of \
+                the existing categories by name to use instead of reading \
+                all stored categories; the created categories are added \
+                to it. Lets a tree created in parts read the storage once. \
+                Defaults to None.
 
         Returns:
-            list[Category]: List of created Category objects.
-        """
-        created: dict[str, Category] = {}
-        for child, parent in tree:
-            cat = Category(child, created[parent].pk if parent is not None else None)
-            self.repo.add(cat)
-            created[child] = cat
-        return list(created.values())
+            list[Category]: Created (and, in merge mode, reused) Category \
+            objects in the order of the tree.
+        """
+        if names is None:
+            names = dict(self.tree.by_name) if merge else {}
+        # categories by name: the ones of the tree and the reused ones
+        known: dict[str, Category] = {}
+        # depth of the categories to insert, -1 for the reused ones
+        depths: dict[str, int] = {}
+        result: list[Category] = []
+        levels: list[list[tuple[Category, str | None]]] = []
+        with self.transaction():
+            for child, parent in tree:
+                if merge and (child in known or child in names):
+                    if child not in known:
+                        known[child] = self._reuse(names[child])
+                        depths[child] = -1
+                    result.append(known[child])
+                    continue
+                if parent is not None and parent not in depths:
+                    if parent not in names:
+                        raise KeyError(parent)
+                    known[parent] = self._reuse(names[parent])
+                    depths[parent] = -1
+                depth = 0 if parent is None else depths[parent] + 1
+                if depth == len(levels):
+                    levels.append([])
+                category = Category(child)
+                levels[depth].append((category, parent))
+                depths[child] = depth
+                known[child] = category
+                result.append(category)
+            for level in levels:
+                for category, parent in level:
+                    category.parent = None if parent is None else known[parent].pk
+                self.repo.add_many(category for category, _ in level)
+                names.update((category.name, category.pk) for category, _ in level)
+        return result
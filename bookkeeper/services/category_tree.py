@@ -0,0 +1,203 @@
+"""
+In-memory index of the category tree
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable, Iterator, Mapping
+from bookkeeper.models.category import Category
+
+
+@dataclass
+class Rollup:
+    """
+    Total of a category together with its subcategories.
+
+    Attributes:
+        category (Category): The category.
+        own (Decimal): Total of the category itself.
+        total (Decimal): Total of the category and all its subcategories.
+    """
+
+    category: Category
+    own: Decimal
+    total: Decimal
+
+
+class CategoryTree:
+    """
+    Index of a category tree built from all categories at once.
+
+    Attributes:
+        nodes (dict[int, Category]): Categories by pk.
+        children (dict[int | None, list[int]]): Pks of the child categories \
+            by parent pk, None for the top-level categories. Children are \
+            ordered by pk.
+        by_name (dict[str, int]): Category pks by name.
+    """
+
+    def __init__(self, categories: Iterable[Category]) -> None:
+        """
+        Builds the index.
+
+        Parameters:
+            categories (Iterable[Category]): All categories of the tree.
+        """
+        self.nodes: dict[int, Category] = {}
+        self.children: dict[int | None, list[int]] = {}
+        self.by_name: dict[str, int] = {}
+        for category in sorted(categories, key=lambda category: category.pk):
+            self.nodes[category.pk] = category
+            self.children.setdefault(category.parent, []).append(category.pk)
+            self.by_name[category.name] = category.pk
+        self._depths: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, pk: object) -> bool:
+        return pk in self.nodes
+
+    def get(self, pk: int) -> Category | None:
+        """
+        Get a category by pk.
+
+        Parameters:
+            pk (int): Category pk.
+
+        Returns:
+            Category | None: Category object or None if there is no such category.
+        """
+        return self.nodes.get(pk)
+
+    def get_by_name(self, name: str) -> Category | None:
+        """
+        Get a category by name.
+
+        Parameters:
+            name (str): Category name.
+
+        Returns:
+            Category | None: Category object or None if there is no such category.
+        """
+        pk = self.by_name.get(name)
+        return None if pk is None else self.nodes[pk]
+
+    def ancestors(self, category: Category) -> Iterator[Category]:
+        """
+        Iterate over the parents of a category up to the top-level category.
+
+        Parameters:
+            category (Category): Category object, not necessarily stored.
+
+        Yields:
+            Category: Category objects from the parent to the top-level category.
+
+        Raises:
+            ValueError: If the parent links form a cycle.
+        """
+        seen = {category.pk}
+        parent = self.nodes.get(category.parent)
+        while parent is not None:
+            if parent.pk in seen:
+                raise ValueError(f"category {parent.pk} is its own ancestor")
+            seen.add(parent.pk)
+            yield parent
+            parent = self.nodes.get(parent.parent)
+
+    def roots(self) -> list[int]:
+        """
+        Get the pks of the categories without a stored parent: the top-level
+        categories and the ones whose parent is missing.
+
+        Returns:
+            list[int]: Category pks ordered by pk.
+        """
+        return sorted(
+            pk
+            for parent, children in self.children.items()
+            if parent is None or parent not in self.nodes
+            for pk in children
+        )
+
+    def rollup(self, own: Mapping[int, Decimal]) -> dict[int, Rollup]:
+        """
+        Add up totals of categories over their subtrees in one bottom-up pass.
+
+        Parameters:
+            own (Mapping[int, Decimal]): Totals of the categories by pk, \
+                categories missing from it have a zero total; pks that are \
+                not in the tree are ignored.
+
+        Returns:
+            dict[int, Rollup]: Rollups of all categories by pk.
+        """
+        order: list[Category] = []
+        for pk in self.roots():
+            order.append(self.nodes[pk])
+            order.extend(self.descendants(pk))
+        rollups: dict[int, Rollup] = {}
+        for category in order:
+            amount = own.get(category.pk, Decimal(0))
+            rollups[category.pk] = Rollup(category, amount, amount)
+        # children always come after their parents in depth-first order
+        for category in reversed(order):
+            parent = rollups.get(category.parent)
+            if parent is not None:
+                parent.total += rollups[category.pk].total
+        return rollups
+
+    def descendants(self, pk: int | None) -> Iterator[Category]:
+        """
+        Iterate over the categories below a category at any depth,
+        in depth-first order with siblings ordered by pk.
+
+        Parameters:
+            pk (int | None): Category pk, None for the whole tree.
+
+        Yields:
+            Category: Category objects below the category.
+
+        Raises:
+            ValueError: If the parent links form a cycle.
+        """
+        seen = {pk}
+        stack = list(reversed(self.children.get(pk, [])))
+        while stack:
+            child = stack.pop()
+            if child in seen:
+                raise ValueError(f"category {child} is its own ancestor")
+            seen.add(child)
+            yield self.nodes[child]
+            stack.extend(reversed(self.children.get(child, [])))
+
+    def depth(self, pk: int) -> int:
+        """
+        Get the depth of a category, 0 for top-level categories.
+
+        Parameters:
+            pk (int): Category pk.
+
+        Returns:
+            int: Number of parents of the category.
+
+        Raises:
+            ValueError: If the parent links form a cycle.
+        """
+        if pk not in self._depths:
+            self._depths[pk] = sum(1 for _ in self.ancestors(self.nodes[pk]))
+        return self._depths[pk]
+
+    def path(self, pk: int) -> list[Category]:
+        """
+        Get the path to a category from its top-level category.
+
+        Parameters:
+            pk (int): Category pk.
+
+        Returns:
+            list[Category]: Category objects from the top-level category \
+                to the category itself.
+        """
+        category = self.nodes[pk]
+        return [*reversed(list(self.ancestors(category))), category]
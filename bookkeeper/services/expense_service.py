@@ -2,22 +2,67 @@
 Expense Service
 """
 
-from typing import Any
+import csv
+import json
+import os
+import sys
+from typing import Any, ContextManager, Iterable, Iterator, Mapping, Sequence, TextIO
 from datetime import datetime
 from decimal import Decimal
+from bookkeeper.repository.expense_archive import (
+    VACUUM_THRESHOLD,
+    ExpenseArchive,
+    default_archive_file,
+)
 from bookkeeper.repository.expense_repository import ExpenseRepository
+from bookkeeper.repository.partitioned_expense_repository import (
+    create_expense_repository,
+)
+from bookkeeper.repository.query import And, Aggregate, Bucket, Condition, Query
+from bookkeeper.repository.query import Where, as_predicate, merge_aggregates
+from bookkeeper.services.category_tree import CategoryTree, Rollup
 from bookkeeper.models.expense import Expense
+from bookkeeper.models.budget import PeriodType
+
+# Exported expense fields, in the column order of the exported files
+EXPORT_FIELDS = ["pk", "amount", "category", "expense_date", "added_date", "comment"]
+
+
+def _export_value(value: Any) -> Any:
+    """
+    Convert a stored value to its exported form: dates to ISO 8601 strings,
+    amounts to exact decimal strings.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
 
 
 class ExpenseService:
-    def __init__(self, repo: ExpenseRepository = None) -> None:
+    def __init__(
+        self, repo: ExpenseRepository = None, archive: ExpenseArchive | None = None
+    ) -> None:
         """
         Initializes the ExpenseService.
 
         Parameters:
-            repo (AbstractRepository[T], optional): Repository to use. Defaults to None.
+            repo (AbstractRepository[T], optional): Repository to use. Defaults to None, \
+                the repository configured in settings.ini.
+            archive (ExpenseArchive | None, optional): Archive of old expenses \
+                of the repository, added to the totals and aggregates. \
+                Defaults to None, the archive of the repository if its \
+                database file exists.
         """
-        self.repo = repo or ExpenseRepository()
+        self.repo = repo or create_expense_repository()
+        if (
+            archive is None
+            and isinstance(self.repo, ExpenseRepository)
+            and os.path.exists(default_archive_file(self.repo.db.db_name))
+        ):
+            archive = ExpenseArchive(self.repo)
+        self.archive = archive
 
     def add(self, expense: Expense) -> int:
         """
@@ -31,6 +76,18 @@ class ExpenseService:
         """
         return self.repo.add(expense)
 
+    def add_many(self, expenses: Iterable[Expense]) -> list[int]:
+        """
+        Add expenses to the storage in one transaction.
+
+        Parameters:
+            expenses (Iterable[Expense]): Expense objects.
+
+        Returns:
+            list[int]: IDs of the created expense operations.
+        """
+        return self.repo.add_many(expenses)
+
     def get(self, pk: int) -> Expense | None:
         """
         Get an expense operation by pk.
@@ -43,18 +100,85 @@ class ExpenseService:
         """
         return self.repo.get(pk)
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[Expense]:
+    def get_all(self, where: Where = None) -> list[Expense]:
         """
         Get a list of all expense operations from the storage.
 
         Parameters:
-            where (dict[str, Any] | None, optional): Filtering object. Defaults to None.
+            where (Where, optional): Filtering object or query condition. \
+                Defaults to None.
 
         Returns:
             list[Expense]: List of Expense objects.
         """
         return self.repo.get_all(where)
 
+    def find(self, query: Query) -> list[Expense]:
+        """
+        Get expense operations selected, ordered and limited by a query.
+
+        Parameters:
+            query (Query): Query specification, filtering and sorting are \
+                done by the storage.
+
+        Returns:
+            list[Expense]: List of Expense objects.
+        """
+        return self.repo.find(query)
+
+    def iter_all(
+        self,
+        where: Where = None,
+        order_by: str | Sequence[str] | None = None,
+        batch_size: int = 1000,
+    ) -> Iterator[Expense]:
+        """
+        Iterate over expense operations without loading all of them at once.
+
+        Parameters:
+            where (Where, optional): Filtering object or query condition. \
+                Defaults to None.
+            order_by (str | Sequence[str] | None, optional): Field name or names \
+                to order by, '-name' for descending order. Defaults to None.
+            batch_size (int, optional): Number of records loaded at a time.
+
+        Returns:
+            Iterator[Expense]: Expense objects.
+        """
+        return self.repo.iter_all(where, order_by, batch_size)
+
+    def page(
+        self,
+        limit: int,
+        after_pk: int | None = None,
+        after_date: datetime | None = None,
+        where: Where = None,
+    ) -> list[Expense]:
+        """
+        Get a page of expense operations.
+
+        Without 'after_date' expenses are ordered by pk, otherwise by expense
+        date. To get the next page pass the pk (and the expense date) of the
+        last expense of the previous one.
+
+        Parameters:
+            limit (int): Maximum number of expenses on the page.
+            after_pk (int | None, optional): Pk of the last expense of the \
+                previous page. Defaults to None for the first page.
+            after_date (datetime | None, optional): Expense date of the last \
+                expense of the previous page when paginating by date.
+            where (Where, optional): Filtering object or query condition. \
+                Defaults to None.
+
+        Returns:
+            list[Expense]: List of Expense objects.
+        """
+        if after_date is None:
+            return self.repo.page(limit, after_pk, where=where)
+        return self.repo.page(
+            limit, after_pk, after_date, key="expense_date", where=where
+        )
+
     def update(self, obj: Expense) -> None:
         """
         Update expense operation data. The object must contain the pk field.
@@ -73,6 +197,143 @@ class ExpenseService:
         """
         self.repo.delete(pk)
 
+    def transaction(self) -> ContextManager[Any]:
+        """
+        Open a transaction: all expense writes made inside the block are stored
+        together, or none of them if the block raises.
+
+        Returns:
+            ContextManager[Any]: Transaction context of the repository.
+        """
+        return self.repo.transaction()
+
+    def aggregate(
+        self,
+        by_category: bool = True,
+        period: PeriodType | None = None,
+        where: Where = None,
+    ) -> list[Aggregate]:
+        """
+        Get the sum, count, minimum and maximum of expense amounts grouped
+        by category and/or by day, week or month of the expense date.
+        Archived expenses are included, see ExpenseArchive.aggregate.
+
+        Parameters:
+            by_category (bool, optional): Group by category. Defaults to True.
+            period (PeriodType | None, optional): Time bucket to group by. \
+                Defaults to None.
+            where (Where, optional): Filtering object or query condition. \
+                Defaults to None.
+
+        Returns:
+            list[Aggregate]: Aggregates ordered by their group, which is \
+                (category,), (bucket start,) or (category, bucket start).
+        """
+        group_by: list[str | Bucket] = ["category"] if by_category else []
+        if period is not None:
+            group_by.append(Bucket("expense_date", period))
+        aggregates = self.repo.aggregate("amount", group_by, where)
+        if self.archive is not None:
+            aggregates = merge_aggregates(
+                aggregates, self.archive.aggregate(group_by, where)
+            )
+        return aggregates
+
+    def get_category_rollups(
+        self, tree: CategoryTree, start_date: datetime, end_date: datetime
+    ) -> dict[int, Rollup]:
+        """
+        Get the expenses of every category for a period, on their own and
+        together with all subcategories.
+
+        The per-category sums come from one grouped query and are added up
+        over the tree in a single bottom-up pass.
+
+        Parameters:
+            tree (CategoryTree): The category tree, see CategoryService.tree.
+            start_date (datetime): The start date of the period.
+            end_date (datetime): The end date of the period.
+
+        Returns:
+            dict[int, Rollup]: Rollups of all categories by category pk.
+        """
+        where = Condition("expense_date", ">=", start_date) & Condition(
+            "expense_date", "<=", end_date
+        )
+        own = {
+            aggregate.group[0]: aggregate.total
+            for aggregate in self.aggregate(where=where)
+        }
+        return tree.rollup(own)
+
+    def export(
+        self,
+        out: TextIO = None,
+        fmt: str = "csv",
+        where: Where = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        categories: Mapping[int, str] | None = None,
+        batch_size: int = 1000,
+    ) -> int:
+        """
+        Export expenses to CSV or JSON Lines, ordered by expense date.
+
+        Rows are streamed from the storage to 'out' 'batch_size' at a time,
+        so memory use does not depend on the number of expenses. Amounts are
+        written as exact decimal strings and dates in ISO 8601.
+
+        Parameters:
+            out (TextIO, optional): Text stream to write to. Defaults to stdout.
+            fmt (str, optional): "csv" or "jsonl". Defaults to "csv".
+            where (Where, optional): Filtering object or query condition. \
+                Defaults to None.
+            start_date (datetime | None, optional): Export expenses made \
+                on or after this date. Defaults to None.
+            end_date (datetime | None, optional): Export expenses made \
+                on or before this date. Defaults to None.
+            categories (Mapping[int, str] | None, optional): Category names \
+                by pk, e.g. built from CategoryService.tree, adds \
+                a "category_name" column. Defaults to None.
+            batch_size (int, optional): Number of rows read at a time.
+
+        Returns:
+            int: Number of exported expenses.
+
+        Raises:
+            ValueError: If the format is unknown.
+        """
+        if fmt not in ("csv", "jsonl"):
+            raise ValueError(f"unknown export format '{fmt}'")
+        out = out or sys.stdout
+        conditions = [as_predicate(where)]
+        if start_date is not None:
+            conditions.append(Condition("expense_date", ">=", start_date))
+        if end_date is not None:
+            conditions.append(Condition("expense_date", "<=", end_date))
+        query = Query(
+            And(*(condition for condition in conditions if condition is not None)),
+            order_by=["expense_date", "pk"],
+            columns=EXPORT_FIELDS,
+        )
+        header = EXPORT_FIELDS + (["category_name"] if categories is not None else [])
+        writer = csv.writer(out) if fmt == "csv" else None
+        if writer is not None:
+            writer.writerow(header)
+        category_index = EXPORT_FIELDS.index("category")
+        count = 0
+        for row in self.repo.iter_rows(query, batch_size):
+            values = [_export_value(value) for value in row]
+            if categories is not None:
+                values.append(categories.get(row[category_index]))
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                out.write(json.dumps(dict(zip(header, values)), ensure_ascii=False))
+                out.write("\n")
+            count += 1
+        return count
+
     def get_total_expense_for_period(
         self, start_date: datetime, end_date: datetime
     ) -> Decimal:
@@ -84,9 +345,48 @@ class ExpenseService:
         end_date (datetime): The end date of the period.
 
         Returns:
-        Decimal: The total expenses for the specified period.
+        Decimal: The total expenses for the specified period, archived \
+            expenses included.
         """
         if not isinstance(start_date, datetime) or not isinstance(end_date, datetime):
             raise TypeError("start_date and end_date must be instances of datetime.")
 
-        return self.repo.get_total_expense_for_period(start_date, end_date)
+        total = self.repo.get_total_expense_for_period(start_date, end_date)
+        if self.archive is not None:
+            total += self.archive.get_total(start_date, end_date)
+        return total
+
+    def archive_expenses(
+        self,
+        before: datetime,
+        compact: bool = True,
+        threshold: float = VACUUM_THRESHOLD,
+    ) -> int:
+        """
+        Move the expenses of the months before the month of a date to the
+        archive, keeping their monthly totals by category in the storage.
+
+        Parameters:
+            before (datetime): Expenses before the first day of its month \
+                are archived.
+            compact (bool, optional): Then reclaim free space and refresh the \
+                query statistics, see ExpenseArchive.compact. Defaults to True.
+            threshold (float, optional): Share of free pages that triggers \
+                the incremental vacuum.
+
+        Returns:
+            int: Number of archived expenses.
+
+        Raises:
+            TypeError: If 'before' is not a datetime.
+            ValueError: If the service has no archive.
+        """
+        if not isinstance(before, datetime):
+            raise TypeError("before must be an instance of datetime.")
+        if self.archive is None:
+            raise ValueError("no expense archive configured")
+
+        count = self.archive.archive(before)
+        if compact:
+            self.archive.compact(threshold)
+        return count
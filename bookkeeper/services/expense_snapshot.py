@@ -0,0 +1,288 @@
+"""
+Columnar snapshot of expenses for analytics
+"""
+
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, Sequence
+from bookkeeper.models.budget import PeriodType
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import Query, Where
+from bookkeeper.utils.sqlite_utils import from_minor_units, to_minor_units
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+# Columns read from the expense repository, in order
+SNAPSHOT_FIELDS = ["pk", "amount", "category", "expense_date", "comment"]
+
+
+class ExpenseSnapshot:
+    """
+    Read-only columnar copy of expenses.
+
+    Every field is kept in its own array of 64-bit integers instead of
+    one object per expense: amounts in minor units, expense dates as date
+    ordinals (date.toordinal()) and category pks. Comments are kept
+    separately in a list. Filtering and grouping run over whole columns,
+    with NumPy when it is installed and plain loops over arrays otherwise.
+
+    Attributes:
+        pk (Sequence[int]): Expense pks.
+        amount (Sequence[int]): Amounts in minor units.
+        day (Sequence[int]): Date ordinals of the expense dates.
+        category (Sequence[int]): Category pks.
+        comments (list[str]): Comments.
+        use_numpy (bool): Whether the columns are NumPy arrays.
+    """
+
+    def __init__(
+        self,
+        pk: Iterable[int] = (),
+        amount: Iterable[int] = (),
+        day: Iterable[int] = (),
+        category: Iterable[int] = (),
+        comments: Iterable[str] = (),
+        use_numpy: bool | None = None,
+    ) -> None:
+        """
+        Initializes the ExpenseSnapshot from columns of equal length.
+
+        Parameters:
+            pk (Iterable[int]): Expense pks.
+            amount (Iterable[int]): Amounts in minor units.
+            day (Iterable[int]): Date ordinals of the expense dates.
+            category (Iterable[int]): Category pks.
+            comments (Iterable[str]): Comments.
+            use_numpy (bool | None, optional): Use NumPy arrays. Defaults to \
+                None, which uses NumPy if it is installed.
+
+        Raises:
+            ImportError: If NumPy is requested but not installed.
+            ValueError: If the columns have different lengths.
+        """
+        if use_numpy is None:
+            use_numpy = np is not None
+        elif use_numpy and np is None:
+            raise ImportError("NumPy is not installed")
+        self.use_numpy: bool = use_numpy
+        self.pk = self._column(pk)
+        self.amount = self._column(amount)
+        self.day = self._column(day)
+        self.category = self._column(category)
+        self.comments: list[str] = list(comments)
+        lengths = {len(self.pk), len(self.amount), len(self.day), len(self.category)}
+        if len(lengths | {len(self.comments)}) != 1:
+            raise ValueError("snapshot columns must have the same length")
+
+    def _column(self, values: Iterable[int]) -> Sequence[int]:
+        """
+        Store a column as an int64 array of the snapshot backend.
+
+        Parameters:
+            values (Iterable[int]): Column values.
+
+        Returns:
+            Sequence[int]: NumPy array or array.array.
+        """
+        if not isinstance(values, array) and not (
+            np is not None and isinstance(values, np.ndarray)
+        ):
+            values = array("q", values)
+        if self.use_numpy:
+            return np.asarray(values, dtype=np.int64)
+        return values if isinstance(values, array) else array("q", values.tolist())
+
+    @classmethod
+    def from_repository(
+        cls,
+        repo: AbstractRepository,
+        where: Where = None,
+        batch_size: int = 1000,
+        use_numpy: bool | None = None,
+    ) -> "ExpenseSnapshot":
+        """
+        Build a snapshot of the expenses of a repository.
+
+        Rows are streamed from the repository into the arrays, without
+        creating Expense objects.
+
+        Parameters:
+            repo (AbstractRepository): Expense repository.
+            where (Where, optional): Filtering object or query condition. \
+                Defaults to None.
+            batch_size (int, optional): Number of rows read at a time.
+            use_numpy (bool | None, optional): Use NumPy arrays. Defaults to \
+                None, which uses NumPy if it is installed.
+
+        Returns:
+            ExpenseSnapshot: The snapshot.
+        """
+        pk, amount, day, category = array("q"), array("q"), array("q"), array("q")
+        comments: list[str] = []
+        query = Query(where, order_by="pk", columns=SNAPSHOT_FIELDS)
+        for row in repo.iter_rows(query, batch_size):
+            pk.append(row[0])
+            amount.append(to_minor_units(row[1]))
+            category.append(row[2])
+            day.append(row[3].toordinal())
+            comments.append(row[4] or "")
+        return cls(pk, amount, day, category, comments, use_numpy)
+
+    def __len__(self) -> int:
+        return len(self.pk)
+
+    def _mask(
+        self,
+        start: date | None,
+        end: date | None,
+        categories: Iterable[int] | None,
+    ) -> Sequence[bool]:
+        """
+        Compute the selection mask of select.
+        """
+        if self.use_numpy:
+            mask = np.ones(len(self), dtype=bool)
+            if start is not None:
+                mask &= self.day >= start.toordinal()
+            if end is not None:
+                mask &= self.day <= end.toordinal()
+            if categories is not None:
+                mask &= np.isin(self.category, np.fromiter(categories, dtype=np.int64))
+            return mask
+        low = start.toordinal() if start is not None else None
+        high = end.toordinal() if end is not None else None
+        wanted = set(categories) if categories is not None else None
+        return [
+            (low is None or day >= low)
+            and (high is None or day <= high)
+            and (wanted is None or category in wanted)
+            for day, category in zip(self.day, self.category)
+        ]
+
+    def select(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        categories: Iterable[int] | None = None,
+    ) -> "ExpenseSnapshot":
+        """
+        Select the expenses of a date range and/or of some categories.
+
+        Parameters:
+            start (date | None, optional): First day, inclusive. \
+                Defaults to None.
+            end (date | None, optional): Last day, inclusive. Defaults to None.
+            categories (Iterable[int] | None, optional): Category pks. \
+                Defaults to None.
+
+        Returns:
+            ExpenseSnapshot: A new snapshot with the selected expenses.
+        """
+        mask = self._mask(start, end, categories)
+        if self.use_numpy:
+            indexes = np.flatnonzero(mask)
+            columns: list[Any] = [
+                self.pk[indexes],
+                self.amount[indexes],
+                self.day[indexes],
+                self.category[indexes],
+            ]
+            comments = [self.comments[i] for i in indexes.tolist()]
+        else:
+            indexes = [i for i, selected in enumerate(mask) if selected]
+            columns = [
+                array("q", (column[i] for i in indexes))
+                for column in (self.pk, self.amount, self.day, self.category)
+            ]
+            comments = [self.comments[i] for i in indexes]
+        return ExpenseSnapshot(*columns, comments, use_numpy=self.use_numpy)
+
+    def total(self) -> Decimal:
+        """
+        Get the sum of all amounts.
+
+        Returns:
+            Decimal: The total.
+        """
+        if self.use_numpy:
+            return from_minor_units(int(self.amount.sum()))
+        return from_minor_units(sum(self.amount))
+
+    def buckets(self, period: PeriodType) -> Sequence[int]:
+        """
+        Get the date ordinal of the start of the bucket of every expense.
+
+        Parameters:
+            period (PeriodType): Day, week (starting on Monday) or month.
+
+        Returns:
+            Sequence[int]: Date ordinals of the bucket starts.
+        """
+        if period == PeriodType.DAY:
+            return self.day
+        if period == PeriodType.WEEK:
+            # day 1 (January 1 of year 1) is a Monday
+            if self.use_numpy:
+                return self.day - (self.day - 1) % 7
+            return array("q", (day - (day - 1) % 7 for day in self.day))
+        if self.use_numpy:
+            epoch = date(1970, 1, 1).toordinal()
+            days = (self.day - epoch).astype("datetime64[D]")
+            months = days.astype("datetime64[M]").astype("datetime64[D]")
+            return months.astype(np.int64) + epoch
+        starts: dict[int, int] = {}
+        for day in set(self.day):
+            starts[day] = date.fromordinal(day).replace(day=1).toordinal()
+        return array("q", (starts[day] for day in self.day))
+
+    def sum_by(self, keys: Sequence[int]) -> dict[int, Decimal]:
+        """
+        Sum the amounts grouped by a key column.
+
+        Parameters:
+            keys (Sequence[int]): Group key of every expense, e.g. \
+                self.category or self.buckets(period).
+
+        Returns:
+            dict[int, Decimal]: Totals by key, ordered by key.
+        """
+        if self.use_numpy:
+            unique, inverse = np.unique(keys, return_inverse=True)
+            totals = np.zeros(len(unique), dtype=np.int64)
+            np.add.at(totals, inverse, self.amount)
+            return {
+                key: from_minor_units(total)
+                for key, total in zip(unique.tolist(), totals.tolist())
+            }
+        sums: dict[int, int] = {}
+        for key, amount in zip(keys, self.amount):
+            sums[key] = sums.get(key, 0) + amount
+        return {key: from_minor_units(sums[key]) for key in sorted(sums)}
+
+    def sum_by_category(self) -> dict[int, Decimal]:
+        """
+        Sum the amounts by category.
+
+        Returns:
+            dict[int, Decimal]: Totals by category pk.
+        """
+        return self.sum_by(self.category)
+
+    def sum_by_period(self, period: PeriodType) -> dict[datetime, Decimal]:
+        """
+        Sum the amounts by day, week or month of the expense date.
+
+        Parameters:
+            period (PeriodType): Day, week (starting on Monday) or month.
+
+        Returns:
+            dict[datetime, Decimal]: Totals by the start of the period.
+        """
+        return {
+            datetime.fromordinal(key): total
+            for key, total in self.sum_by(self.buckets(period)).items()
+        }
@@ -0,0 +1,243 @@
+"""
+Import Service
+"""
+
+import csv
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Iterable, Iterator
+from bookkeeper.models.expense import Expense
+from bookkeeper.services.category_service import CategoryService
+from bookkeeper.services.expense_service import ExpenseService
+from bookkeeper.utils.utils import batched, iter_tree
+
+# Number of records written to the storage at a time
+BATCH_SIZE = 1000
+
+# Number of error messages kept in ImportStats, the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class ImportStats:
+    """
+    Progress of an import.
+
+    Attributes:
+        read (int): Number of records read so far.
+        imported (int): Number of records stored so far.
+        skipped (int): Number of invalid records skipped.
+        errors (list[str]): Messages of the first MAX_REPORTED_ERRORS errors.
+    """
+
+    read: int = 0
+    imported: int = 0
+    skipped: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def add_error(self, message: str) -> None:
+        """
+        Count a skipped record and keep its message while there are few of them.
+
+        Parameters:
+            message (str): Error message.
+        """
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+
+class ImportService:
+    """
+    Streaming import of categories and expenses.
+
+    Files are read line by line and written in batches of 'batch_size'
+    records, so memory use does not depend on the file size. Each import
+    runs in one transaction on purpose: if it fails, nothing is stored and
+    the import can simply be rerun. The database stays locked for writing
+    until the import ends, so other writers wait for the whole import.
+    """
+
+    def __init__(
+        self,
+        category_service: CategoryService = None,
+        expense_service: ExpenseService = None,
+        batch_size: int = BATCH_SIZE,
+        progress: Callable[[ImportStats], None] | None = None,
+    ) -> None:
+        """
+        Initializes the ImportService.
+
+        Parameters:
+            category_service (CategoryService, optional): Category service. \
+                Defaults to None.
+            expense_service (ExpenseService, optional): Expense service. \
+                Defaults to None.
+            batch_size (int, optional): Number of records written at a time.
+            progress (Callable[[ImportStats], None] | None, optional): Called \
+                with the import statistics after every batch. Defaults to None.
+        """
+        self.category_service = category_service or CategoryService()
+        self.expense_service = expense_service or ExpenseService()
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def import_category_tree(self, lines: Iterable[str]) -> ImportStats:
+        """
+        Import categories from an indented tree, see utils.read_tree.
+        Categories that already exist are reused by name.
+
+        Parameters:
+            lines (Iterable[str]): Lines of the tree, e.g. an open file.
+
+        Returns:
+            ImportStats: Import statistics.
+        """
+        return self._import_categories(iter_tree(lines))
+
+    def import_categories_csv(self, lines: Iterable[str]) -> ImportStats:
+        """
+        Import categories from CSV with the columns 'name' and 'parent'
+        (name of the parent category, empty for top-level categories).
+        Parents must come before their children. Categories that already
+        exist are reused by name.
+
+        Parameters:
+            lines (Iterable[str]): Lines of the CSV file, e.g. an open file.
+
+        Returns:
+            ImportStats: Import statistics.
+
+        Raises:
+            ValueError: If a row has no category name.
+        """
+
+        def pairs() -> Iterator[tuple[str, str | None]]:
+            reader = csv.DictReader(lines)
+            for row in reader:
+                name = (row.get("name") or "").strip()
+                if not name:
+                    raise ValueError(f"line {reader.line_num}: empty category name")
+                yield name, (row.get("parent") or "").strip() or None
+
+        return self._import_categories(pairs())
+
+    def _import_categories(
+        self, pairs: Iterable[tuple[str, str | None]]
+    ) -> ImportStats:
+        """
+        Store "child-parent" pairs batch by batch in one transaction.
+        The stored categories are read once, the names created by the
+        previous batches are tracked along with them.
+
+        Parameters:
+            pairs (Iterable[tuple[str, str | None]]): "Child-parent" pairs.
+
+        Returns:
+            ImportStats: Import statistics.
+        """
+        stats = ImportStats()
+        with self.category_service.transaction():
+            names = dict(self.category_service.tree.by_name)
+            for batch in batched(pairs, self.batch_size):
+                stats.read += len(batch)
+                # merging resolves parents stored by the previous batches
+                self.category_service.create_from_tree(batch, merge=True, names=names)
+                stats.imported += len(batch)
+                self._report(stats)
+        return stats
+
+    def import_expenses_csv(
+        self, lines: Iterable[str], strict: bool = True
+    ) -> ImportStats:
+        """
+        Import expenses from CSV with the columns 'amount', 'category'
+        (name or pk), 'expense_date' (ISO 8601) and optionally 'comment'.
+
+        Parameters:
+            lines (Iterable[str]): Lines of the CSV file, e.g. an open file.
+            strict (bool, optional): Fail on the first invalid row, otherwise \
+                skip invalid rows and report them in the statistics. \
+                Defaults to True.
+
+        Returns:
+            ImportStats: Import statistics.
+
+        Raises:
+            ValueError: In strict mode, if a row is invalid.
+        """
+        stats = ImportStats()
+        reader = csv.DictReader(lines)
+
+        def expenses() -> Iterator[Expense]:
+            for row in reader:
+                stats.read += 1
+                try:
+                    yield self.parse_expense(row)
+                except ValueError as error:
+                    message = f"line {reader.line_num}: {error}"
+                    if strict:
+                        raise ValueError(message) from error
+                    stats.add_error(message)
+
+        with self.expense_service.transaction():
+            for batch in batched(expenses(), self.batch_size):
+                self.expense_service.add_many(batch)
+                stats.imported += len(batch)
+                self._report(stats)
+        return stats
+
+    def parse_expense(self, row: dict[str, str]) -> Expense:
+        """
+        Validate a CSV row and build an expense from it.
+
+        Parameters:
+            row (dict[str, str]): CSV row.
+
+        Returns:
+            Expense: Expense object.
+
+        Raises:
+            ValueError: If a value is missing or invalid, or the category \
+                does not exist.
+        """
+        try:
+            amount = Decimal((row.get("amount") or "").strip())
+        except InvalidOperation as error:
+            raise ValueError(f"invalid amount {row.get('amount')!r}") from error
+        if not amount.is_finite():
+            raise ValueError(f"invalid amount {row.get('amount')!r}")
+
+        category = (row.get("category") or "").strip()
+        tree = self.category_service.tree
+        if category.isdigit() and int(category) in tree:
+            category_pk = int(category)
+        elif (found := tree.get_by_name(category)) is not None:
+            category_pk = found.pk
+        else:
+            raise ValueError(f"unknown category {category!r}")
+
+        try:
+            expense_date = datetime.fromisoformat(
+                (row.get("expense_date") or "").strip()
+            )
+        except ValueError as error:
+            raise ValueError(f"invalid date {row.get('expense_date')!r}") from error
+
+        return Expense(
+            amount,
+            category_pk,
+            expense_date,
+            comment=(row.get("comment") or "").strip(),
+        )
+
+    def _report(self, stats: ImportStats) -> None:
+        """
+        Report the import progress.
+
+        Parameters:
+            stats (ImportStats): Import statistics.
+        """
+        if self.progress is not None:
+            self.progress(stats)
@@ -2,26 +2,145 @@
 SQLite database utility.
 """
 
-from typing import Any, Dict, List, Tuple
-from datetime import datetime
-from decimal import Decimal
+from contextlib import contextmanager
+from itertools import count
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Tuple
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_EVEN
+import atexit
+import configparser
+import re
 import sqlite3
+import threading
 from bookkeeper.models.budget import PeriodType
 
 
-def dict_factory(cursor: sqlite3.Cursor, row: Tuple) -> Dict[str, Any]:
+config = configparser.ConfigParser()
+config.read("bookkeeper/config/settings.ini")
+
+# Money is stored as integers in columns declared as MONEY_COLUMN_TYPE;
+# an amount of 1 is stored as 10 ** MONEY_SCALE minor units
+MONEY_SCALE = 2
+MONEY_COLUMN_TYPE = "Money INTEGER"
+
+# Datetimes are stored as integer microseconds since EPOCH (naive, local time)
+# in columns declared as TIMESTAMP_COLUMN_TYPE, which keeps them sortable
+EPOCH = datetime(1970, 1, 1)
+TIMESTAMP_COLUMN_TYPE = "Timestamp INTEGER"
+
+# Pragmas that may be set from settings.ini, in the order they are applied
+PRAGMA_NAMES: Tuple[str, ...] = (
+    "journal_mode",
+    "synchronous",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+    "busy_timeout",
+    "wal_autocheckpoint",
+    "foreign_keys",
+)
+
+PRAGMA_PROFILES: Dict[str, Dict[str, str]] = {
+    # WAL with a full sync on every commit: nothing is lost on power failure
+    "durable": {
+        "journal_mode": "wal",
+        "synchronous": "full",
+        "cache_size": "-16384",
+        "mmap_size": "0",
+        "busy_timeout": "5000",
+    },
+    # WAL with sync at checkpoints only, 64 MiB page cache and 256 MiB mmap
+    "balanced": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "cache_size": "-65536",
+        "mmap_size": "268435456",
+        "temp_store": "memory",
+        "busy_timeout": "5000",
+    },
+    # large imports: no syncs and rare checkpoints. An OS crash or power
+    # failure may corrupt the database, so only use it for data that can be
+    # rebuilt, e.g. an import into a fresh file that is rerun on failure
+    "bulk-load": {
+        "journal_mode": "wal",
+        "synchronous": "off",
+        "cache_size": "-262144",
+        "mmap_size": "1073741824",
+        "temp_store": "memory",
+        "busy_timeout": "5000",
+        "wal_autocheckpoint": "10000",
+    },
+}
+
+_PRAGMA_VALUE = re.compile(r"^-?\w+$")
+
+
+def load_pragmas(section: Mapping[str, str]) -> Dict[str, str]:
     """
-    Custom row factory for SQLite cursor.
+    Builds the pragma set from a settings section.
+
+    The 'profile' option selects one of PRAGMA_PROFILES (default is
+    'balanced'), any option named after a pragma overrides the preset value.
+
+    Args:
+        section (Mapping[str, str]): Settings section, e.g. config["sqllite"].
+
+    Returns:
+        Dict[str, str]: Pragma names and values.
+
+    Raises:
+        ValueError: If the profile or a pragma value is unknown.
+    """
+    profile = section.get("profile", "balanced")
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(
+            f"Unknown SQLite profile '{profile}', "
+            f"expected one of: {', '.join(PRAGMA_PROFILES)}"
+        )
+    pragmas = dict(PRAGMA_PROFILES[profile])
+    for name in PRAGMA_NAMES:
+        if name in section:
+            pragmas[name] = section[name]
+    for name, value in pragmas.items():
+        if name not in PRAGMA_NAMES or not _PRAGMA_VALUE.match(str(value)):
+            raise ValueError(f"Invalid SQLite pragma {name} = {value}")
+    return pragmas
+
+
+def column_names(cursor: sqlite3.Cursor) -> List[str]:
+    """
+    Names of the result columns of the last query.
 
     Args:
         cursor (sqlite3.Cursor): SQLite cursor object.
-        row (Tuple): Row fetched from the database.
 
     Returns:
-        Dict[str, Any]: Dictionary representing the row data.
+        List[str]: Column names in result order.
+    """
+    return [column[0] for column in cursor.description or ()]
+
+
+# Long-lived connections keyed by (thread id, database name)
+_connections: Dict[Tuple[int, str], sqlite3.Connection] = {}
+_connections_lock = threading.Lock()
+_savepoint_ids = count(1)
+
+
+def close_all() -> None:
     """
-    fields = [column[0] for column in cursor.description]
-    return dict(zip(fields, row))
+    Closes all persistent connections opened by SQLite objects in any thread.
+    """
+    with _connections_lock:
+        connections = list(_connections.values())
+        _connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as error:
+            print("Failed to close connection", error)
+
+
+atexit.register(close_all)
 
 
 # pylint: disable=W0511
@@ -29,36 +148,164 @@ class SQLite:
     """
     Utility class for SQLite database operations.
 
+    By default a single long-lived connection per thread and database file is
+    opened on first use and reused by every call (and by every SQLite object
+    pointing at the same file). Connections are closed by close(), close_all()
+    or at interpreter shutdown. With persistent=False a connection is opened
+    and closed for every call. Every statement is committed on its own unless
+    it runs inside a transaction() block.
+
+    Every connection is set up with the pragmas given to the constructor, by
+    default the profile configured in the [sqllite] section of settings.ini.
+
     Attributes:
         db_name (str): The name of the SQLite database.
+        persistent (bool): Whether a long-lived per-thread connection is used.
+        pragmas (Dict[str, str]): Pragmas applied to every new connection.
         conn (sqlite3.Connection): SQLite database connection.
         cur (sqlite3.Cursor): SQLite database cursor.
     """
 
-    def __init__(self, db_name: str) -> None:
+    def __init__(
+        self,
+        db_name: str,
+        persistent: bool = True,
+        pragmas: Mapping[str, Any] | None = None,
+    ) -> None:
         """
         Initializes the SQL utility.
 
         Args:
             db_name (str): The name of the SQLite database.
+            persistent (bool): Reuse one connection per thread instead of \
+                opening a new one for every call. Default is True.
+            pragmas (Mapping[str, Any] | None): Pragmas for new connections. \
+                Default is the profile from settings.ini.
         """
+        if pragmas is None:
+            pragmas = load_pragmas(
+                config["sqllite"] if config.has_section("sqllite") else {}
+            )
         self.db_name: str = db_name
-        self.conn: sqlite3.Connection = None
-        self.cur: sqlite3.Cursor = None
+        self.persistent: bool = persistent
+        self.pragmas: Dict[str, str] = dict(pragmas)
+        self._local = threading.local()
 
-    def __enter__(self) -> "SQLite":
+    @property
+    def conn(self) -> sqlite3.Connection | None:
+        """The connection used by the current thread."""
+        return getattr(self._local, "conn", None)
+
+    @property
+    def cur(self) -> sqlite3.Cursor | None:
+        """The cursor used by the current thread."""
+        return getattr(self._local, "cur", None)
+
+    def connect(self) -> sqlite3.Connection:
         """
-        Enters the context manager.
+        Opens a new connection to the database.
 
         Returns:
-            SQL: The SQL utility object.
+            sqlite3.Connection: The new connection.
         """
-        self.conn = sqlite3.connect(
+        conn = sqlite3.connect(
             self.db_name,
             detect_types=(sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES),
+            # persistent connections are only used by the thread that opened
+            # them, but may be closed from another one at shutdown
+            check_same_thread=not self.persistent,
+            # autocommit unless a transaction is opened explicitly
+            isolation_level=None,
         )
-        self.conn.row_factory = dict_factory
-        self.cur = self.conn.cursor()
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _get_connection(self) -> Tuple[sqlite3.Connection, bool]:
+        """
+        Returns the connection to use for the next call.
+
+        The connection already open for this thread and database (persistent
+        or pinned by a transaction) is reused. Otherwise a persistent one is
+        opened, or a new one in per-call mode.
+
+        Returns:
+            Tuple[sqlite3.Connection, bool]: The connection and whether it is \
+                owned by the caller and must be closed after use.
+        """
+        key = (threading.get_ident(), self.db_name)
+        with _connections_lock:
+            conn = _connections.get(key)
+            if conn is None and self.persistent:
+                conn = _connections[key] = self.connect()
+        if conn is None:
+            return self.connect(), True
+        return conn, False
+
+    def close(self) -> None:
+        """
+        Closes the persistent connection of the current thread, if any.
+        """
+        with _connections_lock:
+            conn = _connections.pop((threading.get_ident(), self.db_name), None)
+        if conn is not None:
+            conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator["SQLite"]:
+        """
+        Groups all statements executed inside the block into one transaction.
+
+        Statements are committed together when the block exits normally and
+        rolled back if it raises. Nested blocks (on this or any other SQLite
+        object for the same database and thread) use savepoints, so an inner
+        failure only undoes the inner block.
+
+        In per-call mode the connection is pinned for the current thread
+        until the outermost block exits.
+
+        Yields:
+            SQLite: The SQL utility object.
+        """
+        key = (threading.get_ident(), self.db_name)
+        conn, owned = self._get_connection()
+        if owned:
+            with _connections_lock:
+                _connections[key] = conn
+        try:
+            if conn.in_transaction:
+                name = f"sp_{next(_savepoint_ids)}"
+                conn.execute(f"SAVEPOINT {name}")
+                try:
+                    yield self
+                except BaseException:
+                    conn.execute(f"ROLLBACK TO {name}")
+                    conn.execute(f"RELEASE {name}")
+                    raise
+                conn.execute(f"RELEASE {name}")
+            else:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield self
+                except BaseException:
+                    conn.rollback()
+                    raise
+                conn.commit()
+        finally:
+            if owned:
+                with _connections_lock:
+                    _connections.pop(key, None)
+                conn.close()
+
+    def __enter__(self) -> "SQLite":
+        """
+        Enters the context manager.
+
+        Returns:
+            SQL: The SQL utility object.
+        """
+        self._local.conn, self._local.owned = self._get_connection()
+        self._local.cur = self._local.conn.cursor()
         return self
 
     def __exit__(self, *args: Any, **kwargs: Any) -> None:
@@ -68,8 +315,7 @@ class SQLite:
         try:
             if self.cur:
                 self.cur.close()
-            if self.conn:
-                self.conn.commit()
+            if self.conn and self._local.owned:
                 self.conn.close()
         except sqlite3.Error as error:
             print("Failed to read data from table", error)
@@ -89,7 +335,8 @@ class SQLite:
         """
         with self as db:
             db.cur.execute(sql, parameters)
-            return db.cur.fetchall()
+            fields = column_names(db.cur)
+            return [dict(zip(fields, row)) for row in db.cur.fetchall()]
 
     def fetchone(self, sql: str, parameters: Tuple[Any, ...] = ()) -> Dict[str, Any]:
         """
@@ -104,7 +351,57 @@ class SQLite:
         """
         with self as db:
             db.cur.execute(sql, parameters)
-            return db.cur.fetchone()
+            row = db.cur.fetchone()
+            return dict(zip(column_names(db.cur), row)) if row else None
+
+    def fetch_rows(
+        self, sql: str, parameters: Tuple[Any, ...] = ()
+    ) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+        """
+        Fetches all rows as plain tuples, without building a dictionary per row.
+
+        Args:
+            sql (str): The SQL query to execute.
+            parameters (Tuple): Parameters to be substituted in the SQL query.
+
+        Returns:
+            Tuple[List[str], List[Tuple]]: Column names and the fetched rows.
+        """
+        with self as db:
+            db.cur.execute(sql, parameters)
+            return column_names(db.cur), db.cur.fetchall()
+
+    def iter_rows(
+        self, sql: str, parameters: Tuple[Any, ...] = (), batch_size: int = 1000
+    ) -> Iterator[Tuple[List[str], List[Tuple[Any, ...]]]]:
+        """
+        Fetches rows lazily, 'batch_size' at a time.
+
+        The query runs on a cursor of its own, so other calls may be made
+        while the iteration is in progress. The cursor (and the connection
+        in per-call mode) is closed when the iteration ends or the generator
+        is closed.
+
+        Args:
+            sql (str): The SQL query to execute.
+            parameters (Tuple): Parameters to be substituted in the SQL query.
+            batch_size (int): Number of rows fetched at a time.
+
+        Yields:
+            Tuple[List[str], List[Tuple]]: Column names and the next \
+                non-empty batch of rows.
+        """
+        conn, owned = self._get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, parameters)
+            columns = column_names(cur)
+            while rows := cur.fetchmany(batch_size):
+                yield columns, rows
+        finally:
+            cur.close()
+            if owned:
+                conn.close()
 
     def execute(self, sql: str, parameters: Tuple[Any, ...] = ()) -> sqlite3.Cursor:
         """
@@ -130,10 +427,68 @@ class SQLite:
                 raise ValueError(msg_error) from err
             return None
 
+    def executemany(
+        self, sql: str, seq_of_parameters: Iterable[Tuple[Any, ...]]
+    ) -> sqlite3.Cursor:
+        """
+        Executes an SQL query once for every parameter tuple.
+
+        Args:
+            sql (str): The SQL query to execute.
+            seq_of_parameters (Iterable[Tuple]): Parameters for each execution.
+
+        Returns:
+            sqlite3.Cursor: SQLite cursor after executing the queries.
+
+        Raises:
+            ValueError: If a UNIQUE constraint fails.
+            sqlite3.IntegrityError: If any other constraint fails.
+        """
+        try:
+            with self as db:
+                return db.cur.executemany(sql, seq_of_parameters)
+        except sqlite3.IntegrityError as err:
+            err_type = "UNIQUE constraint failed"
+            if err_type in str(err):
+                msg_error = str(err).replace(
+                    err_type, "Используйте уникальное значение"
+                )
+                raise ValueError(msg_error) from err
+            raise
+
+
+def to_timestamp(val: datetime) -> int:
+    """
+    Convert a datetime to integer microseconds since EPOCH.
 
-def adapt_datetime_iso(val):
-    """Adapt datetime.datetime to timezone-naive ISO 8601 date."""
-    return val.isoformat()
+    Args:
+        val (datetime): Naive local datetime; aware ones are converted \
+            to local time first.
+
+    Returns:
+        int: Microseconds since EPOCH.
+    """
+    if val.tzinfo is not None:
+        val = val.astimezone().replace(tzinfo=None)
+    return (val - EPOCH) // timedelta(microseconds=1)
+
+
+def from_timestamp(val: int) -> datetime:
+    """
+    Convert integer microseconds since EPOCH to a naive datetime.
+
+    Args:
+        val (int): Microseconds since EPOCH.
+
+    Returns:
+        datetime: The datetime.
+    """
+    return EPOCH + timedelta(microseconds=val)
+
+
+def adapt_datetime(val):
+    """Adapt datetime.datetime to integer microseconds since EPOCH."""
+    return to_timestamp(val)
 
 
 def adapt_period_type(val):
@@ -141,9 +496,36 @@ def adapt_period_type(val):
     return val.value
 
 
+def to_minor_units(val: Any) -> int:
+    """
+    Convert an amount to an integer number of minor units (kopecks).
+
+    Args:
+        val (Any): Decimal, int, float or numeric string amount.
+
+    Returns:
+        int: The amount in minor units, rounded half to even.
+    """
+    amount = val if isinstance(val, Decimal) else Decimal(str(val))
+    return int(amount.scaleb(MONEY_SCALE).to_integral_value(ROUND_HALF_EVEN))
+
+
+def from_minor_units(val: int) -> Decimal:
+    """
+    Convert an integer number of minor units to a Decimal amount.
+
+    Args:
+        val (int): The amount in minor units.
+
+    Returns:
+        Decimal: The amount with MONEY_SCALE decimal places.
+    """
+    return Decimal(val).scaleb(-MONEY_SCALE)
+
+
 def adapt_decimal(val):
-    """Adapt Decimal to str"""
-    return str(val)
+    """Adapt Decimal to integer minor units"""
+    return to_minor_units(val)
 
 
 def convert_datetime(val):
@@ -151,6 +533,11 @@ def convert_datetime(val):
     return datetime.fromisoformat(val.decode())
 
 
+def convert_timestamp(val):
+    """Convert integer microseconds since EPOCH to datetime.datetime object."""
+    return from_timestamp(int(val))
+
+
 def convert_period_type(val):
     """Convert str to PeriodType object."""
     return PeriodType(val.decode())
@@ -161,8 +548,13 @@ def convert_decimal(val):
     return Decimal(val.decode())
 
 
+def convert_money(val):
+    """Convert integer minor units to Decimal."""
+    return from_minor_units(int(val))
+
+
 # pylint: disable=W0108
-sqlite3.register_adapter(datetime, adapt_datetime_iso)
+sqlite3.register_adapter(datetime, adapt_datetime)
 sqlite3.register_adapter(str, lambda val: str(val))
 sqlite3.register_adapter(PeriodType, adapt_period_type)
 sqlite3.register_adapter(Decimal, adapt_decimal)
@@ -170,4 +562,6 @@ sqlite3.register_adapter(Decimal, adapt_decimal)
 sqlite3.register_converter("PeriodType", convert_period_type)
 sqlite3.register_converter("str", lambda val: str(val.decode()))
 sqlite3.register_converter("Decimal", convert_decimal)
+sqlite3.register_converter("Money", convert_money)
 sqlite3.register_converter("datetime", convert_datetime)
+sqlite3.register_converter("Timestamp", convert_timestamp)
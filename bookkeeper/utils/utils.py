@@ -2,7 +2,47 @@
 Utility functions
 """
 
-from typing import Iterable, Iterator, Union
+from dataclasses import fields, is_dataclass
+from itertools import islice
+from typing import Any, Iterable, Iterator, TypeVar, Union
+
+T = TypeVar("T")
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """
+    Split an iterable into lists of at most 'size' items without reading
+    more than one batch ahead.
+
+    Parameters:
+        items (Iterable[T]): Iterable object to split.
+        size (int): Maximum batch size.
+
+    Yields:
+        list[T]: Consecutive batches of items.
+    """
+    if size < 1:
+        raise ValueError("batch size must be at least 1")
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def field_values(obj: Any) -> dict[str, Any]:
+    """
+    Get the field values of an object, also for classes with __slots__
+    which have no __dict__. Unlike dataclasses.asdict, the values are
+    not copied.
+
+    Parameters:
+        obj (Any): A dataclass instance or an object with __dict__.
+
+    Returns:
+        dict[str, Any]: Values by field name, in the field order.
+    """
+    if is_dataclass(obj):
+        return {field.name: getattr(obj, field.name) for field in fields(obj)}
+    return dict(vars(obj))
 
 
 def _get_indent(line: str) -> int:
@@ -34,6 +74,40 @@ def _lines_with_indent(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
         yield _get_indent(line), line.strip()
 
 
+def iter_tree(lines: Iterable[str]) -> Iterator[tuple[str, Union[str, None]]]:
+    """
+    Lazily read the tree structure from text based on indentation, see read_tree.
+    Only the chain of the current item's parents is kept in memory, so lines
+    may come from a file of any size.
+
+    Parameters:
+        lines (Iterable[str]): Iterable object containing lines of text.
+
+    Yields:
+        tuple[str, Union[str, None]]: "Child-parent" pairs in topological order.
+
+    Raises:
+        IndentationError: If an unindent does not match any outer level.
+    """
+    parents: list[tuple[Union[str, None], int]] = []
+    last_indent = -1
+    last_name = None
+    for line, (indent, name) in enumerate(_lines_with_indent(lines)):
+        if indent > last_indent:
+            parents.append((last_name, last_indent))
+        elif indent < last_indent:
+            while indent < last_indent:
+                _, last_indent = parents.pop()
+            if indent != last_indent:
+                raise IndentationError(
+                    f"unindent does not match any outer indentation "
+                    f"level in line {line}:\n"
+                )
+        yield name, parents[-1][0]
+        last_name = name
+        last_indent = indent
+
+
 def read_tree(lines: Iterable[str]) -> list[tuple[str, Union[str, None]]]:
     """
     Read the tree structure from text based on indentation. Return a list of
@@ -58,22 +132,4 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, Union[str, None]]]:
     Returns:
         list[tuple[str, Union[str, None]]]: List of "child-parent" pairs.
     """
-    parents: list[tuple[Union[str, None], int]] = []
-    last_indent = -1
-    last_name = None
-    result: list[tuple[str, Union[str, None]]] = []
-    for line, (indent, name) in enumerate(_lines_with_indent(lines)):
-        if indent > last_indent:
-            parents.append((last_name, last_indent))
-        elif indent < last_indent:
-            while indent < last_indent:
-                _, last_indent = parents.pop()
-            if indent != last_indent:
-                raise IndentationError(
-                    f"unindent does not match any outer indentation "
-                    f"level in line {line}:\n"
-                )
-        result.append((name, parents[-1][0]))
-        last_name = name
-        last_indent = indent
-    return result
+    return list(iter_tree(lines))
@@ -12,6 +12,7 @@ from PySide6.QtGui import Qt
 from PySide6.QtGui import QAction
 from bookkeeper.models.category import Category
 from bookkeeper.utils.error_handling import handle_error
+from bookkeeper.utils.utils import field_values
 
 
 class CategoryWidget(QWidget):
@@ -179,7 +180,7 @@ class CategoryWidget(QWidget):
 
         for category in categories:
             category_item = QTreeWidgetItem([category.name])
-            category_item.setData(0, Qt.UserRole, {**vars(category)})
+            category_item.setData(0, Qt.UserRole, field_values(category))
 
             if category.parent is None:
                 self.tree_widget.addTopLevelItem(category_item)
@@ -8,6 +8,7 @@ from bookkeeper.views.expense.expense_view import ExpenseWidget
 from bookkeeper.controllers.category_controller import CategoryController
 from bookkeeper.controllers.expense_controller import ExpenseController
 from bookkeeper.controllers.budget_controller import BudgetController
+from bookkeeper.services.category_service import CategoryService
 
 
 # pylint: disable=too-few-public-methods
@@ -40,7 +41,10 @@ class MainWindow(QMainWindow):
         # Set tab widget as central widget of the main window
         self.setCentralWidget(self.tab_widget)
 
-        # Connect controllers to views
-        CategoryController(view=self.category_widget)
-        ExpenseController(view=self.new_expense_widget)
+        # Connect controllers to views, sharing the cached category tree
+        category_service = CategoryService()
+        CategoryController(view=self.category_widget, category_service=category_service)
+        ExpenseController(
+            view=self.new_expense_widget, category_service=category_service
+        )
         BudgetController(view=self.budget_widget)
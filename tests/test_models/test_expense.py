@@ -3,6 +3,9 @@
 """
 
 import pytest
+import timeit
+import tracemalloc
+from dataclasses import dataclass, field
 from datetime import datetime
 from decimal import Decimal
 from bookkeeper.models.expense import Expense
@@ -67,3 +70,49 @@ def test_eq(sample_expense):
     sample_expense.expense_date = date
     sample_expense.added_date = date
     assert expense == sample_expense
+
+
+@dataclass
+class DictExpense:
+    """
+    Expense without __slots__, for comparison
+    """
+
+    amount: Decimal
+    category: int
+    expense_date: datetime = field(default_factory=datetime.now)
+    added_date: datetime = field(default_factory=datetime.now)
+    comment: str = ""
+    pk: int = 0
+
+
+def test_slots(sample_expense):
+    assert not hasattr(sample_expense, "__dict__")
+    with pytest.raises(AttributeError):
+        sample_expense.unknown = 1
+
+
+def measure(cls, count=10000):
+    """
+    Memory allocated by 'count' instances and the time to create them
+    """
+    date = datetime(2024, 1, 1)
+    amount = Decimal("1.50")
+
+    def create():
+        return [cls(amount, 1, date, date, "", pk) for pk in range(count)]
+
+    tracemalloc.start()
+    objs = create()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return size, min(timeit.repeat(create, number=1, repeat=3))
+
+
+def test_slots_memory_and_speed(record_property):
+    slots_size, slots_time = measure(Expense)
+    dict_size, dict_time = measure(DictExpense)
+    record_property("memory_ratio", round(dict_size / slots_size, 2))
+    record_property("construction_speedup", round(dict_time / slots_time, 2))
+    assert slots_size < dict_size * 0.85
@@ -0,0 +1,198 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from bookkeeper.models.budget import PeriodType
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.expense_archive import ExpenseArchive
+from bookkeeper.repository.expense_repository import ExpenseRepository
+from bookkeeper.repository.partitioned_expense_repository import (
+    PartitionedExpenseRepository,
+)
+from bookkeeper.repository.query import Bucket, Condition, aggregate_objects
+from bookkeeper.repository.sqlite_repository import config
+from bookkeeper.scripts.archive_db import archive_database
+
+EXPENSES = [
+    (Decimal("10.50"), 1, datetime(2020, 1, 15)),
+    (Decimal("20"), 1, datetime(2020, 1, 31, 23)),
+    (Decimal("5"), 2, datetime(2020, 2, 1)),
+    (Decimal("7.25"), 1, datetime(2020, 3, 10)),
+    (Decimal("100"), 1, datetime(2020, 4, 2)),
+]
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = ExpenseRepository(str(tmp_path / "hot.db"))
+    repo.add_many(Expense(*expense, comment="x") for expense in EXPENSES)
+    return repo
+
+
+def pragma(repo, name):
+    # the long-lived connection of the repository caches the file header
+    conn = repo.db.connect()
+    try:
+        return conn.execute(f"PRAGMA {name}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def archive(repo):
+    return ExpenseArchive(repo)
+
+
+def test_default_archive_file(archive, tmp_path):
+    assert archive.archive_file == str(tmp_path / "hot_archive.db")
+    assert os.path.exists(archive.archive_file)
+
+
+def test_archive(repo, archive):
+    pks = [expense.pk for expense in repo.get_all()]
+    assert archive.archive(datetime(2020, 3, 20)) == 3
+    assert [expense.pk for expense in repo.get_all()] == pks[3:]
+    rows = archive.db.fetchall("SELECT pk, amount FROM expense ORDER BY pk")
+    assert [row["pk"] for row in rows] == pks[:3]
+    assert rows[0]["amount"] == Decimal("10.50")
+    summary = repo.db.fetchall(
+        "SELECT month, category, total, count FROM expense_summary ORDER BY month"
+    )
+    assert summary == [
+        {
+            "month": datetime(2020, 1, 1),
+            "category": 1,
+            "total": Decimal("30.50"),
+            "count": 2,
+        },
+        {
+            "month": datetime(2020, 2, 1),
+            "category": 2,
+            "total": Decimal("5"),
+            "count": 1,
+        },
+    ]
+    assert archive.archive(datetime(2020, 3, 20)) == 0
+    new = Expense(Decimal("1"), 1, datetime.now())
+    assert repo.add(new) == pks[-1] + 1
+
+
+def test_archive_adds_to_summary(repo, archive):
+    archive.archive(datetime(2020, 2, 1))
+    repo.add(Expense(Decimal("4.50"), 1, datetime(2020, 1, 2), comment="late"))
+    archive.archive(datetime(2020, 2, 1))
+    row = repo.db.fetchone("SELECT total, count FROM expense_summary")
+    assert row == {"total": Decimal("35"), "count": 3}
+
+
+@pytest.mark.parametrize(
+    "start, end, expected",
+    [
+        (datetime(2020, 1, 1), datetime(2020, 12, 31), Decimal("42.75")),
+        (datetime(2020, 1, 20), datetime(2020, 2, 29, 23, 59), Decimal("25")),
+        (datetime(2020, 1, 1), datetime(2020, 1, 31), Decimal("10.50")),
+        (datetime(2020, 1, 16), datetime(2020, 2, 1), Decimal("25")),
+        (datetime(2021, 1, 1), datetime(2021, 12, 31), Decimal("0")),
+    ],
+)
+def test_get_total(repo, archive, start, end, expected):
+    archive.archive(datetime(2020, 4, 1))
+    assert archive.get_total(start, end) == expected
+
+
+@pytest.mark.parametrize(
+    "group_by, where",
+    [
+        ([], None),
+        (["category"], None),
+        (
+            ["category", Bucket("expense_date", PeriodType.MONTH)],
+            Condition("expense_date", ">=", datetime(2020, 1, 20)),
+        ),
+        (
+            ["category"],
+            Condition("category", "=", 1)
+            & Condition("expense_date", "<", datetime(2020, 3, 1)),
+        ),
+        ([Bucket("expense_date", PeriodType.DAY)], None),
+        (["category"], Condition("expense_date", ">", datetime(2020, 2, 1))),
+        (["category"], Condition("comment", "=", "x")),
+    ],
+)
+def test_aggregate(archive, group_by, where):
+    archive.archive(datetime(2020, 4, 1))
+    archived = [Expense(*expense, comment="x") for expense in EXPENSES[:4]]
+    expected = aggregate_objects(
+        [e for e in archived if where is None or where.matches(e)], "amount", group_by
+    )
+    result = archive.aggregate(group_by, where)
+    assert [(a.group, a.total, a.count) for a in result] == [
+        (a.group, a.total, a.count) for a in expected
+    ]
+
+
+def test_aggregate_uses_summaries(archive):
+    archive.archive(datetime(2020, 4, 1))
+    archive.db.execute("DELETE FROM expense")
+    where = Condition("expense_date", ">=", datetime(2020, 1, 1))
+    result = archive.aggregate(["category"], where)
+    assert [(a.group, a.total, a.count) for a in result] == [
+        ((1,), Decimal("37.75"), 3),
+        ((2,), Decimal("5"), 1),
+    ]
+    assert result[0].minimum is None
+    where &= Condition("expense_date", "<=", datetime(2020, 2, 10))
+    result = archive.aggregate(["category"], where)
+    assert [(a.group, a.total) for a in result] == [((1,), Decimal("30.50"))]
+
+
+def test_archive_partitions(tmp_path):
+    repo = PartitionedExpenseRepository(str(tmp_path / "hot.db"), months=1)
+    repo.add_many(Expense(*expense, comment="x") for expense in EXPENSES)
+    archive = ExpenseArchive(repo)
+    assert archive.archive(datetime(2020, 2, 1)) == 2
+    assert [p.name for p in repo.partitions()] == [
+        "expense_2020_02",
+        "expense_2020_03",
+        "expense_2020_04",
+    ]
+    assert len(repo.get_all()) == 3
+
+
+def test_compact(repo, archive):
+    repo.add_many(
+        Expense(Decimal("1"), 1, datetime(2019, 1, 1), comment="x" * 1000)
+        for _ in range(500)
+    )
+    archive.archive(datetime(2020, 1, 1))
+    archive.compact()
+    assert pragma(repo, "auto_vacuum") == 2
+    assert repo.db.fetchone("SELECT COUNT(*) AS count FROM sqlite_stat1")["count"]
+    repo.add_many(
+        Expense(Decimal("1"), 1, datetime(2019, 1, 1), comment="x" * 1000)
+        for _ in range(500)
+    )
+    archive.archive(datetime(2020, 1, 1))
+    assert pragma(repo, "freelist_count") > 0
+    assert archive.compact() > 0
+    assert pragma(repo, "freelist_count") == 0
+    assert archive.compact() == 0
+
+
+def test_archive_database_uses_partitions(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "hot.db")
+    ExpenseRepository(db_file).add_many(
+        Expense(*expense, comment="x") for expense in EXPENSES
+    )
+    monkeypatch.setitem(config["sqllite"], "partition_months", "1")
+    assert archive_database(db_file, before=datetime(2020, 2, 1)) == 2
+    repo = PartitionedExpenseRepository(db_file, months=1)
+    assert [p.name for p in repo.partitions()] == [
+        "expense_2020_02",
+        "expense_2020_03",
+        "expense_2020_04",
+    ]
+    assert repo.db.fetchone("SELECT COUNT(*) AS count FROM expense")["count"] == 0
+    assert pragma(repo, "auto_vacuum") == 2
+    assert archive_database(db_file, before=datetime(2020, 4, 1)) == 2
+    assert [p.name for p in repo.partitions()] == ["expense_2020_04"]
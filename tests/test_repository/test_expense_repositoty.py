@@ -1,4 +1,5 @@
 from datetime import datetime
+from decimal import Decimal
 import pytest
 from bookkeeper.repository.expense_repository import ExpenseRepository
 from bookkeeper.models.expense import Expense
@@ -33,3 +34,22 @@ def test_get_total_expense_for_period_empty(repo):
 
     total_expense = repo.get_total_expense_for_period(start_date, end_date)
     assert total_expense == 0
+
+
+def test_amount_stored_in_minor_units(repo):
+    """
+    Test case to check that amounts are stored exactly as integer minor units.
+    """
+    expense = Expense(Decimal("0.10"), 0, datetime(1900, 1, 1))
+    repo.add(expense)
+    row = repo.db.fetchone(
+        "SELECT amount + 0 AS raw FROM expense WHERE pk = ?", (expense.pk,)
+    )
+    assert row["raw"] == 10
+    assert repo.get(expense.pk).amount == Decimal("0.10")
+    for _ in range(2):
+        repo.add(Expense(Decimal("0.10"), 0, datetime(1900, 1, 1)))
+    total = repo.get_total_expense_for_period(
+        datetime(1900, 1, 1), datetime(1900, 1, 2)
+    )
+    assert total == Decimal("0.30")
@@ -1,5 +1,10 @@
 import pytest
+from datetime import datetime
+from decimal import Decimal
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Condition, Query
 
 
 @pytest.fixture
@@ -68,3 +73,181 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({"name": "0"}) == [objects[0]]
     assert repo.get_all({"test": "test"}) == objects
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(o for o in objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+
+
+def test_update_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    repo.add_many(objects)
+    new_objects = []
+    for o in objects:
+        new = custom_class()
+        new.pk = o.pk
+        new_objects.append(new)
+    repo.update_many(new_objects)
+    assert repo.get_all() == new_objects
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[1:])
+    assert repo.get_all() == objects[:1]
+
+
+def test_iter_all(repo, custom_class):
+    objs = [custom_class() for _ in range(5)]
+    for i, obj in enumerate(objs):
+        obj.age = i % 2
+    repo.add_many(objs)
+    assert list(repo.iter_all(where={"age": 1})) == [objs[1], objs[3]]
+    assert list(repo.iter_all(order_by=["-age", "pk"])) == [
+        objs[1],
+        objs[3],
+        objs[0],
+        objs[2],
+        objs[4],
+    ]
+
+
+def test_page(repo, custom_class):
+    objs = [custom_class() for _ in range(5)]
+    for i, obj in enumerate(objs):
+        obj.age = 5 - i // 2
+    repo.add_many(objs)
+    assert repo.page(2) == objs[:2]
+    assert repo.page(2, after_pk=objs[1].pk) == objs[2:4]
+    by_age = sorted(objs, key=lambda obj: (obj.age, obj.pk))
+    assert repo.page(2, by_age[1].pk, by_age[1].age, key="age") == by_age[2:4]
+
+
+def test_find(repo, custom_class):
+    objs = [custom_class() for _ in range(5)]
+    for i, obj in enumerate(objs):
+        obj.age = i
+    repo.add_many(objs)
+    query = Query(Condition("age", ">=", 2), order_by="-age", limit=2)
+    assert repo.find(query) == [objs[4], objs[3]]
+    assert repo.find_rows(Query(Condition("age", "=", 1), columns=["age"])) == [(1,)]
+
+
+@pytest.fixture
+def indexed():
+    return MemoryRepository(indexes=["category"], sorted_indexes=["age"])
+
+
+def make_objects(custom_class, count):
+    objs = [custom_class() for _ in range(count)]
+    for i, obj in enumerate(objs):
+        obj.category = i % 3
+        obj.age = None if i % 7 == 0 else (i * 5) % 11
+    return objs
+
+
+@pytest.mark.parametrize(
+    "where",
+    [
+        {"category": 1},
+        Condition("category", "in", [0, 2]),
+        Condition("age", ">=", 4),
+        Condition("age", "<", 4) & Condition("category", "=", 2),
+        Condition("age", "=", 5) | Condition("category", "=", 0),
+        Condition("age", ">", 3) & Condition("age", "<=", 8),
+        Condition("age", "=", None),
+        Condition("age", "!=", 5),
+    ],
+)
+def test_indexes_match_scan(repo, indexed, custom_class, where):
+    repo.add_many(make_objects(custom_class, 30))
+    indexed.add_many(make_objects(custom_class, 30))
+    expected = [obj.pk for obj in repo.get_all(where)]
+    assert [obj.pk for obj in indexed.get_all(where)] == expected
+    query = Query(where, order_by="-pk", limit=3)
+    assert [obj.pk for obj in indexed.find(query)] == expected[::-1][:3]
+
+
+def test_indexes_are_maintained(indexed, custom_class):
+    objs = make_objects(custom_class, 10)
+    indexed.add_many(objs)
+    objs[1].category = 2
+    objs[1].age = 100
+    indexed.update(objs[1])
+    indexed.delete(objs[2].pk)
+    indexed.delete_many([objs[5].pk])
+    assert indexed.get_all({"category": 2}) == [objs[1], objs[8]]
+    assert indexed.get_all(Condition("age", ">", 50)) == [objs[1]]
+    assert indexed.get_all(Condition("age", "=", 10)) == []
+    obj = custom_class()
+    obj.category, obj.age = 2, 101
+    indexed.add(obj)
+    assert indexed.get_all(Condition("age", ">=", 100)) == [objs[1], obj]
+    more = make_objects(custom_class, 4)
+    indexed.add_many(more)
+    assert indexed.get_all(Condition("age", "<=", 5)) == [
+        o for o in indexed.get_all() if o.age is not None and o.age <= 5
+    ]
+
+
+def test_indexes_skip_scan(indexed, custom_class, monkeypatch):
+    indexed.add_many(make_objects(custom_class, 30))
+    checked = []
+    matches = Condition.matches
+
+    def spy(self, obj):
+        checked.append(obj)
+        return matches(self, obj)
+
+    monkeypatch.setattr(Condition, "matches", spy)
+    assert len(indexed.get_all({"category": 1})) == 10
+    assert len(checked) == 10
+
+
+def test_field_indexed_twice():
+    with pytest.raises(ValueError):
+        MemoryRepository(indexes=["age"], sorted_indexes=["age"])
+
+
+def test_save_and_load(tmp_path):
+    repo = MemoryRepository(indexes=["category"], sorted_indexes=["expense_date"])
+    expenses = [
+        Expense(Decimal(i), i % 3, datetime(2024, 1, i + 1), comment=str(i))
+        for i in range(10)
+    ]
+    repo.add_many(expenses)
+    repo.delete(expenses[9].pk)
+    path = tmp_path / "expenses.snapshot"
+    repo.save(str(path))
+
+    loaded = MemoryRepository.load(str(path))
+    assert loaded.get_all() == expenses[:9]
+    where = Condition("category", "=", 1) & Condition(
+        "expense_date", ">", datetime(2024, 1, 3)
+    )
+    assert loaded.get_all(where) == [expenses[4], expenses[7]]
+    new = Expense(Decimal(1), 1, datetime(2024, 2, 1))
+    assert loaded.add(new) == 11
+    assert loaded.get_all(where)[-1] is new
+
+
+def test_save_and_load_mixed_objects(tmp_path):
+    repo = MemoryRepository()
+    repo.add_many([Category("food"), Expense(Decimal(1), 1)])
+    path = str(tmp_path / "mixed.snapshot")
+    repo.save(path)
+    assert MemoryRepository.load(path).get_all() == repo.get_all()
+    empty = str(tmp_path / "empty.snapshot")
+    MemoryRepository().save(empty)
+    assert MemoryRepository.load(empty).get_all() == []
+
+
+def test_load_not_a_snapshot(tmp_path):
+    path = tmp_path / "other.pickle"
+    path.write_bytes(b"\x80\x05K\x01.")
+    with pytest.raises(ValueError):
+        MemoryRepository.load(str(path))
@@ -0,0 +1,160 @@
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from bookkeeper.repository.migrations import migrate, MIGRATIONS, SCHEMA_VERSION
+from bookkeeper.repository.expense_repository import ExpenseRepository
+from bookkeeper.repository.budget_repository import BudgetRepository
+from bookkeeper.models.expense import Expense
+from bookkeeper.utils.sqlite_utils import close_all
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """Database in the format used before amounts were stored in minor units."""
+    db_file = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_file)
+    conn.executescript(
+        """
+        CREATE TABLE category (name str, parent int, pk INTEGER PRIMARY KEY);
+        CREATE TABLE expense (
+            "amount" Decimal NOT NULL, "category" int NOT NULL,
+            "expense_date" datetime NOT NULL,
+            "added_date" datetime NOT NULL DEFAULT 'DATE(''now'')',
+            "comment" str, "pk" INTEGER PRIMARY KEY
+        );
+        CREATE TABLE budget (
+            limit_amount Decimal, period_type PeriodType, expenses Decimal,
+            pk INTEGER PRIMARY KEY
+        );
+        INSERT INTO expense VALUES
+            ('100.50', 1, '2024-04-03 01:48:50', '2024-04-03 01:48:50', 'a', 1),
+            ('0.29', 1, '2024-04-03 01:48:50', '2024-04-03 01:48:50', 'b', 2);
+        INSERT INTO budget VALUES ('1000', 'День', '0', 1);
+        """
+    )
+    conn.commit()
+    conn.close()
+    yield db_file
+    close_all()
+
+
+def test_upgrade_money_columns(legacy_db):
+    migrate(legacy_db)
+    conn = sqlite3.connect(legacy_db)
+    assert conn.execute("SELECT amount FROM expense ORDER BY pk").fetchall() == [
+        (10050,),
+        (29,),
+    ]
+    assert conn.execute("SELECT typeof(amount) FROM expense").fetchone() == ("integer",)
+    assert conn.execute("SELECT limit_amount, expenses FROM budget").fetchone() == (
+        100000,
+        0,
+    )
+    conn.close()
+    expense = ExpenseRepository(legacy_db).get_all()[0]
+    assert expense.amount == Decimal("100.50")
+    assert expense.expense_date == datetime(2024, 4, 3, 1, 48, 50)
+    assert BudgetRepository(legacy_db).get(1).limit_amount == Decimal("1000")
+
+
+def test_upgrade_is_idempotent(legacy_db):
+    migrate(legacy_db)
+    conn = sqlite3.connect(legacy_db)
+    conn.execute("PRAGMA user_version = 0")
+    conn.close()
+    migrate(legacy_db)
+    conn = sqlite3.connect(legacy_db)
+    assert conn.execute("SELECT SUM(amount) FROM expense").fetchone() == (10079,)
+    conn.close()
+
+
+def test_upgrade_dates(legacy_db):
+    migrate(legacy_db)
+    conn = sqlite3.connect(legacy_db)
+    assert conn.execute(
+        "SELECT typeof(expense_date), typeof(added_date) FROM expense"
+    ).fetchone() == ("integer", "integer")
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT SUM(amount) FROM expense "
+        "WHERE expense_date BETWEEN 1 AND 2"
+    ).fetchall()
+    assert "expense_expense_date_idx" in str(plan)
+    conn.close()
+
+
+def test_upgrade_added_date_default(legacy_db):
+    migrate(legacy_db)
+    conn = sqlite3.connect(legacy_db)
+    conn.execute(
+        "INSERT INTO expense (amount, category, expense_date) VALUES (100, 1, 0)"
+    )
+    conn.commit()
+    conn.close()
+    expense = ExpenseRepository(legacy_db).get(3)
+    assert abs(expense.added_date - datetime.now()).total_seconds() < 60
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    yield str(tmp_path / "new.db")
+    close_all()
+
+
+def test_migrate_new_database(db_file):
+    assert migrate(db_file) == SCHEMA_VERSION
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("PRAGMA user_version").fetchone() == (SCHEMA_VERSION,)
+    indexes = {
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    }
+    assert {
+        "expense_category_idx",
+        "expense_expense_date_idx",
+        "category_parent_idx",
+    } <= indexes
+    conn.close()
+
+
+def test_repository_migrates_database(db_file):
+    repo = ExpenseRepository(db_file)
+    repo.add(Expense(Decimal("1.5"), 1, datetime(2024, 1, 1)))
+    assert repo.get_total_expense_for_period(
+        datetime(2024, 1, 1), datetime(2024, 1, 2)
+    ) == Decimal("1.5")
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("PRAGMA user_version").fetchone() == (SCHEMA_VERSION,)
+    conn.close()
+
+
+def test_newer_database_is_rejected(db_file):
+    conn = sqlite3.connect(db_file)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    conn.close()
+    with pytest.raises(RuntimeError):
+        migrate(db_file)
+
+
+def test_failed_step_is_rolled_back(legacy_db):
+    conn = sqlite3.connect(legacy_db)
+    conn.execute("INSERT INTO expense VALUES (1, 1, 'not a date', 'x', '', 3)")
+    conn.commit()
+    conn.close()
+    with pytest.raises(sqlite3.Error):
+        migrate(legacy_db)
+    conn = sqlite3.connect(legacy_db)
+    assert conn.execute("PRAGMA user_version").fetchone() == (1,)
+    assert conn.execute("SELECT COUNT(*) FROM expense").fetchone() == (3,)
+    conn.close()
+
+
+def test_first_step_schema_is_frozen(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "step1.db"))
+    MIGRATIONS[0](conn)
+    tables = {
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    conn.close()
+    assert tables - {"sqlite_sequence"} == {"category", "expense", "budget"}
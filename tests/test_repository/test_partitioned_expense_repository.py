@@ -0,0 +1,190 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytest
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.expense_repository import ExpenseRepository
+from bookkeeper.repository.partitioned_expense_repository import (
+    Partition,
+    PartitionedExpenseRepository,
+    create_expense_repository,
+)
+from bookkeeper.repository.query import Condition
+from bookkeeper.repository.sqlite_repository import config
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / "partitioned.db")
+
+
+@pytest.fixture
+def repo(db_file):
+    return PartitionedExpenseRepository(db_file)
+
+
+def expense(amount, day, **kwargs):
+    kwargs.setdefault("comment", "lunch")
+    return Expense(Decimal(amount), 1, day, **kwargs)
+
+
+def tables(repo):
+    return {partition.name for partition in repo.partitions()}
+
+
+def test_months_must_divide_year(db_file):
+    with pytest.raises(ValueError):
+        PartitionedExpenseRepository(db_file, months=5)
+
+
+def test_routing_by_date(repo):
+    recent = expense("1", datetime.now())
+    old = expense("2", datetime(2020, 5, 1))
+    older = expense("3", datetime(2019, 12, 31))
+    repo.add_many([recent, old, older])
+    assert tables(repo) == {"expense_2019", "expense_2020"}
+    assert repo.partitions()[1] == Partition(
+        "expense_2020", datetime(2020, 1, 1), datetime(2021, 1, 1)
+    )
+    row = repo.db.fetchone("SELECT COUNT(*) AS count FROM expense")
+    assert row["count"] == 1
+    assert repo.get(old.pk) == old
+    assert len({recent.pk, old.pk, older.pk}) == 3
+    assert sorted(e.pk for e in repo.get_all()) == [recent.pk, old.pk, older.pk]
+
+
+def test_monthly_partitions(db_file):
+    repo = PartitionedExpenseRepository(db_file, months=3)
+    repo.add(expense("1", datetime(2020, 5, 1)))
+    assert repo.partitions() == [
+        Partition("expense_2020_04", datetime(2020, 4, 1), datetime(2020, 7, 1))
+    ]
+
+
+def test_update_moves_between_partitions(repo):
+    obj = expense("1", datetime(2020, 5, 1), comment="old")
+    repo.add(obj)
+    obj.expense_date = datetime(2018, 2, 1)
+    obj.comment = "older"
+    repo.update(obj)
+    assert repo.get(obj.pk) == obj
+    older = repo.get_all(Condition("expense_date", "<", datetime(2019, 1, 1)))
+    assert [found.pk for found in older] == [obj.pk]
+    assert tables(repo) == {"expense_2018", "expense_2020"}
+    obj.expense_date = datetime.now()
+    repo.update(obj)
+    row = repo.db.fetchone("SELECT COUNT(*) AS count FROM expense")
+    assert row["count"] == 1
+
+
+def test_delete(repo):
+    expenses = [expense("1", datetime(2020 - i, 1, 1)) for i in range(3)]
+    repo.add_many(expenses)
+    repo.delete(expenses[0].pk)
+    assert repo.get(expenses[0].pk) is None
+    with pytest.raises(KeyError):
+        repo.delete(expenses[0].pk)
+    with pytest.raises(KeyError):
+        repo.delete_many([expenses[1].pk, expenses[0].pk])
+    assert len(repo.get_all()) == 2
+    repo.delete_many([expenses[1].pk, expenses[0].pk], missing_ok=True)
+    assert [obj.pk for obj in repo.get_all()] == [expenses[2].pk]
+
+
+def test_pruning(repo):
+    repo.add_many([expense("1", datetime(y, 6, 1)) for y in (2018, 2020)])
+    source = repo._source(
+        Condition("expense_date", ">=", datetime(2020, 1, 1))
+        & Condition("expense_date", "<", datetime(2020, 6, 30))
+    )
+    assert '"expense_2020"' in source
+    assert '"expense_2018"' not in source
+    assert repo._source({"category": 1}).count("UNION ALL") == 2
+    assert repo._source(Condition("expense_date", ">", datetime.now())) == "expense"
+
+
+def test_total_expense_for_period(repo):
+    repo.add_many(
+        [
+            expense("1.50", datetime(2019, 12, 31)),
+            expense("2", datetime(2020, 1, 1)),
+            expense("3", datetime(2020, 1, 2)),
+        ]
+    )
+    total = repo.get_total_expense_for_period(
+        datetime(2019, 12, 1), datetime(2020, 1, 1, 23)
+    )
+    assert total == Decimal("3.50")
+
+
+def test_rotate(db_file):
+    plain = ExpenseRepository(db_file)
+    old = expense("1", datetime(2020, 5, 1))
+    recent = expense("2", datetime.now())
+    plain.add_many([old, recent])
+    assert PartitionedExpenseRepository(db_file).partitions() == []
+    repo = PartitionedExpenseRepository(db_file, rotate=True)
+    assert tables(repo) == {"expense_2020"}
+    assert repo.rotate() == 0
+    assert repo.get(old.pk) == old
+    assert plain.get(old.pk) is None
+    assert repo.add(expense("3", datetime(2021, 1, 1))) == recent.pk + 1
+
+
+def test_partition_clipped_to_hot_window(repo):
+    day = repo.hot_start - timedelta(days=1)
+    repo.add(expense("1", day))
+    partition = repo.partitions()[0]
+    assert partition.contains(day)
+    assert partition.end == repo.hot_start
+
+
+def test_upsert_many(repo):
+    obj = expense("1", datetime(2020, 5, 1), pk=10)
+    repo.upsert_many([obj])
+    assert repo.get(10) == obj
+    assert repo.add(expense("2", datetime.now())) == 11
+
+
+def test_allocate_above_all_tables(repo):
+    old = expense("1", datetime(2020, 5, 1), pk=50)
+    repo.upsert_many([old])
+    repo.db.execute("UPDATE sqlite_sequence SET seq = 0 WHERE name = 'expense'")
+    assert repo.add(expense("2", datetime.now())) == 51
+
+
+def test_batched_writes(repo):
+    objs = [expense(str(i), datetime(2018 + i % 3, 1, 1), pk=i + 1) for i in range(7)]
+    repo.upsert_many(objs, batch_size=3)
+    assert sorted(e.pk for e in repo.get_all()) == list(range(1, 8))
+    for obj in objs:
+        obj.expense_date = datetime(2021, 2, 1)
+    objs.append(expense("9", datetime(2019, 3, 1), pk=99))
+    repo.update_many(objs, batch_size=2)
+    assert repo.get(99) is None
+    assert tables(repo) >= {"expense_2021"}
+    found = repo.get_all(Condition("expense_date", "=", datetime(2021, 2, 1)))
+    assert len(found) == 7
+    for partition in ("expense_2018", "expense_2019", "expense_2020"):
+        row = repo.db.fetchone(f"SELECT COUNT(*) AS count FROM {partition}")
+        assert row["count"] == 0
+
+
+def test_create_expense_repository(db_file, monkeypatch):
+    monkeypatch.delitem(config["sqllite"], "partition_months", raising=False)
+    assert type(create_expense_repository(db_file)) is ExpenseRepository
+    monkeypatch.setitem(config["sqllite"], "partition_months", "3")
+    repo = create_expense_repository(db_file)
+    assert isinstance(repo, PartitionedExpenseRepository)
+    assert repo.months == 3
+
+
+def test_locate_over_variable_limit(repo):
+    objs = [expense("1", datetime(2020, 1, 1), pk=i + 1) for i in range(1500)]
+    repo.upsert_many(objs, batch_size=1500)
+    for obj in objs:
+        obj.comment = "dinner"
+    repo.update_many(objs, batch_size=1500)
+    row = repo.db.fetchone(
+        "SELECT COUNT(*) AS count FROM expense_2020 WHERE comment = ?", ("dinner",)
+    )
+    assert row["count"] == 1500
@@ -0,0 +1,97 @@
+from dataclasses import dataclass
+from datetime import datetime
+import pytest
+from bookkeeper.models.budget import PeriodType
+from bookkeeper.repository.query import Aggregate, And, Bucket, Condition, Or, Query
+from bookkeeper.repository.query import Predicate
+from bookkeeper.repository.query import aggregate_objects, as_predicate, parse_order_by
+
+
+@dataclass
+class Item:
+    name: str | None
+    age: int | None
+    pk: int = 0
+
+
+def test_condition_operators():
+    item = Item("a", 5)
+    assert Condition("age", "=", 5).matches(item)
+    assert Condition("age", "!=", 4).matches(item)
+    assert Condition("age", "<", 6).matches(item)
+    assert Condition("age", "<=", 5).matches(item)
+    assert not Condition("age", ">", 5).matches(item)
+    assert Condition("age", ">=", 5).matches(item)
+    assert Condition("age", "in", [4, 5]).matches(item)
+    assert Condition("age", "not in", iter([4, 6])).matches(item)
+
+
+def test_condition_unknown_operator():
+    with pytest.raises(ValueError):
+        Condition("age", "~", 5)
+
+
+def test_condition_null():
+    item = Item(None, 5)
+    assert Condition("name", "=", None).matches(item)
+    assert not Condition("age", "=", None).matches(item)
+    assert Condition("age", "!=", None).matches(item)
+    assert not Condition("name", "!=", "a").matches(item)
+    assert not Condition("name", ">", "a").matches(item)
+
+
+def test_and_or():
+    item = Item("a", 5)
+    yes, no = Condition("age", "=", 5), Condition("name", "=", "b")
+    assert (yes | no).matches(item)
+    assert not (yes & no).matches(item)
+    assert And().matches(item)
+    assert not Or().matches(item)
+    assert yes & no == And(yes, no)
+    assert not isinstance(yes | no, And)
+
+
+def test_predicate_is_abstract():
+    with pytest.raises(TypeError):
+        Predicate()
+
+
+def test_as_predicate():
+    assert as_predicate(None) is None
+    assert as_predicate({}) is None
+    assert as_predicate({"age": 5, "name": "a"}) == And(
+        Condition("age", "=", 5), Condition("name", "=", "a")
+    )
+
+
+def test_parse_order_by():
+    assert parse_order_by(None) == []
+    assert parse_order_by("-age") == [("age", True)]
+    assert parse_order_by(["name", "-age"]) == [("name", False), ("age", True)]
+
+
+def test_query_apply():
+    items = [Item(str(i % 3), i) for i in range(6)] + [Item(None, 9)]
+    query = Query(
+        Condition("age", ">", 0), order_by=["name", "-age"], limit=3, offset=1
+    )
+    assert query.apply(items) == [items[3], items[4], items[1]]
+    assert Query().apply(items) == items
+
+
+def test_bucket_start():
+    day = datetime(2024, 2, 29, 13, 30)
+    assert Bucket("d", PeriodType.DAY).start(day) == datetime(2024, 2, 29)
+    assert Bucket("d", PeriodType.WEEK).start(day) == datetime(2024, 2, 26)
+    assert Bucket("d", PeriodType.MONTH).start(day) == datetime(2024, 2, 1)
+    assert Bucket("d", PeriodType.DAY).start(None) is None
+
+
+def test_aggregate_objects():
+    items = [Item("a", 1), Item("b", 2), Item("a", None), Item("a", 3)]
+    assert aggregate_objects(items, "age", ["name"]) == [
+        Aggregate(("a",), 4, 3, 1, 3),
+        Aggregate(("b",), 2, 1, 2, 2),
+    ]
+    assert aggregate_objects(items, "age") == [Aggregate((), 6, 4, 1, 3)]
+    assert aggregate_objects([], "age") == []
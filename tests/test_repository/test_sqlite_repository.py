@@ -1,5 +1,6 @@
 import pytest
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.query import Condition, Or, Query
 from bookkeeper.scripts.create_db import create_database
 from dataclasses import dataclass
 
@@ -74,3 +75,130 @@ def test_get_all_with_condition(repo, custom_class):
 
     assert repo.get_all({"name": "0"}) == [objects[0]]
     assert repo.get_all({"age": 5}) == objects
+
+
+def test_transaction_rollback(repo, custom_class):
+    with pytest.raises(ValueError):
+        with repo.transaction():
+            repo.add(custom_class("alex", 23))
+            repo.add(custom_class("nick", 20))
+            raise ValueError
+    assert repo.get_all() == []
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class(str(i), i) for i in range(10)]
+    pks = repo.add_many((o for o in objects), batch_size=3)
+    assert pks == [o.pk for o in objects]
+    assert len(set(pks)) == 10
+    assert repo.get_all() == objects
+
+
+def test_add_many_with_pk(repo, custom_class):
+    objects = [custom_class("alex", 23), custom_class("nick", 20, 5)]
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    objects = [custom_class(str(i), i) for i in range(5)]
+    repo.add_many(objects)
+    for o in objects:
+        o.age += 10
+    repo.update_many(objects, batch_size=2)
+    assert repo.get_all() == objects
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class(str(i), i) for i in range(5)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[:3])
+    assert repo.get_all() == objects[3:]
+
+
+def test_delete_many_unexistent(repo, custom_class):
+    pks = repo.add_many([custom_class("alex", 23)])
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[0], pks[0] + 1])
+    assert repo.get(pks[0]) is not None
+
+
+def test_get_rows(repo, custom_class):
+    repo.add_many([custom_class("alex", 23), custom_class("nick", 20)])
+    assert repo.get_rows(["name"]) == [("alex",), ("nick",)]
+    assert repo.get_rows(["age", "name"], {"name": "nick"}) == [(20, "nick")]
+
+
+def test_get_rows_unknown_column(repo):
+    with pytest.raises(ValueError):
+        repo.get_rows(["name; DROP TABLE custom"])
+
+
+def test_iter_all(repo, custom_class):
+    repo.add_many([custom_class(str(i), i % 3) for i in range(10)])
+    objs = repo.iter_all(where={"age": 1}, order_by=["-name"], batch_size=2)
+    assert [obj.name for obj in objs] == ["7", "4", "1"]
+    assert len(list(repo.iter_all(batch_size=3))) == 10
+
+
+def test_iter_all_unknown_field(repo):
+    with pytest.raises(ValueError):
+        list(repo.iter_all(order_by="height"))
+
+
+def test_page(repo, custom_class):
+    objs = [custom_class(str(i), 10 - i // 2) for i in range(7)]
+    repo.add_many(objs)
+    assert repo.page(3) == objs[:3]
+    assert repo.page(3, after_pk=objs[2].pk) == objs[3:6]
+    by_age = sorted(objs, key=lambda obj: (obj.age, obj.pk))
+    first = repo.page(4, key="age")
+    assert first == by_age[:4]
+    assert repo.page(4, first[-1].pk, first[-1].age, key="age") == by_age[4:]
+    assert repo.page(4, where={"age": 10}, after_pk=objs[0].pk) == objs[1:2]
+
+
+def test_get_all_with_several_keys(repo, custom_class):
+    objs = [
+        custom_class("alex", 23),
+        custom_class("alex", 30),
+        custom_class("nick", 23),
+    ]
+    repo.add_many(objs)
+    assert repo.get_all({"name": "alex", "age": 23}) == objs[:1]
+
+
+def test_find(repo, custom_class):
+    objs = [custom_class(str(i), i) for i in range(10)]
+    repo.add_many(objs)
+    query = Query(
+        Or(Condition("age", "<", 2), Condition("age", "in", [5, 7, 8]))
+        & Condition("name", "!=", "8"),
+        order_by="-age",
+        limit=3,
+        offset=1,
+    )
+    assert repo.find(query) == [objs[5], objs[1], objs[0]]
+    assert repo.find(Query(Condition("name", "=", None))) == []
+    assert repo.find_rows(Query(Condition("age", ">=", 8), columns=["age"])) == [
+        (8,),
+        (9,),
+    ]
+
+
+def test_find_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.find(Query(Condition("height", ">", 1)))
+
+
+def test_upsert_many(repo, custom_class):
+    obj = custom_class("alex", 23)
+    repo.add(obj)
+    objs = [custom_class("nick", 20, obj.pk), custom_class("bob", 30, 10)]
+    repo.upsert_many(objs)
+    assert repo.get_all() == objs
+    with pytest.raises(ValueError):
+        repo.upsert_many([custom_class("new", 1)])
+    repo.delete_many([obj.pk, 11], missing_ok=True)
+    assert repo.get_all() == objs[1:]
@@ -0,0 +1,170 @@
+import atexit
+import sqlite3
+import threading
+import pytest
+from dataclasses import dataclass
+from bookkeeper.models.category import Category
+from bookkeeper.repository.query import Condition
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.write_behind_repository import WriteBehindRepository
+from bookkeeper.scripts.create_db import create_database
+
+
+@dataclass
+class Custom:
+    name: str
+    age: int
+    pk: int = 0
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteRepository(Custom, str(tmp_path / "write_behind.db"))
+
+
+@pytest.fixture
+def repo(backend):
+    repo = WriteBehindRepository(backend, flush_interval=60, indexes=["name"])
+    yield repo
+    repo.close()
+
+
+def test_reads_come_from_memory(repo, backend):
+    obj = Custom("alex", 23)
+    pk = repo.add(obj)
+    assert repo.get(pk) is obj
+    assert repo.get_all({"name": "alex"}) == [obj]
+    assert repo.pending == 1
+    assert backend.get(pk) is None
+
+
+def test_flush(repo, backend):
+    objs = [Custom(str(i), i) for i in range(5)]
+    repo.add_many(objs)
+    objs[0].age = 100
+    repo.update(objs[0])
+    repo.delete(objs[1].pk)
+    added = Custom("temp", 0)
+    repo.add(added)
+    repo.delete(added.pk)
+    assert repo.flush() == 6
+    assert repo.pending == 0
+    assert backend.get_all() == [objs[0], *objs[2:]]
+    assert repo.flush() == 0
+
+
+def test_queued_changes_are_copies(repo, backend):
+    obj = Custom("alex", 23)
+    repo.add(obj)
+    obj.age = 30
+    repo.flush()
+    assert backend.get(obj.pk).age == 23
+
+
+def test_loads_backend_and_continues_pks(backend):
+    backend.add_many([Custom("a", 1), Custom("b", 2)])
+    with WriteBehindRepository(backend, flush_interval=60) as repo:
+        assert [obj.name for obj in repo.get_all()] == ["a", "b"]
+        assert repo.add(Custom("c", 3)) == 3
+    assert backend.get(3) == Custom("c", 3, 3)
+
+
+def test_deleted_pks_are_not_reused(tmp_path):
+    db_file = str(tmp_path / "categories.db")
+    create_database(db_file)
+    backend = SQLiteRepository(Category, db_file)
+    last = backend.add_many([Category("a"), Category("b")])[-1]
+    backend.delete(last)
+    with WriteBehindRepository(backend, flush_interval=60) as repo:
+        assert repo.add(Category("c")) == last + 1
+
+
+def test_closed_at_exit(backend, monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, "register", registered.append)
+    monkeypatch.setattr(atexit, "unregister", registered.remove)
+    repo = WriteBehindRepository(backend, flush_interval=60)
+    repo.add(Custom("alex", 23))
+    assert registered == [repo.close]
+    registered[0]()
+    assert backend.get_all() == [Custom("alex", 23, 1)]
+    assert registered == []
+
+
+def test_background_flush_by_size(backend):
+    with WriteBehindRepository(backend, flush_interval=60, flush_size=3) as repo:
+        flushed = threading.Event()
+        flush = repo.flush
+
+        def spy():
+            count = flush()
+            if count:
+                flushed.set()
+            return count
+
+        repo.flush = spy
+        repo.add_many([Custom(str(i), i) for i in range(3)])
+        assert flushed.wait(5)
+        assert len(backend.get_all()) == 3
+
+
+def test_background_flush_by_interval(backend):
+    with WriteBehindRepository(backend, flush_interval=0.01) as repo:
+        repo.add(Custom("alex", 23))
+        # pending drops before the flush commits, wait for the row instead
+        for _ in range(500):
+            if backend.get_all():
+                break
+            threading.Event().wait(0.01)
+        assert backend.get_all() == [Custom("alex", 23, 1)]
+
+
+def test_failed_flush_keeps_changes(repo, backend, monkeypatch):
+    repo.add(Custom("alex", 23))
+
+    def fail(objs, batch_size=1000):
+        list(objs)
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(backend, "upsert_many", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        repo.flush()
+    assert repo.pending == 1
+    repo.add(Custom("nick", 20))
+    monkeypatch.undo()
+    assert repo.flush() == 2
+    assert [obj.name for obj in backend.get_all()] == ["alex", "nick"]
+
+
+def test_transaction_rollback(repo, backend):
+    kept = Custom("kept", 1)
+    flushed = Custom("flushed", 2)
+    repo.add_many([flushed])
+    repo.flush()
+    repo.add(kept)
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            kept.age = 10
+            repo.update(kept)
+            flushed.age = 20
+            repo.update(flushed)
+            repo.add(Custom("new", 3))
+            assert repo.flush() == 0
+            raise RuntimeError
+    assert repo.get_all() == [Custom("flushed", 2, 1), Custom("kept", 1, 2)]
+    assert repo.get_all(Condition("name", "=", "new")) == []
+    assert repo.pending == 1
+    repo.flush()
+    assert backend.get_all() == repo.get_all()
+
+
+def test_nested_transaction(repo):
+    with repo.transaction():
+        outer = Custom("outer", 1)
+        repo.add(outer)
+        with pytest.raises(RuntimeError):
+            with repo.transaction():
+                repo.delete(outer.pk)
+                raise RuntimeError
+    assert repo.get_all() == [outer]
+    assert repo.flush() == 1
@@ -4,6 +4,7 @@ from bookkeeper.models.budget import Budget, PeriodType
 from bookkeeper.services.budget_service import BudgetService
 from bookkeeper.scripts.create_db import create_database
 from bookkeeper.repository.budget_repository import BudgetRepository
+from bookkeeper.repository.expense_repository import ExpenseRepository
 
 
 @pytest.fixture()
@@ -80,3 +81,17 @@ def test_delete_budget(budget_service):
     result = budget_service.delete(pk)
     assert result is None
     assert budget_service.get(pk) is None
+
+
+def test_get_all_with_expenses(budget_service):
+    expense_repo = ExpenseRepository("test.db")
+    budgets = budget_service.get_all_with_expenses()
+    assert {budget.period_type for budget in budgets} == set(PeriodType)
+    for budget in budgets:
+        start_date, end_date = budget.period_dates
+        total = expense_repo.get_total_expense_for_period(start_date, end_date)
+        assert budget.expenses == total
+        assert budget == budget_service.get_with_expenses(budget.pk)
+    assert budget_service.get_all_with_expenses({"period_type": "Месяц"}) == [
+        budget for budget in budgets if budget.period_type == PeriodType.MONTH
+    ]
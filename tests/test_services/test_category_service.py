@@ -8,6 +8,7 @@ from bookkeeper.models.category import Category
 from bookkeeper.services.category_service import CategoryService
 from bookkeeper.scripts.create_db import create_database
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
 
 
 @pytest.fixture()
@@ -104,3 +105,149 @@ def test_create_from_tree_error(category_service):
     tree = [("1", "parent"), ("parent", None)]
     with pytest.raises(KeyError):
         category_service.create_from_tree(tree)
+
+
+def test_create_from_tree_is_atomic(category_service):
+    tree = [("atomic parent", None), ("atomic child", "unknown")]
+    with pytest.raises(KeyError):
+        category_service.create_from_tree(tree)
+    assert category_service.get_all({"name": "atomic parent"}) == []
+
+
+@pytest.mark.parametrize("memory", [False, True])
+def test_tree_queries_order(category_service, memory):
+    if memory:
+        category_service = CategoryService(MemoryRepository())
+    root = Category("root")
+    category_service.add(root)
+    a, b = Category("a", root.pk), Category("b", root.pk)
+    category_service.add(a)
+    category_service.add(b)
+    a1, b1 = Category("a1", a.pk), Category("b1", b.pk)
+    category_service.add(a1)
+    category_service.add(b1)
+    a11 = Category("a11", a1.pk)
+    category_service.add(a11)
+    assert list(category_service.get_subcategories(root.pk)) == [a, a1, a11, b, b1]
+    assert list(category_service.get_subcategories(b1.pk)) == []
+    assert list(category_service.get_all_parents(a11)) == [a1, a, root]
+    assert category_service.repo.get_ancestors(a11.pk, include_self=True)[0] == a11
+    # the same from the loaded index
+    assert a11.pk in category_service.tree
+    assert list(category_service.get_subcategories(root.pk)) == [a, a1, a11, b, b1]
+    assert list(category_service.get_all_parents(a11)) == [a1, a, root]
+
+
+@pytest.mark.parametrize("memory", [False, True])
+def test_tree_queries_raise_on_cycle(repo, memory):
+    if memory:
+        repo = MemoryRepository()
+    a = Category("cycle a")
+    repo.add(a)
+    b = Category("cycle b", a.pk)
+    repo.add(b)
+    c = Category("cycle c", b.pk)
+    repo.add(c)
+    a.parent = c.pk
+    repo.update(a)
+    service = CategoryService(repo)
+    for loaded in (False, True):
+        if loaded:
+            assert c.pk in service.tree
+        with pytest.raises(ValueError):
+            list(service.get_all_parents(a))
+        with pytest.raises(ValueError):
+            list(service.get_subcategories(c.pk))
+    for pk in (a.pk, c.pk):
+        with pytest.raises(ValueError):
+            repo.get_ancestors(pk)
+        with pytest.raises(ValueError):
+            repo.get_descendants(pk)
+    c.parent = c.pk
+    repo.update(c)
+    with pytest.raises(ValueError):
+        repo.get_ancestors(c.pk)
+    with pytest.raises(ValueError):
+        repo.get_descendants(c.pk)
+    assert repo.get_descendants(a.pk) == [b]
+
+
+def test_update_rejects_cycle(category_service):
+    root = Category("cycle root")
+    category_service.add(root)
+    child = Category("cycle child", root.pk)
+    category_service.add(child)
+    root.parent = child.pk
+    with pytest.raises(ValueError):
+        category_service.update(root)
+    root.parent = root.pk
+    with pytest.raises(ValueError):
+        category_service.update(root)
+    assert category_service.get(root.pk).parent is None
+    assert [c.pk for c in category_service.get_all_parents(child)] == [root.pk]
+
+
+def test_reads_are_cached(category_service, monkeypatch):
+    category_service.add(Category("cached"))
+    calls = []
+    get_all = category_service.repo.get_all
+
+    def counting_get_all(*args):
+        calls.append(args)
+        return get_all(*args)
+
+    monkeypatch.setattr(category_service.repo, "get_all", counting_get_all)
+    cat = category_service.get_by_name("cached")
+    assert category_service.get(cat.pk) == cat
+    list(category_service.get_subcategories(cat.pk))
+    category_service.get_all()
+    assert len(calls) == 1
+    # returned objects are copies, changing them does not affect the cache
+    cat.name = "changed"
+    assert category_service.get(cat.pk).name == "cached"
+    category_service.update(cat)
+    assert category_service.get(cat.pk).name == "changed"
+    assert len(calls) == 2
+
+
+def test_cache_dropped_on_rollback(category_service):
+    with pytest.raises(RuntimeError):
+        with category_service.transaction():
+            category_service.add(Category("rolled back"))
+            assert category_service.get_by_name("rolled back") is not None
+            raise RuntimeError
+    assert category_service.get_by_name("rolled back") is None
+
+
+def test_create_from_tree_batches_by_depth(category_service, monkeypatch):
+    tree = [("r", None)] + [(f"c{i}", "r") for i in range(50)]
+    tree += [(f"g{i}", f"c{i}") for i in range(50)]
+    calls = []
+    add_many = category_service.repo.add_many
+
+    def counting_add_many(objs):
+        calls.append(1)
+        return add_many(objs)
+
+    monkeypatch.setattr(category_service.repo, "add_many", counting_add_many)
+    cats = category_service.create_from_tree(tree)
+    assert len(calls) == 3
+    assert [c.name for c in cats] == [name for name, _ in tree]
+    assert (
+        category_service.get_by_name("g7").parent
+        == category_service.get_by_name("c7").pk
+    )
+
+
+def test_create_from_tree_merge(category_service):
+    category_service.create_from_tree([("merge root", None), ("merge a", "merge root")])
+    root = category_service.get_by_name("merge root")
+    cats = category_service.create_from_tree(
+        [("merge a", "merge root"), ("merge b", "merge a"), ("merge c", "merge root")],
+        merge=True,
+    )
+    assert [c.name for c in cats] == ["merge a", "merge b", "merge c"]
+    assert category_service.get_by_name("merge c").parent == root.pk
+    assert len(category_service.get_all({"name": "merge a"})) == 1
+    with pytest.raises(ValueError):
+        category_service.create_from_tree([("merge b", None)])
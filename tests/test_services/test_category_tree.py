@@ -0,0 +1,70 @@
+from decimal import Decimal
+import pytest
+from bookkeeper.models.category import Category
+from bookkeeper.services.category_tree import CategoryTree
+
+
+@pytest.fixture
+def tree():
+    return CategoryTree(
+        [
+            Category("b1", 3, 5),
+            Category("root", None, 1),
+            Category("a", 1, 2),
+            Category("b", 1, 3),
+            Category("a1", 2, 4),
+            Category("other", None, 6),
+        ]
+    )
+
+
+def test_lookups(tree):
+    assert len(tree) == 6
+    assert 4 in tree and 7 not in tree
+    assert tree.get(3).name == "b"
+    assert tree.get(7) is None
+    assert tree.get_by_name("a1").pk == 4
+    assert tree.get_by_name("missing") is None
+    assert tree.children[1] == [2, 3]
+    assert tree.children[None] == [1, 6]
+
+
+def test_descendants(tree):
+    assert [c.name for c in tree.descendants(1)] == ["a", "a1", "b", "b1"]
+    assert [c.name for c in tree.descendants(None)][-1] == "other"
+    assert list(tree.descendants(4)) == []
+
+
+def test_ancestors_depth_path(tree):
+    assert [c.name for c in tree.ancestors(Category("new", 4))] == ["a1", "a", "root"]
+    assert tree.depth(1) == 0
+    assert tree.depth(4) == 2
+    assert [c.name for c in tree.path(5)] == ["root", "b", "b1"]
+
+
+def test_rollup(tree):
+    rollups = tree.rollup(
+        {1: Decimal(1), 4: Decimal(10), 5: Decimal(100), 9: Decimal(7)}
+    )
+    assert set(rollups) == {1, 2, 3, 4, 5, 6}
+    assert (rollups[1].own, rollups[1].total) == (1, 111)
+    assert (rollups[2].own, rollups[2].total) == (0, 10)
+    assert (rollups[3].own, rollups[3].total) == (0, 100)
+    assert rollups[6].total == 0
+    assert rollups[5].category.name == "b1"
+
+
+def test_rollup_orphan():
+    tree = CategoryTree([Category("orphan", 42, 1), Category("child", 1, 2)])
+    assert tree.roots() == [1]
+    assert tree.rollup({2: Decimal(5)})[1].total == 5
+
+
+def test_cycle():
+    tree = CategoryTree([Category("a", 3, 1), Category("b", 1, 2), Category("c", 2, 3)])
+    with pytest.raises(ValueError):
+        list(tree.ancestors(tree.get(1)))
+    with pytest.raises(ValueError):
+        list(tree.descendants(1))
+    with pytest.raises(ValueError):
+        tree.depth(2)
@@ -1,10 +1,20 @@
+import csv
+import io
+import json
 import pytest
 from datetime import datetime
 from decimal import Decimal
 from bookkeeper.models.expense import Expense
 from bookkeeper.services.expense_service import ExpenseService
 from bookkeeper.scripts.create_db import create_database
+from bookkeeper.repository.expense_archive import ExpenseArchive
 from bookkeeper.repository.expense_repository import ExpenseRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Aggregate, Bucket, Condition
+from bookkeeper.repository.query import aggregate_objects
+from bookkeeper.models.budget import PeriodType
+from bookkeeper.models.category import Category
+from bookkeeper.services.category_tree import CategoryTree
 
 
 @pytest.fixture()
@@ -66,3 +76,152 @@ def test_get_total_expense_for_period(expense_service):
     total = expense_service.get_total_expense_for_period(today, today)
     assert total != Decimal(0)
     assert total >= 5000
+
+
+def test_aggregate(expense_service):
+    expenses = [
+        Expense(Decimal("1.50"), 1, datetime(2031, 1, 5, 23, 59)),
+        Expense(Decimal("2.25"), 1, datetime(2031, 1, 6)),
+        Expense(Decimal("4"), 2, datetime(2031, 1, 31, 12)),
+        Expense(Decimal("8"), 1, datetime(2031, 2, 1)),
+    ]
+    expense_service.repo.add_many(expenses)
+    where = Condition("expense_date", ">=", datetime(2031, 1, 1))
+    monthly = expense_service.aggregate(False, PeriodType.MONTH, where)
+    assert monthly == [
+        Aggregate(
+            (datetime(2031, 1, 1),), Decimal("7.75"), 3, Decimal("1.50"), Decimal("4")
+        ),
+        Aggregate((datetime(2031, 2, 1),), Decimal("8"), 1, Decimal("8"), Decimal("8")),
+    ]
+    memory = MemoryRepository()
+    memory.add_many(Expense(e.amount, e.category, e.expense_date) for e in expenses)
+    for by_category, period in [
+        (True, None),
+        (False, PeriodType.DAY),
+        (True, PeriodType.WEEK),
+    ]:
+        assert expense_service.aggregate(by_category, period, where) == ExpenseService(
+            memory
+        ).aggregate(by_category, period)
+
+
+def test_aggregate_empty(expense_service):
+    where = Condition("expense_date", "<", datetime(1800, 1, 1))
+    assert expense_service.aggregate(False, where=where) == []
+
+
+def test_get_category_rollups(expense_service):
+    tree = CategoryTree(
+        [Category("food", None, 1), Category("fruit", 1, 2), Category("apples", 2, 3)]
+    )
+    day = datetime(2032, 3, 1)
+    expense_service.repo.add_many(
+        [
+            Expense(Decimal("1.10"), 1, day),
+            Expense(Decimal("2"), 3, day),
+            Expense(Decimal("3"), 3, day),
+            Expense(Decimal("50"), 3, datetime(2032, 4, 1)),
+        ]
+    )
+    rollups = expense_service.get_category_rollups(tree, day, datetime(2032, 3, 31))
+    assert (rollups[1].own, rollups[1].total) == (Decimal("1.10"), Decimal("6.10"))
+    assert (rollups[2].own, rollups[2].total) == (0, Decimal("5"))
+    assert rollups[3].total == Decimal("5")
+
+
+def test_export(expense_service):
+    expense_service.add_many(
+        [
+            Expense(
+                Decimal("0.10"), 1, datetime(2033, 5, 2), datetime(2033, 5, 3), "b"
+            ),
+            Expense(Decimal("7"), 2, datetime(2033, 5, 1), datetime(2033, 5, 3), "a"),
+            Expense(Decimal("9"), 2, datetime(2033, 6, 1), datetime(2033, 6, 1)),
+        ]
+    )
+    out = io.StringIO()
+    count = expense_service.export(
+        out,
+        start_date=datetime(2033, 5, 1),
+        end_date=datetime(2033, 5, 31),
+        categories={1: "Еда"},
+        batch_size=1,
+    )
+    assert count == 2
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert [row["amount"] for row in rows] == ["7.00", "0.10"]
+    assert rows[1]["category_name"] == "Еда"
+    assert rows[1]["expense_date"] == "2033-05-02 00:00:00"
+
+    out = io.StringIO()
+    where = Condition("expense_date", ">=", datetime(2033, 5, 1)) & Condition(
+        "category", "=", 2
+    )
+    assert expense_service.export(out, "jsonl", where) == 2
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [line["amount"] for line in lines] == ["7.00", "9.00"]
+    assert lines[0]["comment"] == "a" and "category_name" not in lines[0]
+
+
+def test_export_unknown_format(expense_service):
+    with pytest.raises(ValueError):
+        expense_service.export(io.StringIO(), "xml")
+
+
+def test_archive_expenses(repo, tmp_path):
+    archive = ExpenseArchive(repo, str(tmp_path / "archive.db"))
+    expense_service = ExpenseService(repo, archive)
+    expense_service.add_many(
+        [
+            Expense(Decimal("10"), 1, datetime(1995, 3, 1), comment="a"),
+            Expense(Decimal("2.50"), 2, datetime(1995, 3, 20), comment="b"),
+            Expense(Decimal("4"), 1, datetime(1995, 4, 2), comment="c"),
+        ]
+    )
+    assert expense_service.archive_expenses(datetime(1995, 4, 15)) == 2
+    assert len(expense_service.get_all({"comment": "a"})) == 0
+    total = expense_service.get_total_expense_for_period(
+        datetime(1995, 1, 1), datetime(1995, 12, 31)
+    )
+    assert total == Decimal("16.50")
+    total = expense_service.get_total_expense_for_period(
+        datetime(1995, 3, 10), datetime(1995, 4, 30)
+    )
+    assert total == Decimal("6.50")
+
+
+def test_archive_expenses_without_archive(expense_service):
+    with pytest.raises(ValueError):
+        expense_service.archive_expenses(datetime(1995, 1, 1))
+    with pytest.raises(TypeError):
+        expense_service.archive_expenses("1995-01-01")
+
+
+def test_archived_aggregates(tmp_path):
+    repo = ExpenseRepository(str(tmp_path / "app.db"))
+    expenses = [
+        Expense(Decimal("10"), 1, datetime(1995, 3, 1)),
+        Expense(Decimal("2.50"), 2, datetime(1995, 3, 20)),
+        Expense(Decimal("4"), 1, datetime(1995, 4, 2)),
+        Expense(Decimal("1"), 2, datetime(1995, 5, 7)),
+    ]
+    repo.add_many(expenses)
+    assert ExpenseService(repo).archive is None
+    ExpenseArchive(repo).archive(datetime(1995, 4, 15))
+    expense_service = ExpenseService(repo)
+    assert expense_service.archive is not None
+    for by_category, period in [(True, None), (True, PeriodType.MONTH)]:
+        result = expense_service.aggregate(by_category, period)
+        group_by = ["category"]
+        if period is not None:
+            group_by.append(Bucket("expense_date", period))
+        expected = aggregate_objects(expenses, "amount", group_by)
+        assert [(a.group, a.total, a.count) for a in result] == [
+            (a.group, a.total, a.count) for a in expected
+        ]
+    tree = CategoryTree([Category("food", None, 1), Category("fruit", 1, 2)])
+    rollups = expense_service.get_category_rollups(
+        tree, datetime(1995, 3, 1), datetime(1995, 4, 30)
+    )
+    assert (rollups[1].own, rollups[1].total) == (Decimal("14"), Decimal("16.50"))
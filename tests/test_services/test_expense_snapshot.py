@@ -0,0 +1,136 @@
+import pytest
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+from bookkeeper.models.budget import PeriodType
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.expense_repository import ExpenseRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Condition
+from bookkeeper.scripts.create_db import create_database
+from bookkeeper.services.expense_snapshot import ExpenseSnapshot
+
+EXPENSES = [
+    (Decimal("10.50"), 1, datetime(2034, 1, 31, 10), "coffee"),
+    (Decimal("20"), 2, datetime(2034, 2, 1, 12), ""),
+    (Decimal("5.25"), 1, datetime(2034, 2, 5, 9), "tea"),
+    (Decimal("100"), 3, datetime(2034, 2, 6, 18), "books"),
+]
+FUTURE = Condition("expense_date", ">=", datetime(2034, 1, 1))
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def repo(request):
+    if request.param == "sqlite":
+        create_database("test.db", True)
+        repo = ExpenseRepository("test.db")
+    else:
+        repo = MemoryRepository()
+    for amount, category, expense_date, comment in EXPENSES:
+        repo.add(Expense(amount, category, expense_date, comment=comment))
+    return repo
+
+
+@pytest.fixture
+def pks(repo):
+    return [expense.pk for expense in repo.get_all(FUTURE)]
+
+
+@pytest.fixture(params=[False, True], ids=["array", "numpy"])
+def use_numpy(request):
+    if request.param:
+        pytest.importorskip("numpy")
+    return request.param
+
+
+@pytest.fixture
+def snapshot(repo, use_numpy):
+    return ExpenseSnapshot.from_repository(
+        repo, FUTURE, batch_size=2, use_numpy=use_numpy
+    )
+
+
+def test_from_repository(snapshot, use_numpy, pks):
+    assert len(snapshot) == 4
+    assert snapshot.use_numpy == use_numpy
+    assert list(snapshot.pk) == pks
+    assert list(snapshot.amount) == [1050, 2000, 525, 10000]
+    assert list(snapshot.category) == [1, 2, 1, 3]
+    assert list(snapshot.day) == [e[2].toordinal() for e in EXPENSES]
+    assert snapshot.comments == ["coffee", "", "tea", "books"]
+    if not use_numpy:
+        assert isinstance(snapshot.amount, array)
+
+
+def test_from_repository_where(repo, use_numpy, pks):
+    snapshot = ExpenseSnapshot.from_repository(
+        repo, FUTURE & Condition("category", "=", 1), use_numpy=use_numpy
+    )
+    assert list(snapshot.pk) == [pks[0], pks[2]]
+
+
+def test_total(snapshot):
+    assert snapshot.total() == Decimal("135.75")
+
+
+def test_select(snapshot, pks):
+    selected = snapshot.select(start=date(2034, 2, 1), end=date(2034, 2, 5))
+    assert list(selected.pk) == pks[1:3]
+    assert selected.comments == ["", "tea"]
+    selected = snapshot.select(categories=[1, 3], start=date(2034, 2, 1))
+    assert list(selected.pk) == pks[2:]
+    assert selected.use_numpy == snapshot.use_numpy
+    assert len(snapshot.select(categories=[])) == 0
+
+
+def test_sum_by_category(snapshot):
+    assert snapshot.sum_by_category() == {
+        1: Decimal("15.75"),
+        2: Decimal("20"),
+        3: Decimal("100"),
+    }
+
+
+@pytest.mark.parametrize(
+    "period, expected",
+    [
+        (
+            PeriodType.DAY,
+            {
+                datetime(2034, 1, 31): Decimal("10.50"),
+                datetime(2034, 2, 1): Decimal("20"),
+                datetime(2034, 2, 5): Decimal("5.25"),
+                datetime(2034, 2, 6): Decimal("100"),
+            },
+        ),
+        (
+            PeriodType.WEEK,
+            {
+                datetime(2034, 1, 30): Decimal("35.75"),
+                datetime(2034, 2, 6): Decimal("100"),
+            },
+        ),
+        (
+            PeriodType.MONTH,
+            {
+                datetime(2034, 1, 1): Decimal("10.50"),
+                datetime(2034, 2, 1): Decimal("125.25"),
+            },
+        ),
+    ],
+)
+def test_sum_by_period(snapshot, period, expected):
+    assert snapshot.sum_by_period(period) == expected
+
+
+def test_empty_snapshot(use_numpy):
+    snapshot = ExpenseSnapshot(use_numpy=use_numpy)
+    assert len(snapshot) == 0
+    assert snapshot.total() == 0
+    assert snapshot.sum_by_category() == {}
+    assert snapshot.sum_by_period(PeriodType.MONTH) == {}
+
+
+def test_columns_must_have_same_length():
+    with pytest.raises(ValueError):
+        ExpenseSnapshot([1], [100], [1], [], [""], use_numpy=False)
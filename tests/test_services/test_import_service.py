@@ -0,0 +1,106 @@
+import io
+from datetime import datetime
+from decimal import Decimal
+from textwrap import dedent
+import pytest
+from bookkeeper.models.category import Category
+from bookkeeper.repository.expense_repository import ExpenseRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.services.category_service import CategoryService
+from bookkeeper.services.expense_service import ExpenseService
+from bookkeeper.services.import_service import ImportService
+from bookkeeper.utils.sqlite_utils import close_all
+
+
+@pytest.fixture
+def import_service(tmp_path):
+    db_file = str(tmp_path / "import.db")
+    progress = []
+    service = ImportService(
+        CategoryService(SQLiteRepository(Category, db_file)),
+        ExpenseService(ExpenseRepository(db_file)),
+        batch_size=2,
+        progress=lambda stats: progress.append(stats.imported),
+    )
+    service.progress_log = progress
+    yield service
+    close_all()
+
+
+def test_import_category_tree(import_service):
+    text = dedent(
+        """
+        food
+            fruit
+                apples
+            bread
+        books
+        """
+    )
+    stats = import_service.import_category_tree(io.StringIO(text))
+    assert (stats.read, stats.imported) == (5, 5)
+    assert import_service.progress_log == [2, 4, 5]
+    categories = import_service.category_service
+    apples = categories.get_by_name("apples")
+    assert [c.name for c in categories.get_all_parents(apples)] == ["fruit", "food"]
+    # importing again reuses the existing categories
+    import_service.import_category_tree(io.StringIO(text))
+    assert len(categories.get_all()) == 5
+
+
+def test_import_categories_reads_storage_once(import_service, monkeypatch):
+    repo = import_service.category_service.repo
+    calls = []
+    get_all = repo.get_all
+
+    def counting_get_all(*args):
+        calls.append(args)
+        return get_all(*args)
+
+    monkeypatch.setattr(repo, "get_all", counting_get_all)
+    text = "name,parent\na,\nb,a\nc,b\nd,c\ne,a\n"
+    stats = import_service.import_categories_csv(io.StringIO(text))
+    assert stats.imported == 5
+    assert len(calls) == 1
+    e = import_service.category_service.get_by_name("e")
+    assert import_service.category_service.get(e.parent).name == "a"
+
+
+def test_import_categories_csv(import_service):
+    with pytest.raises(ValueError, match="line 4"):
+        import_service.import_categories_csv(
+            io.StringIO("name,parent\nfood,\nfruit,food\n,food\n")
+        )
+    assert import_service.category_service.get_all() == []
+
+    import_service.import_categories_csv(
+        io.StringIO("name,parent\nfood,\nfruit,food\n")
+    )
+    fruit = import_service.category_service.get_by_name("fruit")
+    assert import_service.category_service.get(fruit.parent).name == "food"
+
+
+def test_import_expenses_csv(import_service):
+    import_service.import_categories_csv(io.StringIO("name,parent\nfood,\n"))
+    food = import_service.category_service.get_by_name("food")
+    text = (
+        "amount,category,expense_date,comment\n"
+        "10.50,food,2024-01-02 10:00:00,lunch\n"
+        f"3,{food.pk},2024-01-03,\n"
+        "x,food,2024-01-03,\n"
+        "4,missing,2024-01-03,\n"
+        "5,food,yesterday,\n"
+        "6,food,2024-01-04,\n"
+    )
+    with pytest.raises(ValueError, match="line 4"):
+        import_service.import_expenses_csv(io.StringIO(text))
+    expenses = import_service.expense_service
+    assert expenses.get_all() == []
+
+    stats = import_service.import_expenses_csv(io.StringIO(text), strict=False)
+    assert (stats.read, stats.imported, stats.skipped) == (6, 3, 3)
+    assert len(stats.errors) == 3
+    first = expenses.get_all()[0]
+    assert first.amount == Decimal("10.50")
+    assert first.expense_date == datetime(2024, 1, 2, 10)
+    assert first.comment == "lunch"
@@ -0,0 +1,162 @@
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytest
+from bookkeeper.utils.sqlite_utils import SQLite, close_all
+from bookkeeper.utils.sqlite_utils import load_pragmas, PRAGMA_PROFILES
+from bookkeeper.utils.sqlite_utils import to_timestamp, from_timestamp
+from bookkeeper.utils.sqlite_utils import to_minor_units, from_minor_units
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    yield str(tmp_path / "test.db")
+    close_all()
+
+
+def test_persistent_connection_is_reused(db_file):
+    db = SQLite(db_file)
+    with db:
+        first = db.conn
+    with db:
+        assert db.conn is first
+    # objects pointing at the same file share the connection
+    other = SQLite(db_file)
+    with other:
+        assert other.conn is first
+
+
+def test_persistent_connection_per_thread(db_file):
+    db = SQLite(db_file)
+    with db:
+        main_conn = db.conn
+    connections = []
+
+    def worker():
+        with db:
+            connections.append(db.conn)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert connections[0] is not main_conn
+
+
+def test_close_opens_new_connection(db_file):
+    db = SQLite(db_file)
+    with db:
+        first = db.conn
+    db.close()
+    with db:
+        assert db.conn is not first
+
+
+def test_per_call_connection(db_file):
+    db = SQLite(db_file, persistent=False)
+    with db:
+        first = db.conn
+    with db:
+        assert db.conn is not first
+
+
+def test_data_is_visible_between_modes(db_file):
+    SQLite(db_file).execute("CREATE TABLE t (x int)")
+    SQLite(db_file).execute("INSERT INTO t VALUES (?)", (1,))
+    assert SQLite(db_file, persistent=False).fetchall("SELECT x FROM t") == [{"x": 1}]
+
+
+def test_load_pragmas_default_profile():
+    assert load_pragmas({}) == PRAGMA_PROFILES["balanced"]
+
+
+def test_load_pragmas_override():
+    pragmas = load_pragmas({"profile": "durable", "cache_size": "-1000"})
+    assert pragmas["synchronous"] == "full"
+    assert pragmas["cache_size"] == "-1000"
+
+
+def test_load_pragmas_unknown_profile():
+    with pytest.raises(ValueError):
+        load_pragmas({"profile": "fast"})
+
+
+def test_load_pragmas_invalid_value():
+    with pytest.raises(ValueError):
+        load_pragmas({"synchronous": "off; DROP TABLE expense"})
+
+
+def test_pragmas_applied_to_connection(db_file):
+    db = SQLite(db_file, pragmas=load_pragmas({"profile": "bulk-load"}))
+    assert db.fetchone("PRAGMA journal_mode") == {"journal_mode": "wal"}
+    assert db.fetchone("PRAGMA synchronous") == {"synchronous": 0}
+    assert db.fetchone("PRAGMA cache_size") == {"cache_size": -262144}
+
+
+@pytest.fixture
+def table(db_file):
+    db = SQLite(db_file)
+    db.execute("CREATE TABLE t (x int)")
+    return db
+
+
+def values(db):
+    return [row["x"] for row in db.fetchall("SELECT x FROM t ORDER BY x")]
+
+
+@pytest.mark.parametrize("persistent", [True, False])
+def test_transaction_commit(table, persistent):
+    db = SQLite(table.db_name, persistent)
+    with db.transaction():
+        db.execute("INSERT INTO t VALUES (1)")
+        db.execute("INSERT INTO t VALUES (2)")
+    assert values(SQLite(table.db_name, persistent=False)) == [1, 2]
+
+
+@pytest.mark.parametrize("persistent", [True, False])
+def test_transaction_rollback(table, persistent):
+    db = SQLite(table.db_name, persistent)
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.execute("INSERT INTO t VALUES (1)")
+            raise RuntimeError
+    assert values(db) == []
+
+
+def test_nested_transaction_rollback(table):
+    with pytest.raises(RuntimeError):
+        with table.transaction():
+            table.execute("INSERT INTO t VALUES (1)")
+            with pytest.raises(ValueError):
+                # another object for the same file joins the transaction
+                with SQLite(table.db_name).transaction() as inner:
+                    inner.execute("INSERT INTO t VALUES (2)")
+                    raise ValueError
+            assert values(table) == [1]
+            raise RuntimeError
+    assert values(table) == []
+
+
+def test_timestamp_round_trip():
+    date = datetime(2024, 4, 5, 1, 48, 50, 826683)
+    assert from_timestamp(to_timestamp(date)) == date
+    assert to_timestamp(date) < to_timestamp(date + timedelta(microseconds=1))
+
+
+def test_minor_units_round_trip():
+    assert to_minor_units(Decimal("100.50")) == 10050
+    assert to_minor_units(12.3) == 1230
+    assert to_minor_units(5) == 500
+    assert from_minor_units(10050) == Decimal("100.50")
+
+
+@pytest.mark.parametrize("persistent", [True, False])
+def test_iter_rows(db_file, persistent):
+    db = SQLite(db_file, persistent)
+    db.execute("CREATE TABLE t (x int)")
+    db.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(5)])
+    batches = db.iter_rows("SELECT x FROM t ORDER BY x", batch_size=2)
+    columns, rows = next(batches)
+    assert columns == ["x"] and rows == [(0,), (1,)]
+    # other calls can run while the iteration is in progress
+    assert db.fetchone("SELECT count(*) AS n FROM t")["n"] == 5
+    assert [rows for _, rows in batches] == [[(2,), (3,)], [(4,)]]
@@ -1,7 +1,8 @@
 import tempfile
 from textwrap import dedent
 import pytest
-from bookkeeper.utils.utils import read_tree
+from bookkeeper.models.category import Category
+from bookkeeper.utils.utils import read_tree, iter_tree, batched, field_values
 
 
 def test_create_tree():
@@ -77,3 +78,32 @@ def test_with_file():
             ("child2", "parent1"),
             ("parent2", None),
         ]
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 2)) == []
+    with pytest.raises(ValueError):
+        list(batched([1], 0))
+
+
+def test_iter_tree_is_lazy():
+    def lines():
+        yield "parent"
+        while True:
+            yield "    child"
+
+    pairs = iter_tree(lines())
+    assert next(pairs) == ("parent", None)
+    assert next(pairs) == ("child", "parent")
+
+
+def test_field_values():
+    category = Category("food", 1, pk=2)
+    assert field_values(category) == {"name": "food", "parent": 1, "pk": 2}
+
+    class Custom:
+        def __init__(self):
+            self.pk = 3
+
+    assert field_values(Custom()) == {"pk": 3}